@@ -0,0 +1,320 @@
+import asyncio
+import contextlib
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from metrics import metrics
+
+# Calls running at once per lane, across all orgs and per org
+DEFAULT_LANE_CAPACITY = {'document_ai': 32, 'ingestion': 16}
+DEFAULT_ORG_LIMIT = {'document_ai': 8, 'ingestion': 4}
+DEFAULT_MAX_QUEUE = 200
+DEFAULT_QUEUE_TIMEOUT = 120.0
+# Below this fraction of the daily API allocation left, an org's concurrency is scaled down
+DEFAULT_QUOTA_SLOWDOWN = 0.2
+# Below this fraction new calls are refused until fresher usage numbers arrive
+DEFAULT_QUOTA_RESERVE = 0.02
+# Usage numbers older than this are ignored (Sforce-Limit-Info only arrives with responses)
+DEFAULT_QUOTA_TTL = 300.0
+
+_API_USAGE = re.compile(r'api-usage=(\d+)/(\d+)')
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call can't be admitted (queue full, wait timed out or quota reserve reached)"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_limit_info(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(used, limit) from a Sforce-Limit-Info header such as 'api-usage=18/15000'"""
+    match = _API_USAGE.search(value or '')
+    if not match or int(match.group(2)) <= 0:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted', 'enqueued_at')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+    def grant(self) -> None:
+        self.granted = True
+        self.event.set()
+
+
+class _AsyncWaiter:
+    __slots__ = ('loop', 'future', 'granted', 'enqueued_at')
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+    def grant(self) -> None:
+        self.granted = True
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _OrgLane:
+    def __init__(self):
+        self.active = 0
+        self.queue: Deque[Any] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+
+class AdmissionController:
+    """Per-org concurrency caps with fair queueing in front of upstream calls
+
+    Each lane (e.g. document_ai, ingestion) has a capacity shared by all orgs
+    and a limit per org. Calls over an org's limit wait in that org's FIFO
+    queue; freed capacity goes to the waiting orgs in round-robin order, so a
+    burst from one org can't starve the others. Salesforce API usage reported
+    in Sforce-Limit-Info scales an org's limit down as its daily allocation
+    runs out.
+    """
+
+    def __init__(self, lane_capacity: Optional[Dict[str, int]] = None,
+                 org_limit: Optional[Dict[str, int]] = None,
+                 org_limit_override: Optional[Callable[[str, str], Optional[int]]] = None,
+                 max_queue: int = DEFAULT_MAX_QUEUE, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                 quota_slowdown: float = DEFAULT_QUOTA_SLOWDOWN, quota_reserve: float = DEFAULT_QUOTA_RESERVE,
+                 quota_ttl: float = DEFAULT_QUOTA_TTL):
+        self.lane_capacity = dict(DEFAULT_LANE_CAPACITY, **(lane_capacity or {}))
+        self.org_limit = dict(DEFAULT_ORG_LIMIT, **(org_limit or {}))
+        self.org_limit_override = org_limit_override
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.quota_slowdown = quota_slowdown
+        self.quota_reserve = quota_reserve
+        self.quota_ttl = quota_ttl
+        self._lock = threading.Lock()
+        self._lanes: Dict[str, Dict[str, _OrgLane]] = {lane: {} for lane in self.lane_capacity}
+        self._active: Dict[str, int] = {lane: 0 for lane in self.lane_capacity}
+        # Orgs with queued calls per lane, in the order they get the next free slot
+        self._turns: Dict[str, Deque[str]] = {lane: deque() for lane in self.lane_capacity}
+        # org -> (used, limit, monotonic time observed)
+        self._usage: Dict[str, Tuple[int, int, float]] = {}
+        # (org, lane) -> limit from org_limit_override, looked up outside the lock when a call arrives
+        self._org_limits: Dict[Tuple[str, str], Optional[int]] = {}
+
+    # Quota tracking
+
+    def observe_limit_info(self, org_name: Optional[str], header: Optional[str]) -> None:
+        """Record the API usage Salesforce reported with a response"""
+        usage = parse_limit_info(header)
+        if usage is None:
+            return
+        with self._lock:
+            self._usage[org_name or ''] = (usage[0], usage[1], time.monotonic())
+        # A higher allowance may let queued calls through
+        self._dispatch_all()
+
+    def _quota_left(self, org: str) -> Optional[float]:
+        usage = self._usage.get(org)
+        if usage is None or time.monotonic() - usage[2] > self.quota_ttl:
+            return None
+        used, limit, _ = usage
+        return max(limit - used, 0) / limit
+
+    def _resolve_limit(self, org: str, lane: str) -> None:
+        """Look up an org's own limit for a lane (without the lock; it may read config) for _limit()"""
+        if self.org_limit_override is None:
+            return
+        try:
+            limit = self.org_limit_override(org, lane)
+            limit = int(limit) if limit is not None else None
+            if limit is not None and limit < 1:
+                raise ValueError(f"{limit} is not a positive integer")
+        except Exception as e:
+            logging.warning(f"Ignoring the {lane} admission limit of org {org or 'default'}: {str(e)}")
+            limit = None
+        self._org_limits[(org, lane)] = limit
+
+    def _limit(self, org: str, lane: str) -> int:
+        """Concurrency an org may use in a lane right now (0 while at its quota reserve; lock held)"""
+        limit = max(1, self._org_limits.get((org, lane)) or self.org_limit[lane])
+        left = self._quota_left(org)
+        if left is None or left >= self.quota_slowdown:
+            return limit
+        if left < self.quota_reserve:
+            return 0
+        return max(1, int(limit * left / self.quota_slowdown))
+
+    # Admission
+
+    def _org_lane(self, org: str, lane: str) -> _OrgLane:
+        lanes = self._lanes[lane]
+        entry = lanes.get(org)
+        if entry is None:
+            entry = lanes[org] = _OrgLane()
+        return entry
+
+    def _publish(self, org: str, lane: str, entry: _OrgLane) -> None:
+        metrics.set_admission(lane, org, entry.active, len(entry.queue))
+
+    def _enter(self, org: str, lane: str, make_waiter: Callable[[], Any]) -> Optional[Any]:
+        """Admit straight away (returns None) or queue and return the waiter to wait on"""
+        with self._lock:
+            entry = self._org_lane(org, lane)
+            limit = self._limit(org, lane)
+            if limit == 0:
+                entry.rejected += 1
+                raise AdmissionRejected(
+                    f"Org {org or 'default'} is within its reserve of Salesforce API calls; try again later",
+                    self.quota_ttl)
+            if not entry.queue and entry.active < limit and self._active[lane] < self.lane_capacity[lane]:
+                entry.active += 1
+                entry.admitted += 1
+                self._active[lane] += 1
+                self._publish(org, lane, entry)
+                return None
+            if len(entry.queue) >= self.max_queue:
+                entry.rejected += 1
+                raise AdmissionRejected(f"Too many queued {lane} calls for org {org or 'default'}", 5.0)
+            waiter = make_waiter()
+            entry.queue.append(waiter)
+            if org not in self._turns[lane]:
+                self._turns[lane].append(org)
+            self._publish(org, lane, entry)
+            return waiter
+
+    def _granted(self, org: str, lane: str, waiter: Any) -> None:
+        waited = time.monotonic() - waiter.enqueued_at
+        with self._lock:
+            entry = self._org_lane(org, lane)
+            entry.wait_seconds += waited
+            entry.max_wait_seconds = max(entry.max_wait_seconds, waited)
+        metrics.observe(f'{lane}_admission_wait', waited, org)
+
+    def _abandon(self, org: str, lane: str, waiter: Any) -> bool:
+        """Take a timed-out waiter off its queue; False if it was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            entry = self._org_lane(org, lane)
+            entry.queue.remove(waiter)
+            entry.rejected += 1
+            self._publish(org, lane, entry)
+        return True
+
+    def _release(self, org: str, lane: str) -> None:
+        with self._lock:
+            entry = self._org_lane(org, lane)
+            entry.active -= 1
+            self._active[lane] -= 1
+            self._publish(org, lane, entry)
+            self._dispatch(lane)
+
+    def _dispatch(self, lane: str) -> None:
+        """Hand free capacity to queued calls, one org at a time in turn (lock held)"""
+        turns = self._turns[lane]
+        skipped = 0
+        while turns and self._active[lane] < self.lane_capacity[lane] and skipped < len(turns):
+            org = turns[0]
+            entry = self._lanes[lane][org]
+            if not entry.queue:
+                turns.popleft()
+                continue
+            turns.rotate(-1)
+            if entry.active >= self._limit(org, lane):
+                skipped += 1
+                continue
+            skipped = 0
+            waiter = entry.queue.popleft()
+            entry.active += 1
+            entry.admitted += 1
+            self._active[lane] += 1
+            self._publish(org, lane, entry)
+            waiter.grant()
+
+    def _dispatch_all(self) -> None:
+        with self._lock:
+            for lane in self._lanes:
+                self._dispatch(lane)
+
+    @contextlib.contextmanager
+    def slot(self, org_name: Optional[str], lane: str):
+        """Hold one of the org's slots in a lane for the duration of the block"""
+        org = org_name or ''
+        self._resolve_limit(org, lane)
+        waiter = self._enter(org, lane, _Waiter)
+        if waiter is not None:
+            if not waiter.event.wait(self.queue_timeout) and self._abandon(org, lane, waiter):
+                raise AdmissionRejected(f"Timed out waiting for a {lane} slot for org {org or 'default'}", 5.0)
+            self._granted(org, lane, waiter)
+        try:
+            yield
+        finally:
+            self._release(org, lane)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, org_name: Optional[str], lane: str):
+        """slot() for coroutines; waiting doesn't block the event loop"""
+        org = org_name or ''
+        loop = asyncio.get_running_loop()
+        self._resolve_limit(org, lane)
+        waiter = self._enter(org, lane, lambda: _AsyncWaiter(loop))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if self._abandon(org, lane, waiter):
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    raise AdmissionRejected(f"Timed out waiting for a {lane} slot for org {org or 'default'}", 5.0)
+                if isinstance(e, asyncio.CancelledError):
+                    # Granted just as the caller went away: pass the slot on
+                    self._release(org, lane)
+                    raise
+            self._granted(org, lane, waiter)
+        try:
+            yield
+        finally:
+            self._release(org, lane)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            orgs: Dict[str, Dict[str, Any]] = {}
+            for lane, entries in self._lanes.items():
+                for org, entry in entries.items():
+                    orgs.setdefault(org, {})[lane] = {
+                        'active': entry.active,
+                        'queued': len(entry.queue),
+                        'limit': self._limit(org, lane),
+                        'admitted': entry.admitted,
+                        'rejected': entry.rejected,
+                        'avg_wait_ms': round(entry.wait_seconds / max(entry.admitted, 1) * 1000, 1),
+                        'max_wait_ms': round(entry.max_wait_seconds * 1000, 1),
+                        'oldest_queued_ms': round((time.monotonic() - entry.queue[0].enqueued_at) * 1000, 1)
+                                            if entry.queue else 0.0
+                    }
+            for org, (used, limit, observed) in self._usage.items():
+                orgs.setdefault(org, {})['api_usage'] = {
+                    'used': used,
+                    'limit': limit,
+                    'age_seconds': round(time.monotonic() - observed, 1)
+                }
+            return {
+                'lanes': {lane: {'active': self._active[lane], 'capacity': self.lane_capacity[lane]}
+                          for lane in self.lane_capacity},
+                'orgs': orgs
+            }
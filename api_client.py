@@ -1,7 +1,62 @@
 import os
 import json
-from typing import Optional
-from config_manager import get_current_org_name, get_org_token_file
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from config_manager import get_current_org_name, get_org_token_file, write_file_atomic
+
+# How often (seconds) cached token files are re-stat'ed to notice writes from other processes
+TOKEN_STAT_INTERVAL = float(os.environ.get("TOKEN_STAT_INTERVAL", 1.0))
+
+class TokenRegistry:
+    """Process-wide cache of parsed token files, re-read only when a file changes"""
+
+    def __init__(self, stat_interval: float = TOKEN_STAT_INTERVAL):
+        self.stat_interval = stat_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def _signature(self, token_file: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(token_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def load(self, token_file: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        entry = self._entries.get(token_file)
+        if entry and now - entry['checked_at'] < self.stat_interval:
+            return entry['data']
+        with self._lock:
+            signature = self._signature(token_file)
+            if signature is None:
+                self._entries.pop(token_file, None)
+                raise Exception('Token file not found. Please authenticate.')
+            entry = self._entries.get(token_file)
+            if not entry or entry['signature'] != signature:
+                with open(token_file, 'r') as f:
+                    data = json.load(f)
+                self.reads += 1
+                entry = self._entries[token_file] = {'data': data, 'signature': signature}
+            entry['checked_at'] = now
+            return entry['data']
+
+    def save(self, token_file: str, content: str) -> None:
+        """Atomically replace a token file and drop its cached copy"""
+        with self._lock:
+            write_file_atomic(token_file, content)
+            self._entries.pop(token_file, None)
+
+    def invalidate(self, token_file: Optional[str] = None) -> None:
+        with self._lock:
+            if token_file is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(token_file, None)
+
+token_registry = TokenRegistry()
 
 class APIClient:
     def __init__(self, org_name: Optional[str] = None):
@@ -14,10 +69,7 @@ class APIClient:
         self.token_file = get_org_token_file(org_name)
     
     def load_token_data(self):
-        if not os.path.exists(self.token_file):
-            raise Exception('Token file not found. Please authenticate.')
-        with open(self.token_file, 'r') as f:
-            return json.load(f)
+        return dict(token_registry.load(self.token_file))
     
     def get_access_token(self):
         return self.load_token_data().get('access_token')
@@ -32,7 +84,10 @@ class APIClient:
         except Exception:
             return False
     
+    def save_token_data(self, token_data: Dict[str, Any]) -> None:
+        """Save token data (access_token, instance_url, ...) for this org"""
+        token_registry.save(self.token_file, json.dumps(token_data))
+    
     def save_access_token(self, access_token: str) -> None:
         """Save access token to local storage"""
-        with open(self.token_file, 'w') as f:
-            f.write(access_token.strip()) 
\ No newline at end of file
+        token_registry.save(self.token_file, access_token.strip())
@@ -2,25 +2,196 @@ from flask import Flask, request, jsonify, render_template, send_file, redirect,
 import subprocess
 import json
 import requests
-import base64
 import logging
 import os
 import uuid
+import atexit
+import threading
+import time
+from collections import Counter
+from concurrent.futures import (
+    ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError, wait as futures_wait
+)
 from datetime import datetime, timezone
+from werkzeug.exceptions import RequestEntityTooLarge
 
 # Import configuration
-from config import DEFAULT_ML_MODEL, API_VERSION, SCHEMA_CONFIG
-from api_client import APIClient
+from config import DEFAULT_ML_MODEL
+from api_client import APIClient, token_registry
 from config_manager import (
     load_user_config, save_user_config, initialize_config, get_default_schema,
     get_current_org_name, set_current_org, get_org_config, list_orgs,
     create_or_update_org, delete_org, get_org_token_file
 )
+from token_cache import DataCloudTokenCache, EXPIRY_SKEW_SECONDS
+from token_refresh import (
+    TokenRefresher, token_endpoint, token_file_data,
+    DEFAULT_TOKEN_LIFETIME, DEFAULT_RENEW_MARGIN, DEFAULT_CHECK_INTERVAL
+)
+from result_cache import ResultCache, make_cache_key, DEFAULT_MEMORY_MAX_BYTES, DEFAULT_DISK_MAX_BYTES
+from result_store import ResultStore, DEFAULT_PAGE_SIZE as DEFAULT_RESULTS_PAGE_SIZE
+from lead_dedup import (
+    LeadIndex, POLICIES as DEDUP_POLICIES, DEFAULT_POLICY as DEFAULT_DEDUP_POLICY,
+    DEFAULT_WINDOW_DAYS as DEFAULT_DEDUP_WINDOW_DAYS, DEFAULT_TAG_FIELD as DEFAULT_DEDUP_TAG_FIELD,
+    DEFAULT_BLOOM_CAPACITY, DEFAULT_PENDING_SECONDS as DEFAULT_DEDUP_PENDING_SECONDS, failed_changes
+)
+from upload_stream import (
+    SpoolingRequest, Base64JSONBody, SharedReader, as_stream, stream_digest,
+    DEFAULT_MAX_UPLOAD_BYTES, DEFAULT_SPOOL_BYTES
+)
+from ingest_batcher import (
+    IngestionBatcher, split_records, DEFAULT_MAX_RECORDS as DEFAULT_INGEST_MAX_RECORDS,
+    DEFAULT_WINDOW_SECONDS as DEFAULT_INGEST_WINDOW_SECONDS,
+    DEFAULT_CHUNK_MAX_BYTES, DEFAULT_CHUNK_MAX_RECORDS
+)
+from bulk_ingest import run_bulk_ingestion, DEFAULT_PART_MAX_BYTES, DEFAULT_POLL_INTERVAL
+from image_normalize import normalize_image, is_pdf
+from pdf_split import split_pdf, merge_results
+from org_profile import ProfileRegistry, is_admission_limit
+from model_router import (
+    ModelRouter, DEFAULT_WINDOW_SECONDS, DEFAULT_MIN_SAMPLES, DEFAULT_MAX_ERROR_RATE, DEFAULT_SLOW_FACTOR,
+    DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_MIN_DELAY
+)
+import json_codec
+from metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from resilience import (
+    Resilience, CircuitOpenError, CallCancelled, DEFAULT_MAX_RETRIES, DEFAULT_BASE_DELAY, DEFAULT_MAX_DELAY,
+    DEFAULT_MAX_RETRY_AFTER, DEFAULT_FAILURE_THRESHOLD, DEFAULT_RESET_TIMEOUT
+)
+from admission import (
+    AdmissionController, AdmissionRejected, DEFAULT_LANE_CAPACITY, DEFAULT_ORG_LIMIT, DEFAULT_MAX_QUEUE,
+    DEFAULT_QUEUE_TIMEOUT, DEFAULT_QUOTA_SLOWDOWN, DEFAULT_QUOTA_RESERVE, DEFAULT_QUOTA_TTL
+)
+from job_queue import JobQueue, MemoryJobBackend, SQLiteJobBackend, DEFAULT_LEASE_SECONDS as DEFAULT_JOB_LEASE_SECONDS
+from http_sessions import (
+    SessionPool, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE,
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+)
 
 app = Flask("Salesforce Data Cloud Document AI test platform")
 
+# Large uploads are spooled to disk, and oversized requests are rejected before they are read
+app.request_class = SpoolingRequest
+SpoolingRequest.spool_bytes = int(os.environ.get("UPLOAD_SPOOL_BYTES", DEFAULT_SPOOL_BYTES))
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "DEBUG").upper())
+
+# Per-stage latency histograms, upstream status counters and in-flight gauges for /metrics
+metrics.enabled = os.environ.get("METRICS_ENABLED", "True").lower() == "true"
+
+# Data Cloud tokens are reused across requests until shortly before they expire
+datacloud_token_cache = DataCloudTokenCache(
+    skew_seconds=int(os.environ.get("DATACLOUD_TOKEN_EXPIRY_SKEW", EXPIRY_SKEW_SECONDS))
+)
+
+# Keep-alive HTTP sessions per org and host for every Salesforce/Data Cloud call
+http_sessions = SessionPool(
+    pool_connections=int(os.environ.get("HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS)),
+    pool_maxsize=int(os.environ.get("HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)),
+    connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+    read_timeout=float(os.environ.get("HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+    keep_alive=os.environ.get("HTTP_KEEP_ALIVE", "True").lower() == "true"
+)
+
+# Retries with jittered backoff and a circuit breaker per org and endpoint for upstream calls
+upstream_resilience = Resilience(
+    max_retries=int(os.environ.get("UPSTREAM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+    base_delay=float(os.environ.get("UPSTREAM_BACKOFF_BASE", DEFAULT_BASE_DELAY)),
+    max_delay=float(os.environ.get("UPSTREAM_BACKOFF_MAX", DEFAULT_MAX_DELAY)),
+    max_retry_after=float(os.environ.get("UPSTREAM_RETRY_AFTER_MAX", DEFAULT_MAX_RETRY_AFTER)),
+    failure_threshold=int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+    reset_timeout=float(os.environ.get("CIRCUIT_RESET_SECONDS", DEFAULT_RESET_TIMEOUT))
+)
+
+# Org access tokens are refreshed before they expire and once after a 401
+token_refresher = TokenRefresher(
+    http_sessions,
+    lifetime=float(os.environ.get("SF_TOKEN_LIFETIME_SECONDS", DEFAULT_TOKEN_LIFETIME)),
+    margin=float(os.environ.get("TOKEN_RENEW_MARGIN_SECONDS", DEFAULT_RENEW_MARGIN)),
+    check_interval=float(os.environ.get("TOKEN_RENEW_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL))
+)
+TOKEN_RENEWAL_ENABLED = os.environ.get("TOKEN_RENEWAL_ENABLED", "True").lower() == "true"
+
+# Extraction results keyed by file content, model, schema and API version
+result_cache = ResultCache(
+    memory_max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", DEFAULT_MEMORY_MAX_BYTES)),
+    disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+    disk_max_bytes=int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", DEFAULT_DISK_MAX_BYTES))
+)
+
+# Extracted documents and lead records, queryable at /api/results (RESULT_STORE=none turns it off)
+if os.environ.get("RESULT_STORE", "sqlite").lower() == "sqlite":
+    result_store = ResultStore(os.environ.get("RESULT_STORE_DB", "results.db"))
+else:
+    result_store = None
+
+# Leads already ingested, so the same person on another sheet (or a rescanned sheet) isn't ingested
+# twice; orgs can override the policy and window with a "dedup" entry in their config
+LEAD_DEDUP_POLICY = os.environ.get("LEAD_DEDUP_POLICY", DEFAULT_DEDUP_POLICY).lower()
+if LEAD_DEDUP_POLICY not in DEDUP_POLICIES:
+    raise ValueError(f"LEAD_DEDUP_POLICY must be one of {', '.join(DEDUP_POLICIES)}")
+LEAD_DEDUP_WINDOW_DAYS = float(os.environ.get("LEAD_DEDUP_WINDOW_DAYS", DEFAULT_DEDUP_WINDOW_DAYS))
+lead_index = LeadIndex(
+    os.environ.get("LEAD_DEDUP_DB", "leads.db"),
+    bloom_capacity=int(os.environ.get("LEAD_DEDUP_BLOOM_CAPACITY", DEFAULT_BLOOM_CAPACITY)),
+    pending_seconds=float(os.environ.get("LEAD_DEDUP_PENDING_SECONDS", DEFAULT_DEDUP_PENDING_SECONDS))
+)
+
+# Compiled per-org extraction settings (serialized schema, model, endpoint), built on config save
+profile_registry = ProfileRegistry()
+
+# Rolling latency/error stats per org and ML model; Document AI calls go to the healthiest candidate
+model_router = ModelRouter(
+    window_seconds=float(os.environ.get("MODEL_STATS_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS)),
+    min_samples=int(os.environ.get("MODEL_STATS_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)),
+    max_error_rate=float(os.environ.get("MODEL_MAX_ERROR_RATE", DEFAULT_MAX_ERROR_RATE)),
+    slow_factor=float(os.environ.get("MODEL_SLOW_FACTOR", DEFAULT_SLOW_FACTOR)),
+    hedge_percentile=float(os.environ.get("HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE)),
+    hedge_min_delay=float(os.environ.get("HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY))
+)
+# Hedged requests: a second model is called when the first is slower than its HEDGE_PERCENTILE latency
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "False").lower() == "true"
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("HEDGE_WORKERS", 32)),
+                                    thread_name_prefix='hedge')
+
+def org_admission_limit(org_name, lane):
+    """Concurrency cap an org's config sets for a lane ("admission": {"document_ai": 2}), if any"""
+    profile = profile_registry.get(org_name or None)
+    return profile.admission_limits.get(lane) if profile else None
+
+# Per-org concurrency caps and fair queueing for Document AI and ingestion calls,
+# slowed down as an org's Salesforce API allocation (Sforce-Limit-Info) runs out
+admission = AdmissionController(
+    lane_capacity={
+        'document_ai': int(os.environ.get("ADMISSION_DOCUMENT_AI_CAPACITY", DEFAULT_LANE_CAPACITY['document_ai'])),
+        'ingestion': int(os.environ.get("ADMISSION_INGESTION_CAPACITY", DEFAULT_LANE_CAPACITY['ingestion']))
+    },
+    org_limit={
+        'document_ai': int(os.environ.get("ORG_MAX_DOCUMENT_AI_CALLS", DEFAULT_ORG_LIMIT['document_ai'])),
+        'ingestion': int(os.environ.get("ORG_MAX_INGESTION_CALLS", DEFAULT_ORG_LIMIT['ingestion']))
+    },
+    org_limit_override=org_admission_limit,
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+    queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)),
+    quota_slowdown=float(os.environ.get("API_QUOTA_SLOWDOWN_FRACTION", DEFAULT_QUOTA_SLOWDOWN)),
+    quota_reserve=float(os.environ.get("API_QUOTA_RESERVE_FRACTION", DEFAULT_QUOTA_RESERVE)),
+    quota_ttl=float(os.environ.get("API_QUOTA_INFO_TTL", DEFAULT_QUOTA_TTL))
+)
+
+# Streaming ingestion request limits and per-chunk retry policy
+INGEST_CHUNK_MAX_BYTES = int(os.environ.get("INGEST_CHUNK_MAX_BYTES", DEFAULT_CHUNK_MAX_BYTES))
+INGEST_CHUNK_MAX_RECORDS = int(os.environ.get("INGEST_CHUNK_MAX_RECORDS", DEFAULT_CHUNK_MAX_RECORDS))
+INGEST_CHUNK_PARALLELISM = int(os.environ.get("INGEST_CHUNK_PARALLELISM", 4))
+INGEST_CHUNK_RETRIES = int(os.environ.get("INGEST_CHUNK_RETRIES", DEFAULT_MAX_RETRIES))
+
+# Bulk ingest jobs (INGESTION_MODE=bulk)
+BULK_INGEST_PART_MAX_BYTES = int(os.environ.get("BULK_INGEST_PART_MAX_BYTES", DEFAULT_PART_MAX_BYTES))
+BULK_INGEST_POLL_INTERVAL = float(os.environ.get("BULK_INGEST_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
+
+# Default per-org cap on parallel extractions for /extract-data/batch
+DEFAULT_BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
 
 # Helper function to get current org from cookie
 def get_org_from_request():
@@ -32,10 +203,20 @@ def get_org_from_request():
 def get_api_client():
     """Get API client configured for current org"""
     org_name = get_org_from_request()
+    if TOKEN_RENEWAL_ENABLED:
+        token_refresher.start()
     return APIClient(org_name)
 
 # Helper function to get Data Cloud token
-def get_datacloud_token(salesforce_access_token, instance_url):
+def get_datacloud_token(salesforce_access_token, instance_url, org_name=None):
+    """Get a Data Cloud token for the org, reusing a cached one while it is still valid"""
+    return datacloud_token_cache.get(
+        org_name,
+        salesforce_access_token,
+        lambda: exchange_datacloud_token(salesforce_access_token, instance_url, org_name)
+    )
+
+def exchange_datacloud_token(salesforce_access_token, instance_url, org_name=None):
     """Exchange Salesforce token for Data Cloud token"""
     try:
         token_url = f"https://{instance_url}/services/a360/token"
@@ -62,7 +243,18 @@ def get_datacloud_token(salesforce_access_token, instance_url):
         logging.info(f"  subject_token_type: {data['subject_token_type']}")
         logging.info("=" * 80)
         
-        response = requests.post(token_url, headers=headers, data=data, timeout=30)
+        def send():
+            try:
+                response = http_sessions.post(token_url, org_name=org_name, headers=headers, data=data, timeout=30)
+            except requests.exceptions.RequestException:
+                metrics.count_response('datacloud_token', org_name, 'error')
+                raise
+            metrics.count_response('datacloud_token', org_name, response.status_code)
+            admission.observe_limit_info(org_name, response.headers.get('Sforce-Limit-Info'))
+            return response
+
+        with metrics.timer('token_exchange', org_name):
+            response = upstream_resilience.call(org_name, 'datacloud_token', send)
         
         # Debug output
         logging.info("DATA CLOUD TOKEN EXCHANGE RESPONSE")
@@ -81,7 +273,8 @@ def get_datacloud_token(salesforce_access_token, instance_url):
             logging.info("=" * 80)
             return {
                 'access_token': token_data['access_token'],
-                'instance_url': token_data['instance_url']
+                'instance_url': token_data['instance_url'],
+                'expires_in': token_data.get('expires_in')
             }
         else:
             logging.error(f"Response Body: {response.text}")
@@ -96,50 +289,105 @@ def get_datacloud_token(salesforce_access_token, instance_url):
 
 # Helper function to extract values from nested type/value structure
 def extract_value(obj):
-    """Recursively extract values from type/value structure"""
-    if obj and isinstance(obj, dict) and 'type' in obj and 'value' in obj:
-        if obj['type'] == 'array' and isinstance(obj['value'], list):
-            return [extract_value(item) for item in obj['value']]
-        elif obj['type'] == 'object' and isinstance(obj['value'], dict):
-            extracted = {}
-            for key, val in obj['value'].items():
-                extracted[key] = extract_value(val)
-            return extracted
-        else:
-            return obj['value']
-    return obj
+    """Extract values from type/value structure (iteratively, see json_codec)"""
+    return json_codec.unwrap_typed_values(obj)
 
 # Helper function to ingest data into Data Cloud
-def ingest_to_datacloud(data, dc_token, dc_instance_url, connector_name="ContactIngestion", object_name="LeadRecord"):
+def build_ingestion_records(data):
+    """Turn extracted data into Data Cloud records (one per row of the first array field)"""
+    # Extract clean values
+    clean_data = {}
+    for key, value in data.items():
+        if key.startswith('_'):
+            # Status entries such as _pages are not extracted fields
+            continue
+        clean_data[key] = extract_value(value)
+    
+    # Get the array data (assuming it's LeadsTable or similar)
+    leads_data = None
+    for key, value in clean_data.items():
+        if isinstance(value, list):
+            leads_data = value
+            break
+    
+    if not leads_data:
+        logging.warning("No array data found for ingestion")
+        return None
+    
+    # Prepare records for ingestion
+    records = []
+    for lead in leads_data:
+        record = {
+            "EventID": str(uuid.uuid4()),
+            "eventime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        }
+        # Add all fields from the lead
+        record.update(lead)
+        records.append(record)
+    return records
+
+def ingest_to_datacloud(data, dc_token, dc_instance_url, connector_name="ContactIngestion", object_name="LeadRecord", org_name=None):
     """Ingest extracted data into Salesforce Data Cloud"""
     try:
-        # Extract clean values
-        clean_data = {}
-        for key, value in data.items():
-            clean_data[key] = extract_value(value)
-        
-        # Get the array data (assuming it's LeadsTable or similar)
-        leads_data = None
-        for key, value in clean_data.items():
-            if isinstance(value, list):
-                leads_data = value
-                break
-        
-        if not leads_data:
-            logging.warning("No array data found for ingestion")
+        records = build_ingestion_records(data)
+        if not records:
             return None
-        
-        # Prepare records for ingestion
-        records = []
-        for lead in leads_data:
-            record = {
-                "EventID": str(uuid.uuid4()),
-                "eventime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            }
-            # Add all fields from the lead
-            record.update(lead)
-            records.append(record)
-        
+        return post_ingestion_records(records, dc_token, dc_instance_url, connector_name, object_name, org_name)
+    except Exception as e:
+        logging.error(f"Exception during Data Cloud ingestion: {str(e)}")
+        logging.info("=" * 80)
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def post_ingestion_records(records, dc_token, dc_instance_url, connector_name="ContactIngestion", object_name="LeadRecord", org_name=None):
+    """POST prepared records to the Data Cloud streaming ingestion API
+
+    Records are split into chunks bounded by serialized size and record count
+    and the chunks are sent in parallel. Each chunk is retried on its own; the
+    result totals accepted and rejected records across chunks.
+    """
+    chunks = ingestion_chunks(records)
+    if len(chunks) == 1:
+        return post_ingestion_chunk(chunks[0], dc_token, dc_instance_url, connector_name, object_name, org_name)
+
+    logging.info(f"Splitting {len(records)} records into {len(chunks)} ingestion chunks")
+    with ThreadPoolExecutor(max_workers=min(INGEST_CHUNK_PARALLELISM, len(chunks))) as executor:
+        chunk_results = list(executor.map(
+            lambda chunk: post_ingestion_chunk(chunk, dc_token, dc_instance_url, connector_name, object_name, org_name),
+            chunks
+        ))
+    return combine_chunk_results(chunk_results)
+
+def ingestion_chunks(records):
+    return split_records(records, INGEST_CHUNK_MAX_BYTES, INGEST_CHUNK_MAX_RECORDS)
+
+def combine_chunk_results(chunk_results):
+    """Total the per-chunk ingestion results into one result (a single chunk's result is kept as is)"""
+    if len(chunk_results) == 1:
+        return chunk_results[0]
+    accepted = sum(r.get('records_ingested', 0) for r in chunk_results)
+    rejected = sum(r.get('records_rejected', 0) for r in chunk_results)
+    result = {
+        'success': rejected == 0,
+        'records_ingested': accepted,
+        'records_rejected': rejected,
+        'chunks': [
+            {key: value for key, value in r.items() if key != 'response'}
+            for r in chunk_results
+        ]
+    }
+    failed = [r for r in chunk_results if not r.get('success')]
+    if failed:
+        result['error'] = failed[0].get('error')
+        if failed[0].get('status_code'):
+            result['status_code'] = failed[0]['status_code']
+    return result
+
+def post_ingestion_chunk(records, dc_token, dc_instance_url, connector_name="ContactIngestion", object_name="LeadRecord", org_name=None):
+    """POST one chunk of records to the Data Cloud streaming ingestion API"""
+    try:
         # Prepare ingestion payload with correct path structure
         ingestion_url = f"https://{dc_instance_url}/api/v1/ingest/sources/{connector_name}/{object_name}"
         
@@ -163,11 +411,29 @@ def ingest_to_datacloud(data, dc_token, dc_instance_url, connector_name="Contact
         logging.info(f"Headers:")
         logging.info(f"  Content-Type: {headers['Content-Type']}")
         logging.info(f"  Authorization: Bearer {dc_token[:30]}...{dc_token[-20:] if len(dc_token) > 50 else ''}")
-        logging.info(f"Payload:")
-        logging.info(json.dumps(payload, indent=2))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Payload:")
+            logging.debug(json_codec.dumps(payload, pretty=True))
         logging.info("=" * 80)
+        body = json_codec.dumps(payload).encode('utf-8')
         
-        response = requests.post(ingestion_url, headers=headers, json=payload, timeout=30)
+        attempts = 0
+
+        def send():
+            nonlocal attempts
+            attempts += 1
+            try:
+                response = http_sessions.post(ingestion_url, org_name=org_name, headers=headers, data=body, timeout=30)
+            except requests.exceptions.RequestException:
+                metrics.count_response('datacloud_ingest', org_name, 'error')
+                raise
+            metrics.count_response('datacloud_ingest', org_name, response.status_code)
+            return response
+
+        # Resent only when Data Cloud can't have ingested it (refused, 429, Retry-After), for this chunk alone
+        with admission.slot(org_name, 'ingestion'):
+            response = upstream_resilience.call(org_name, 'datacloud_ingest', send, idempotent=False,
+                                                max_retries=INGEST_CHUNK_RETRIES)
         
         # Debug output
         logging.info("DATA CLOUD INGESTION RESPONSE")
@@ -176,29 +442,47 @@ def ingest_to_datacloud(data, dc_token, dc_instance_url, connector_name="Contact
         logging.info(f"Response Headers: {dict(response.headers)}")
         logging.info(f"Response Body: {response.text}")
         logging.info("=" * 80)
-        
-        if response.status_code in [200, 201, 202]:
-            logging.info("✓ Data successfully ingested to Data Cloud")
-            return {
-                'success': True,
-                'records_ingested': len(records),
-                'response': response.json() if response.text else {}
-            }
-        else:
-            logging.error(f"✗ Data Cloud ingestion failed: {response.status_code}")
-            return {
-                'success': False,
-                'error': response.text,
-                'status_code': response.status_code
-            }
-            
+        return ingestion_chunk_result(records, response, attempts)
     except Exception as e:
-        logging.error(f"Exception during Data Cloud ingestion: {str(e)}")
-        logging.info("=" * 80)
+        return ingestion_chunk_error(records, e)
+
+def ingestion_chunk_result(records, response, attempts):
+    """Result of one ingestion chunk from the API response"""
+    if response.status_code in [200, 201, 202]:
+        logging.info("✓ Data successfully ingested to Data Cloud")
         return {
-            'success': False,
-            'error': str(e)
+            'success': True,
+            'records_ingested': len(records),
+            'attempts': attempts,
+            'response': response.json() if response.text else {}
         }
+    logging.error(f"✗ Data Cloud ingestion failed: {response.status_code}")
+    return {
+        'success': False,
+        'records_rejected': len(records),
+        'error': response.text,
+        'status_code': response.status_code
+    }
+
+def ingestion_chunk_error(records, e):
+    """Result of one ingestion chunk that could not be sent"""
+    result = {'success': False, 'records_rejected': len(records), 'error': str(e)}
+    if isinstance(e, CircuitOpenError):
+        logging.error(f"✗ Data Cloud ingestion skipped: {str(e)}")
+        result['status_code'] = 503
+    elif isinstance(e, AdmissionRejected):
+        logging.error(f"✗ Data Cloud ingestion not admitted: {str(e)}")
+        result['status_code'] = 429
+    else:
+        logging.error(f"Exception during Data Cloud ingestion: {str(e)}")
+    return result
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        'error': 'Upload too large',
+        'max_bytes': app.config['MAX_CONTENT_LENGTH']
+    }), 413
 
 @app.route('/', methods=['GET'])
 def home():
@@ -365,12 +649,8 @@ def auth_exchange():
     if not login_url or not client_id or not client_secret:
         return "Incomplete auth configuration for current org", 400
 
-    # Ensure login_url has https:// protocol
-    if not login_url.startswith('http://') and not login_url.startswith('https://'):
-        login_url = 'https://' + login_url
-    
     redirect_uri = f"{request.url_root.rstrip('/')}/auth/callback"
-    token_url = f"{login_url}/services/oauth2/token"
+    token_url = token_endpoint(login_url)
     payload = {
         "grant_type": "authorization_code",
         "code": code,
@@ -380,24 +660,15 @@ def auth_exchange():
         "code_verifier": code_verifier
     }
 
-    print("Token exchange payload:", payload)
-    print("Token URL:", token_url)
-    
-    resp = requests.post(token_url, data=payload)
-    print("Response status:", resp.status_code)
-    print("Response headers:", resp.headers)
-    print("Response text:", resp.text)
-    
+    # The payload and a successful response carry the client secret and tokens; never log them
+    resp = http_sessions.post(token_url, org_name=org_name, data=payload)
+    logging.debug(f"Authorization code exchange with {token_url}: status {resp.status_code}")
+
     if resp.status_code != 200:
         return f"Error exchanging code for token: {resp.text}", 400
 
-    token_data = resp.json()
-    token_file = get_org_token_file(org_name)
-    with open(token_file, "w") as f:
-        json.dump({
-            "access_token": token_data["access_token"],
-            "instance_url": token_data["instance_url"]
-        }, f)
+    # Keep the refresh token so the access token can be renewed without another login
+    APIClient(org_name).save_token_data(token_file_data(resp.json()))
 
     return '', 204
 
@@ -432,6 +703,676 @@ def save_token():
             'details': str(e)
         }), 500
 
+ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+class ExtractionError(Exception):
+    """Extraction failure carrying the JSON error body and HTTP status to return"""
+    def __init__(self, body, status_code):
+        super().__init__(body.get('error'))
+        self.body = body
+        self.status_code = status_code
+
+def validate_upload(file):
+    """Return an (error, status_code) tuple if the upload can't be processed, else None"""
+    if file is None:
+        return {'error': 'No file uploaded'}, 400
+    if file.filename == '':
+        return {'error': 'No file selected'}, 400
+    if not allowed_file(file.filename):
+        return {'error': 'Invalid file type. Allowed types are: PDF and images (PNG, JPG, JPEG, TIFF, BMP)'}, 400
+    return None
+
+def model_call_ok(status_code):
+    """Whether a Document AI status says the model is healthy (client errors are the request's fault)"""
+    return status_code < 500 and status_code != 429
+
+def hedging_enabled(profile):
+    return HEDGE_REQUESTS if profile.hedge is None else bool(profile.hedge)
+
+def call_document_ai(api_client, profile, upload, mime_type):
+    """Send one document to the Document AI extract-data action
+
+    upload is a seekable binary stream; it is base64-encoded in chunks while
+    the request body is sent. The model is the healthiest of the org's
+    candidates; with hedging on, a second model is tried when the first is
+    slower than usual or fails. Returns (parsed extraction result, model that
+    answered), or raises ExtractionError carrying the error body and HTTP
+    status to report.
+    """
+    models, delay = plan_document_ai_call(profile)
+    if delay is not None:
+        return hedged_document_ai(api_client, profile, models, upload, mime_type, delay)
+    return call_document_ai_model(api_client, profile, models[0], upload, mime_type), models[0]
+
+def plan_document_ai_call(profile):
+    """Models to call for one document, healthiest first, and the hedge delay (None: don't hedge)"""
+    models = model_router.order(profile.org_name, profile.ml_models)
+    if len(models) > 1 and hedging_enabled(profile):
+        delay = model_router.hedge_delay(profile.org_name, models[0])
+        if delay is not None:
+            return models[:2], delay
+    return models[:1], None
+
+def hedged_document_ai(api_client, profile, models, upload, mime_type, delay):
+    """Call models[0]; if it fails or hasn't answered after delay seconds also call models[1]
+
+    The first success wins; returns (result, model that answered).
+    """
+    lock = threading.Lock()
+    abandoned = threading.Event()
+    started = time.monotonic()
+    primary = hedge_executor.submit(call_document_ai_model, api_client, profile, models[0],
+                                    SharedReader(upload, lock), mime_type, abandoned)
+    error = None
+    try:
+        return primary.result(timeout=delay), models[0]
+    except FuturesTimeoutError:
+        logging.info(f"{models[0]} slower than {delay:.1f}s, hedging with {models[1]}")
+    except Exception as e:
+        if not worth_another_model(e):
+            raise
+        error = e
+        logging.info(f"{models[0]} failed ({str(e)}), falling back to {models[1]}")
+
+    backup = hedge_executor.submit(call_document_ai_model, api_client, profile, models[1],
+                                   SharedReader(upload, lock), mime_type, abandoned)
+    pending = {backup} if error else {primary, backup}
+    while pending:
+        done, pending = futures_wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            # The other call can't be interrupted; it finishes in the background without recording itself
+            abandoned.set()
+            if future is backup and not primary.done():
+                record_abandoned_primary(profile.org_name, models[0], started)
+            model_router.record_hedge(profile.org_name, future is backup)
+            return result, models[1] if future is backup else models[0]
+    model_router.record_hedge(profile.org_name, False)
+    raise error
+
+def worth_another_model(e):
+    """Whether a failed Document AI call may succeed on another model (not a client error)"""
+    return not isinstance(e, ExtractionError) or not model_call_ok(e.status_code)
+
+def record_abandoned_primary(org_name, ml_model, started):
+    """Count a primary that lost a hedge race as a successful call of at least its elapsed time
+
+    Its own outcome is never recorded, and dropping it would leave the slow
+    model looking as fast as its few calls that won.
+    """
+    model_router.record(org_name, ml_model, time.monotonic() - started, True)
+
+def call_document_ai_model(api_client, profile, ml_model, upload, mime_type, abandoned=None):
+    """Send one document to Document AI with a specific model, recording its latency for routing"""
+    org_name = profile.org_name
+    body = Base64JSONBody(ml_model, profile.schema_config, mime_type or "image/jpeg", upload,
+                          head=profile.body_heads[ml_model])
+
+    logging.info(f"Using ML model: {ml_model}, schema {profile.schema_hash}")
+    logging.debug(f"Using schema: {profile.schema_config}")
+    logging.info(f"Upload size: {body.source_size} bytes, request body: {len(body)} bytes")
+
+    def send(access_token):
+        if abandoned is not None and abandoned.is_set():
+            raise CallCancelled("Another model already answered")
+        # Use dynamic instance_url from token file
+        url = profile.extract_url(api_client.get_instance_url())
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {access_token}'
+        }
+        body.seek(0)
+        started = time.monotonic()
+        try:
+            # The body is base64-encoded while it is sent, so this includes the encode time
+            with metrics.timer('document_ai', org_name, ml_model):
+                response = http_sessions.request("POST", url, org_name=org_name, headers=headers, data=body, timeout=160)
+        except Exception as e:
+            if abandoned is not None and abandoned.is_set():
+                # Lost a hedge race; the upload may already be closed
+                raise CallCancelled(str(e))
+            if not isinstance(e, requests.exceptions.RequestException):
+                raise
+            metrics.count_response('document_ai', org_name, 'error')
+            model_router.record(org_name, ml_model, time.monotonic() - started, False)
+            raise
+        metrics.count_response('document_ai', org_name, response.status_code)
+        if abandoned is None or not abandoned.is_set():
+            model_router.record(org_name, ml_model, time.monotonic() - started, model_call_ok(response.status_code))
+        admission.observe_limit_info(org_name, response.headers.get('Sforce-Limit-Info'))
+        return response
+
+    access_token = api_client.get_access_token()
+    try:
+        with admission.slot(org_name, 'document_ai'):
+            response = upstream_resilience.call(org_name, 'document_ai', lambda: send(access_token))
+            refreshed_token = refresh_after_unauthorized(org_name, access_token, response)
+            if refreshed_token:
+                response = upstream_resilience.call(org_name, 'document_ai', lambda: send(refreshed_token))
+    except (CircuitOpenError, AdmissionRejected) as e:
+        raise unavailable_error(e)
+    metrics.observe('base64_encode', body.encode_seconds, org_name, ml_model)
+    return document_ai_result(response, org_name, ml_model)
+
+def refresh_after_unauthorized(org_name, access_token, response):
+    """New org token to retry a Document AI call rejected with a 401, else None
+
+    The refresh is shared with concurrent callers holding the same expired token.
+    """
+    if response.status_code != 401:
+        return None
+    return token_refresher.refresh(org_name, access_token)
+
+def unavailable_error(e):
+    """ExtractionError for a call refused by an open circuit (503) or by admission control (429)"""
+    status_code = 503 if isinstance(e, CircuitOpenError) else 429
+    return ExtractionError({'error': str(e), 'retry_after': round(e.retry_after)}, status_code)
+
+def document_ai_result(response, org_name, ml_model):
+    """Parsed extraction result of a Document AI response, or ExtractionError for an error status"""
+    if response.status_code in [200, 201]:
+        with metrics.timer('parse', org_name, ml_model):
+            return parse_document_ai_response(response)
+    raise ExtractionError({
+        'error': f'API request failed with status {response.status_code}',
+        'details': response.text
+    }, response.status_code)
+
+def parse_document_ai_response(response):
+    """Unescape and parse the extraction result from a successful extract-data response"""
+    try:
+        json_response = json_codec.loads(response.content)
+
+        # Log raw and pretty-printed response for debugging (skipped unless debug logging is on)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Raw response: {response.text}")
+            logging.debug(f"JSON response: {json_codec.dumps(json_response, pretty=True)}")
+        
+        # Check if response has expected structure
+        if not json_response:
+            raise ExtractionError({'error': 'Empty response from server'}, 200)
+        
+        if 'data' not in json_response or not json_response['data']:
+            raise ExtractionError({'error': 'No data in response'}, 200)
+        
+        # Check for error in the response
+        if json_response['data'][0].get('error'):
+            error_msg = json_response['data'][0]['error']
+            if '403' in error_msg:
+                raise ExtractionError({
+                    'error': 'Authentication error with the OpenAI service. Please check your API credentials.',
+                    'details': error_msg
+                }, 403)
+            raise ExtractionError({
+                'error': 'Service error',
+                'details': error_msg
+            }, 500)
+        
+        nested_json_str = json_response['data'][0].get('data')
+        if not nested_json_str:
+            raise ExtractionError({'error': 'No extracted data in response'}, 200)
+        
+        # Replace HTML entities and parse the JSON string
+        return json_codec.loads(json_codec.unescape_entities(nested_json_str))
+    except (KeyError, IndexError, json.JSONDecodeError) as e:
+        raise ExtractionError({
+            'error': f'Error processing response: {str(e)}',
+            'raw_response': response.text
+        }, 500)
+
+def get_org_datacloud_credentials(org_name, api_client=None):
+    """Get (salesforce_access_token, data_cloud_credentials) for an org"""
+    api_client = api_client or APIClient(org_name)
+    access_token = api_client.get_access_token()
+    instance_url = api_client.get_instance_url()
+
+    # Get Data Cloud token
+    dc_credentials = get_datacloud_token(
+        access_token,
+        instance_url.replace('https://', '').replace('http://', ''),
+        org_name
+    )
+    return access_token, dc_credentials
+
+def retry_after_unauthorized(org_name, access_token, ingestion_result):
+    """Whether an ingestion rejected with a 401 should be retried; drops and refreshes the tokens first
+
+    Only results where nothing was accepted (and no bulk job was created) are
+    retried, so no records are sent twice.
+    """
+    if (ingestion_result.get('status_code') != 401 or ingestion_result.get('records_ingested')
+            or ingestion_result.get('job_id')):
+        return False
+    # Cached Data Cloud token was rejected: exchange a new one, from a refreshed org token if possible
+    datacloud_token_cache.invalidate(org_name, access_token)
+    token_refresher.refresh(org_name, access_token)
+    logging.warning("Data Cloud rejected the token, retrying once with new credentials")
+    return True
+
+def send_ingestion_records(org_name, connector_name, object_name, records, api_client=None):
+    """Exchange the org's token for a Data Cloud token and POST the records"""
+    for attempt in range(2):
+        access_token, dc_credentials = get_org_datacloud_credentials(org_name, api_client)
+
+        if not dc_credentials:
+            logging.warning("✗ Could not obtain Data Cloud token, skipping ingestion")
+            return None
+
+        with metrics.timer('ingestion', org_name):
+            ingestion_result = post_ingestion_records(
+                records,
+                dc_credentials['access_token'],
+                dc_credentials['instance_url'],
+                connector_name,
+                object_name,
+                org_name
+            )
+        if attempt or not retry_after_unauthorized(org_name, access_token, ingestion_result):
+            break
+    log_ingestion_result(ingestion_result)
+    return ingestion_result
+
+def log_ingestion_result(ingestion_result):
+    if ingestion_result.get('success'):
+        logging.info(f"✓ Successfully ingested {ingestion_result.get('records_ingested', 0)} records to Data Cloud")
+    else:
+        logging.warning(f"✗ Data Cloud ingestion failed: {ingestion_result.get('error', 'Unknown error')}")
+
+def send_bulk_ingestion_records(org_name, connector_name, object_name, records, api_client=None):
+    """Ingest records through a Data Cloud bulk ingest job (CSV upload) and wait for it"""
+    for attempt in range(2):
+        access_token, dc_credentials = get_org_datacloud_credentials(org_name, api_client)
+
+        if not dc_credentials:
+            logging.warning("✗ Could not obtain Data Cloud token, skipping bulk ingestion")
+            return None
+
+        try:
+            # A bulk job holds one ingestion slot from creation until it completes
+            with admission.slot(org_name, 'ingestion'), metrics.timer('bulk_ingestion', org_name):
+                ingestion_result = run_bulk_ingestion(
+                    http_sessions,
+                    f"https://{dc_credentials['instance_url']}",
+                    dc_credentials['access_token'],
+                    connector_name,
+                    object_name,
+                    records,
+                    org_name,
+                    part_max_bytes=BULK_INGEST_PART_MAX_BYTES,
+                    poll_interval=BULK_INGEST_POLL_INTERVAL,
+                    resilience=upstream_resilience
+                )
+        except AdmissionRejected as e:
+            ingestion_result = {
+                'success': False,
+                'mode': 'bulk',
+                'job_id': None,
+                'records_rejected': len(records),
+                'error': str(e),
+                'status_code': 429
+            }
+        if attempt or not retry_after_unauthorized(org_name, access_token, ingestion_result):
+            break
+
+    if ingestion_result.get('success'):
+        logging.info(f"✓ Bulk job {ingestion_result['job_id']} ingested {ingestion_result['records_ingested']} records to Data Cloud")
+    else:
+        logging.warning(f"✗ Data Cloud bulk ingestion failed: {ingestion_result.get('error', 'Unknown error')}")
+    return ingestion_result
+
+def deduplicate_records(profile, records, ml_model=None):
+    """Apply the org's lead de-duplication policy to records about to be ingested
+
+    Returns (records to send, summary or None, the index changes to release if
+    the send fails). If the index fails, every record is sent.
+    """
+    policy = profile.dedup['policy'] or LEAD_DEDUP_POLICY
+    if policy == 'off':
+        return records, None, []
+    window_days = profile.dedup['window_days']
+    window_seconds = (window_days if window_days is not None else LEAD_DEDUP_WINDOW_DAYS) * 86400
+    try:
+        with metrics.timer('lead_dedup', profile.org_name, ml_model or profile.ml_model):
+            return lead_index.apply(profile.org_name, records, policy, window_seconds,
+                                    profile.dedup['tag_field'] or DEFAULT_DEDUP_TAG_FIELD)
+    except Exception as e:
+        logging.error(f"Lead de-duplication failed, ingesting every record: {str(e)}")
+        return records, None, []
+
+def valid_dedup_settings(settings):
+    return isinstance(settings, dict) and settings.get('policy', 'off') in DEDUP_POLICIES
+
+def valid_admission_limits(limits):
+    """Whether an org's "admission" setting maps known lanes to positive integers (null: the default)"""
+    return limits is None or isinstance(limits, dict) and all(
+        lane in DEFAULT_LANE_CAPACITY and (limit is None or is_admission_limit(limit))
+        for lane, limit in limits.items())
+
+def settle_leads(org_name, changes):
+    """Ingestion callback that settles a document's index changes, undoing those of records that didn't get in"""
+    def settle(result, records):
+        try:
+            lead_index.settle(org_name, changes, failed_changes(changes, failed_records(records, result)))
+        except Exception as e:
+            # Left pending, the changes are undone once LEAD_DEDUP_PENDING_SECONDS have passed
+            logging.error(f"Settling lead index changes failed: {str(e)}")
+    return settle
+
+def failed_records(records, result):
+    """The records an ingestion result didn't get into Data Cloud: those of its failed chunks, else all"""
+    if (result or {}).get('success'):
+        return []
+    chunk_results = (result or {}).get('chunks')
+    if not chunk_results:
+        return records
+    # Chunking is deterministic, so the result's chunks line up with a fresh split
+    chunks = ingestion_chunks(records)
+    if len(chunks) != len(chunk_results):
+        return records
+    return [record for chunk, chunk_result in zip(chunks, chunk_results)
+            if not chunk_result.get('success') for record in chunk]
+
+def ingest_extracted_data(nested_json, api_client, profile):
+    """Ingest an extraction result into Data Cloud
+
+    In background mode (the default) the records are queued for a batched
+    ingest call and a status handle is returned; bulk mode queues them the
+    same way but sends each batch as a bulk ingest job. In sync mode the
+    ingestion result itself is returned. Returns None only when there is
+    nothing to ingest; records that weren't sent get a failed status.
+    """
+    changes = []
+    try:
+        records, dedup, changes = prepare_ingestion(nested_json, profile)
+        sent = None
+        if records and INGESTION_MODE == 'sync':
+            sent = send_ingestion_records(profile.org_name, profile.connector_name,
+                                          profile.object_name, records, api_client)
+        return settle_ingestion(profile, records, dedup, changes, sent)
+    except Exception as ingest_error:
+        # Don't fail the main request if ingestion fails, but say so
+        return abandon_ingestion(profile, changes, ingest_error)
+
+def abandon_ingestion(profile, changes, error):
+    """Failed status for an ingestion that raised; undoes its lead index changes since nothing was sent"""
+    logging.error(f"✗ Exception during Data Cloud ingestion: {str(error)}")
+    try:
+        lead_index.release(profile.org_name, changes)
+    except Exception as e:
+        logging.error(f"Releasing leads after a failed ingestion failed: {str(e)}")
+    return ingestion_not_sent(str(error))
+
+def ingestion_not_sent(error, records=None):
+    """Failed ingestion status for records that never reached Data Cloud"""
+    result = {'success': False, 'error': error}
+    if records:
+        result['records_rejected'] = len(records)
+    return result
+
+def prepare_ingestion(nested_json, profile):
+    """Build a document's records and de-duplicate them: (records or None, dedup summary, index changes)"""
+    records = build_ingestion_records(nested_json)
+    if not records:
+        return None, None, []
+    return deduplicate_records(profile, records, answered_model(profile, nested_json))
+
+def settle_ingestion(profile, records, dedup, changes, sent=None):
+    """Ingestion status for prepared records
+
+    In sync mode sent is the result of sending them, and the index changes of
+    records that didn't get in are undone; otherwise the records are queued
+    here and their changes settle once the batch was sent.
+    """
+    if records is None:
+        return None
+    if not records:
+        # Every lead was a skipped duplicate
+        settle_leads(profile.org_name, changes)({'success': True}, records)
+        return {'success': True, 'records_ingested': 0, 'dedup': dedup}
+    if INGESTION_MODE == 'sync':
+        ingestion_result = sent or ingestion_not_sent('Could not obtain a Data Cloud token', records)
+        settle_leads(profile.org_name, changes)(ingestion_result, records)
+    else:
+        ingestion_result = ingestion_batcher.submit(profile.org_name, profile.connector_name,
+                                                    profile.object_name, records,
+                                                    on_done=settle_leads(profile.org_name, changes))
+    if dedup and ingestion_result:
+        ingestion_result['dedup'] = dedup
+    return ingestion_result
+
+# Records from many documents are sent together per org/connector/object
+INGESTION_MODE = os.environ.get("INGESTION_MODE", "background").lower()
+if INGESTION_MODE == 'bulk':
+    # Backfills: gather far more records per flush and send them as one bulk job
+    ingestion_batcher = IngestionBatcher(
+        send_bulk_ingestion_records,
+        max_records=int(os.environ.get("BULK_INGEST_MAX_RECORDS", 50000)),
+        window_seconds=float(os.environ.get("BULK_INGEST_WINDOW_SECONDS", 30))
+    )
+else:
+    ingestion_batcher = IngestionBatcher(
+        send_ingestion_records,
+        max_records=int(os.environ.get("INGEST_BATCH_MAX_RECORDS", DEFAULT_INGEST_MAX_RECORDS)),
+        window_seconds=float(os.environ.get("INGEST_BATCH_WINDOW_SECONDS", DEFAULT_INGEST_WINDOW_SECONDS))
+    )
+# Don't drop queued records when the process exits normally
+atexit.register(ingestion_batcher.flush_all)
+
+def extract_pdf_parts(api_client, profile, parts):
+    """Extract PDF page groups concurrently and merge their results in page order
+
+    The merged result carries a _pages list with each part's pages, timing and
+    error. Raises the first part's ExtractionError only when every part failed.
+    """
+    def extract_part(part):
+        first_page, last_page, stream = part
+        started = time.monotonic()
+        page = pdf_part_page(first_page, last_page)
+        result = None
+        try:
+            result, ml_model = call_document_ai(api_client, profile, stream, 'application/pdf')
+            page.update({'success': True, 'status_code': 200, 'ml_model': ml_model})
+        except Exception as e:
+            page.update(outcome_error(e))
+        page['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result, page
+
+    max_parallel = profile.pdf_split_settings['max_parallel']
+    with ThreadPoolExecutor(max_workers=min(max_parallel, len(parts))) as executor:
+        outcomes = list(executor.map(extract_part, parts))
+    return merge_pdf_outcomes(outcomes, profile.schema)
+
+def pdf_part_page(first_page, last_page):
+    return {'pages': str(first_page) if first_page == last_page else f'{first_page}-{last_page}'}
+
+def outcome_error(e):
+    """Failure fields for a PDF part or batch item that raised e"""
+    if isinstance(e, ExtractionError):
+        return {'success': False, 'status_code': e.status_code, 'error': e.body}
+    return {'success': False, 'status_code': 500, 'error': {'error': str(e)}}
+
+def merge_pdf_outcomes(outcomes, schema):
+    """Merge (result, page) outcomes of PDF parts, or raise when every part failed"""
+    pages = [page for _, page in outcomes]
+    if not any(page['success'] for page in pages):
+        body = dict(pages[0]['error'], pages=pages)
+        raise ExtractionError(body, pages[0]['status_code'])
+
+    merged = merge_results([result for result, _ in outcomes], schema)
+    merged['_pages'] = pages
+    # Parts may be answered by different models; the result counts as the one that answered most
+    merged['_ml_model'] = Counter(page['ml_model'] for page in pages if page['success']).most_common(1)[0][0]
+    failed = len(pages) - sum(1 for page in pages if page['success'])
+    logging.info(f"Merged {len(pages)} PDF parts ({failed} failed)")
+    return merged
+
+def run_document_ai(api_client, profile, upload, mime_type):
+    """Apply the org's preprocessing to the upload, then call Document AI
+
+    Images may be normalized first; multi-page PDFs may be split into page
+    groups that are extracted concurrently and merged.
+    """
+    parts = split_upload(profile, upload, mime_type)
+    if parts:
+        try:
+            return extract_pdf_parts(api_client, profile, parts)
+        finally:
+            for _, _, part in parts:
+                part.close()
+
+    document, document_mime_type = normalize_upload(profile, upload, mime_type)
+    try:
+        result, ml_model = call_document_ai(api_client, profile, document, document_mime_type)
+        return dict(result, _ml_model=ml_model)
+    finally:
+        if document is not upload:
+            document.close()
+
+def split_upload(profile, upload, mime_type):
+    """Page groups of a PDF upload when the org splits PDFs, else None"""
+    pdf_split_settings = profile.pdf_split_settings
+    if not pdf_split_settings or not is_pdf(upload, mime_type):
+        return None
+    with metrics.timer('pdf_split', profile.org_name, profile.ml_model):
+        return split_pdf(upload, pdf_split_settings['pages_per_part'], pdf_split_settings['min_pages'])
+
+def normalize_upload(profile, upload, mime_type):
+    """(document, mime type) to send: the upload, or its normalized copy when the org normalizes images"""
+    if not profile.image_settings:
+        return upload, mime_type
+    with metrics.timer('image_normalize', profile.org_name, profile.ml_model):
+        document, document_mime_type, _ = normalize_image(upload, mime_type, profile.image_settings)
+    return document, document_mime_type
+
+def complete_extraction(nested_json):
+    """Whether every page of a result was extracted; partial results aren't cached or stored"""
+    return all(page['success'] for page in nested_json.get('_pages', []))
+
+def answered_model(profile, nested_json):
+    """Model that produced an extraction result (results cached before this was recorded: the org's model)"""
+    return nested_json.get('_ml_model') or profile.ml_model
+
+def extraction_cache_key(profile, file_hash, ml_model):
+    """Identical uploads with the same model/schema/version reuse one Document AI call"""
+    return make_cache_key(file_hash, ml_model, profile.schema_hash, profile.api_version,
+                          *profile.cache_key_extra)
+
+def extraction_cache_keys(profile, file_hash):
+    """Cache keys an upload's result may be found under, the org's own model first"""
+    return [extraction_cache_key(profile, file_hash, ml_model) for ml_model in profile.ml_models]
+
+def extraction_response(nested_json, document_id, ingestion_result):
+    """Extracted JSON with the stored document id and the ingestion status"""
+    response_data = nested_json.copy()
+    if document_id:
+        response_data['_document_id'] = document_id
+    if ingestion_result:
+        response_data['_ingestion_status'] = ingestion_result
+    return response_data
+
+def store_extraction(profile, cache_key, file_hash, nested_json, filename=None):
+    """Keep an extraction result in the local result store; returns its document id
+
+    Results with failed pages aren't stored, and store errors never fail the extraction.
+    """
+    if result_store is None or not complete_extraction(nested_json):
+        return None
+    ml_model = answered_model(profile, nested_json)
+    try:
+        with metrics.timer('result_store', profile.org_name, ml_model):
+            return result_store.save(profile.org_name, cache_key, nested_json, filename=filename,
+                                     file_hash=file_hash, ml_model=ml_model,
+                                     schema_hash=profile.schema_hash)
+    except Exception as e:
+        logging.error(f"Could not store extraction result: {str(e)}")
+        return None
+
+def extract_document(api_client, profile, file_data, mime_type, filename=None):
+    """Run Document AI extraction and Data Cloud ingestion for one document
+
+    file_data may be bytes or a seekable binary stream (preferred for large files).
+
+    Returns the extracted JSON with an _ingestion_status entry, or raises
+    ExtractionError carrying the error body and HTTP status to report.
+    """
+    if not profile.schema:
+        raise ExtractionError({'error': 'No schema configured. Please configure a schema in the Configuration page.'}, 400)
+
+    org_name, ml_model = profile.org_name, profile.ml_model
+    upload = as_stream(file_data)
+
+    with metrics.timer('extract', org_name, ml_model) as extract_timer:
+        with metrics.timer('upload_read', org_name, ml_model):
+            file_hash = stream_digest(upload)
+        # A result from a fallback model is kept under that model's key
+        cache_keys = extraction_cache_keys(profile, file_hash)
+        nested_json = result_cache.get_or_compute(
+            org_name,
+            cache_keys[0],
+            lambda: run_document_ai(api_client, profile, upload, mime_type),
+            alternates=cache_keys[1:],
+            store_key=lambda value: extraction_cache_key(profile, file_hash, answered_model(profile, value))
+        )
+        ml_model = answered_model(profile, nested_json)
+        extract_timer.label(ml_model)
+        cache_key = extraction_cache_key(profile, file_hash, ml_model)
+        if not complete_extraction(nested_json):
+            # Don't keep serving a result with failed pages; the next upload retries them
+            result_cache.invalidate(org_name, cache_key)
+        document_id = store_extraction(profile, cache_key, file_hash, nested_json, filename)
+
+        ingestion_result = ingest_extracted_data(nested_json, api_client, profile)
+
+    return extraction_response(nested_json, document_id, ingestion_result)
+
+# Per-org limit on extraction calls running at once for batch uploads
+batch_semaphores = {}
+batch_semaphores_lock = threading.Lock()
+
+def get_batch_semaphore(org_name, config):
+    """Get the shared semaphore that caps concurrent batch extractions for an org"""
+    limit = int(config.get('batch_concurrency') or DEFAULT_BATCH_CONCURRENCY)
+    with batch_semaphores_lock:
+        entry = batch_semaphores.get(org_name)
+        # Recreate the semaphore if the org's cap was changed in the configuration
+        if entry is None or entry[0] != limit:
+            entry = batch_semaphores[org_name] = (limit, threading.BoundedSemaphore(limit))
+        return entry
+
+def run_extraction_job(job, upload):
+    """Job queue handler: extract and ingest one stored upload"""
+    org_name = job['org_name']
+    config = get_org_config(org_name)
+    if not config:
+        raise ExtractionError({'error': 'No org configured. Please configure an org in the Configuration page.'}, 400)
+    api_client = APIClient(org_name)
+    if not api_client.is_authenticated():
+        raise ExtractionError({'error': 'Authentication required. Please authenticate with Salesforce first.'}, 401)
+    return extract_document(api_client, profile_registry.get(org_name, config), upload, job['mime_type'],
+                            job.get('filename'))
+
+# Background queue for /extract-data?async=true; use the sqlite backend to share jobs between processes
+if os.environ.get("JOB_QUEUE_BACKEND", "memory").lower() == "sqlite":
+    job_backend = SQLiteJobBackend(
+        os.environ.get("JOB_QUEUE_DB", "jobs.db"),
+        lease_seconds=float(os.environ.get("JOB_LEASE_SECONDS", DEFAULT_JOB_LEASE_SECONDS))
+    )
+else:
+    job_backend = MemoryJobBackend()
+job_queue = JobQueue(
+    job_backend,
+    run_extraction_job,
+    workers=int(os.environ.get("JOB_WORKERS", 2)),
+    upload_dir=os.environ.get("JOB_UPLOAD_DIR", "job_uploads")
+)
+
 @app.route('/extract-data', methods=['POST'])
 def extract_data():
     try:
@@ -441,17 +1382,10 @@ def extract_data():
         if not api_client.is_authenticated():
             return jsonify({'error': 'Authentication required. Please authenticate with Salesforce first.'}), 401
 
-        ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
-        def allowed_file(filename):
-            return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
+        upload_error = validate_upload(request.files.get('file'))
+        if upload_error:
+            return jsonify(upload_error[0]), upload_error[1]
         file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Allowed types are: PDF and images (PNG, JPG, JPEG, TIFF, BMP)'}), 400
 
         # Load schema and ML model from current org configuration
         org_name = get_org_from_request()
@@ -459,139 +1393,224 @@ def extract_data():
         
         if not config:
             return jsonify({'error': 'No org configured. Please configure an org in the Configuration page.'}), 400
-        
-        schema_obj = config.get('schema', get_default_schema())
-        ml_model = config.get('ml_model', DEFAULT_ML_MODEL)
-        api_version = config.get('auth', {}).get('api_version', 'v62.0')
-        
-        if not schema_obj:
-            return jsonify({'error': 'No schema configured. Please configure a schema in the Configuration page.'}), 400
-        
-        file_data = file.read()
-        base64_data = base64.b64encode(file_data).decode('utf-8')
 
-        # Use dynamic instance_url from token file
-        instance_url = api_client.get_instance_url()
-        url = f"{instance_url}/services/data/{api_version}/ssot/document-processing/actions/extract-data"
-
-        payload = {
-            "mlModel": ml_model,
-            "schemaConfig": json.dumps(schema_obj),
-            "files": [
-                {
-                    "mimeType": file.content_type or "image/jpeg",
-                    "data": base64_data
-                }
-            ]
+        # Async mode: store the upload, queue it and return the job ID straight away
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            job_id = job_queue.submit(org_name, file.filename, file.content_type, file.stream)
+            return jsonify({
+                'job_id': job_id,
+                'state': 'queued',
+                'status_url': f'/jobs/{job_id}'
+            }), 202
+        
+        try:
+            result = extract_document(api_client, profile_registry.get(org_name, config),
+                                      file.stream, file.content_type, file.filename)
+        except ExtractionError as e:
+            return jsonify(e.body), e.status_code
+        
+        # Convert the nested JSON to a string with proper encoding; indented only on ?pretty=true
+        pretty = request.args.get('pretty', '').lower() in ('1', 'true', 'yes')
+        formatted_json = json_codec.dumps(result, pretty=pretty)
+        
+        return formatted_json, 200, {
+            'Content-Type': 'application/json; charset=utf-8'
         }
 
-        access_token = api_client.get_access_token()
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {access_token}'
-        }
+    except RequestEntityTooLarge:
+        # Let the 413 handler answer for oversized uploads
+        raise
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
 
-        logging.info(f"Using ML model: {ml_model}")
-        logging.info(f"Using schema: {payload['schemaConfig']}")
+@app.route('/extract-data/batch', methods=['POST'])
+def extract_data_batch():
+    """Extract several uploaded documents in parallel, bounded per org"""
+    try:
+        api_client = get_api_client()
         
-        response = requests.request("POST", url, headers=headers, json=payload, timeout=160)
-            
-        if response.status_code in [200, 201]:
+        if not api_client.is_authenticated():
+            return jsonify({'error': 'Authentication required. Please authenticate with Salesforce first.'}), 401
+
+        files = request.files.getlist('files') or request.files.getlist('file')
+        if not files:
+            return jsonify({'error': 'No files uploaded'}), 400
+
+        org_name = get_org_from_request()
+        config = get_org_config(org_name)
+        
+        if not config:
+            return jsonify({'error': 'No org configured. Please configure an org in the Configuration page.'}), 400
+
+        # Each upload keeps its own (possibly disk-spooled) stream; none are read up front
+        uploads = []
+        for index, file in enumerate(files):
+            uploads.append({
+                'index': index,
+                'filename': file.filename,
+                'mime_type': file.content_type,
+                'stream': file.stream,
+                'upload_error': validate_upload(file)
+            })
+
+        limit, semaphore = get_batch_semaphore(org_name, config)
+        profile = profile_registry.get(org_name, config)
+
+        def process(upload):
+            started = time.monotonic()
+            item = {'index': upload['index'], 'filename': upload['filename']}
             try:
-                # Log raw response for debugging
-                logging.debug(f"Raw response: {response.text}")
-                
-                json_response = response.json()
-                logging.debug(f"JSON response: {json.dumps(json_response, indent=2)}")
-                
-                # Check if response has expected structure
-                if not json_response:
-                    return jsonify({'error': 'Empty response from server'}), 200
-                
-                if 'data' not in json_response or not json_response['data']:
-                    return jsonify({'error': 'No data in response'}), 200
-                
-                # Check for error in the response
-                if json_response['data'][0].get('error'):
-                    error_msg = json_response['data'][0]['error']
-                    if '403' in error_msg:
-                        return jsonify({
-                            'error': 'Authentication error with the OpenAI service. Please check your API credentials.',
-                            'details': error_msg
-                        }), 403
-                    return jsonify({
-                        'error': 'Service error',
-                        'details': error_msg
-                    }), 500
-                
-                nested_json_str = json_response['data'][0].get('data')
-                if not nested_json_str:
-                    return jsonify({'error': 'No extracted data in response'}), 200
-                
-                # Replace HTML entities
-                nested_json_str = nested_json_str.replace('&quot;', '"').replace('&#92;', '\\')
-                
-                # Parse the JSON string
-                nested_json = json.loads(nested_json_str)
-                
-                # Try to ingest to Data Cloud
-                ingestion_result = None
-                try:
-                    # Get Data Cloud token
-                    dc_credentials = get_datacloud_token(access_token, instance_url.replace('https://', '').replace('http://', ''))
-                    
-                    if dc_credentials:
-                        # Get connector and object names from config
-                        connector_name = config.get('datacloud_connector_name', 'ContactIngestion')
-                        object_name = config.get('datacloud_object_name', 'LeadRecord')
-                        
-                        # Ingest data
-                        ingestion_result = ingest_to_datacloud(
-                            nested_json,
-                            dc_credentials['access_token'],
-                            dc_credentials['instance_url'],
-                            connector_name,
-                            object_name
-                        )
-                        
-                        if ingestion_result and ingestion_result.get('success'):
-                            logging.info(f"✓ Successfully ingested {ingestion_result.get('records_ingested', 0)} records to Data Cloud")
-                        else:
-                            logging.warning(f"✗ Data Cloud ingestion failed: {ingestion_result.get('error', 'Unknown error')}")
-                    else:
-                        logging.warning("✗ Could not obtain Data Cloud token, skipping ingestion")
-                        
-                except Exception as ingest_error:
-                    logging.error(f"✗ Exception during Data Cloud ingestion: {str(ingest_error)}")
-                    # Don't fail the main request if ingestion fails
-                
-                # Prepare response with ingestion status
-                response_data = nested_json.copy()
-                if ingestion_result:
-                    response_data['_ingestion_status'] = ingestion_result
-                
-                # Convert the nested JSON to a string with proper encoding
-                formatted_json = json.dumps(response_data, ensure_ascii=False, indent=2)
-                
-                return formatted_json, 200, {
-                    'Content-Type': 'application/json; charset=utf-8'
-                }
-            except (KeyError, IndexError, json.JSONDecodeError) as e:
-                return jsonify({
-                    'error': f'Error processing response: {str(e)}',
-                    'raw_response': response.text
-                }), 500
-        else:
-            return jsonify({
-                'error': f'API request failed with status {response.status_code}',
-                'details': response.text
-            }), response.status_code
+                if upload['upload_error']:
+                    raise ExtractionError(*upload['upload_error'])
+                with semaphore:
+                    item['data'] = extract_document(
+                        api_client, profile, upload['stream'], upload['mime_type'], upload['filename']
+                    )
+                item['success'] = True
+                item['status_code'] = 200
+            except Exception as e:
+                item.update(outcome_error(e))
+            item['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+            return item
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(limit, len(uploads))) as executor:
+            results = list(executor.map(process, uploads))
 
+        return jsonify(batch_response(results, limit, started))
+
+    except RequestEntityTooLarge:
+        # Let the 413 handler answer for oversized uploads
+        raise
     except Exception as e:
         return jsonify({
             'error': str(e)
         }), 500
 
+def batch_response(results, limit, started):
+    """Per-file results of a batch upload with a summary"""
+    succeeded = sum(1 for item in results if item['success'])
+    return {
+        'results': results,
+        'summary': {
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'concurrency': limit,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        }
+    }
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get state, timings and result of an async extraction job"""
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ingestion/<ticket_id>', methods=['GET'])
+def get_ingestion_status(ticket_id):
+    """Get the status of a document's queued Data Cloud ingestion"""
+    ticket = ingestion_batcher.get(ticket_id)
+    if not ticket:
+        return jsonify({'error': 'Ingestion ticket not found'}), 404
+    return jsonify(ticket)
+
+@app.route('/api/results', methods=['GET'])
+def get_results():
+    """Query the current org's stored extraction records, newest first (by date when filtering on it)
+
+    Filters: email, company (prefix), event, date_from/date_to (YYYY-MM-DD or
+    DD/MM/YYYY) and document_id. Pass next_cursor back as cursor for the next page.
+    """
+    if result_store is None:
+        return jsonify({'error': 'The result store is disabled (RESULT_STORE=none)'}), 404
+    try:
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit', DEFAULT_RESULTS_PAGE_SIZE, type=int)
+        filters = {name: request.args.get(name) or None
+                   for name in ('email', 'company', 'event', 'date_from', 'date_to', 'document_id')}
+        org_name = get_org_from_request()
+        with metrics.timer('result_query', org_name):
+            page = result_store.query_records(org_name, cursor=cursor, limit=limit, **filters)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/results/documents/<document_id>', methods=['GET'])
+def get_result_document(document_id):
+    """Get a stored document of the current org with its full extraction result"""
+    if result_store is None:
+        return jsonify({'error': 'The result store is disabled (RESULT_STORE=none)'}), 404
+    document = result_store.get_document(get_org_from_request(), document_id)
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    return jsonify(document)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Get cache and connection counters for this process"""
+    return jsonify({
+        'datacloud_token_cache': datacloud_token_cache.stats(),
+        'token_file_reads': token_registry.reads,
+        'token_refresher': token_refresher.stats(),
+        'http_sessions': http_sessions.stats(),
+        'job_queue': job_queue.stats(),
+        'result_cache': result_cache.stats(),
+        'ingestion_batcher': ingestion_batcher.stats(),
+        'org_profiles': profile_registry.stats(),
+        'admission': admission.stats(),
+        'model_router': model_router.stats(),
+        'result_store': result_store.stats() if result_store is not None else None,
+        'lead_index': lead_index.stats()
+    })
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    """Rolling p50/p95 latency and error rate per org and ML model, with the order models are tried in"""
+    stats = model_router.stats()
+    stats['routing'] = {}
+    for org_name in list_orgs():
+        profile = profile_registry.get(org_name)
+        if profile is not None:
+            stats['routing'][org_name] = {
+                'models': model_router.order(org_name, profile.ml_models),
+                'hedging': hedging_enabled(profile)
+            }
+    return jsonify(stats)
+
+@app.route('/api/admission', methods=['GET'])
+def get_admission():
+    """Running and queued upstream calls, wait times and Salesforce API usage per org"""
+    return jsonify(admission.stats())
+
+@app.route('/api/circuits', methods=['GET'])
+def get_circuits():
+    """Retry count and circuit breaker state per org and upstream endpoint"""
+    return jsonify(upstream_resilience.stats())
+
+@app.route('/api/circuits/reset', methods=['POST'])
+def reset_circuits():
+    """Close the circuits of one org (?org=) or of all orgs"""
+    org_name = request.args.get('org')
+    upstream_resilience.reset(org_name)
+    return jsonify({'success': True, 'org': org_name})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Pipeline metrics in the Prometheus text format"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return metrics.render(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
 @app.route('/json-jazz')
 def json_jazz():
     return render_template('json-jazz.html')
@@ -627,6 +1646,11 @@ def get_config():
                 'api_version': config.get('auth', {}).get('api_version', 'v63.0')
             },
             'ml_model': config.get('ml_model', DEFAULT_ML_MODEL),
+            'fallback_models': config.get('fallback_models', []),
+            'hedge': config.get('hedge'),
+            'dedup': config.get('dedup', {}),
+            'admission': config.get('admission', {}),
+            'batch_concurrency': config.get('batch_concurrency'),
             'datacloud_connector_name': config.get('datacloud_connector_name', 'ContactIngestion'),
             'datacloud_object_name': config.get('datacloud_object_name', 'LeadRecord'),
             'schema': schema
@@ -649,6 +1673,10 @@ def save_config():
         if 'schema' in data:
             if not isinstance(data['schema'], dict):
                 return jsonify({'error': 'Schema must be a valid JSON object'}), 400
+        if 'dedup' in data and not valid_dedup_settings(data['dedup']):
+            return jsonify({'error': f"dedup must be an object with a policy of {', '.join(DEDUP_POLICIES)}"}), 400
+        if 'admission' in data and not valid_admission_limits(data['admission']):
+            return jsonify({'error': f"admission must map {', '.join(DEFAULT_LANE_CAPACITY)} to positive integers"}), 400
         
         # Get or create a current org
         org_name = get_org_from_request()
@@ -662,18 +1690,18 @@ def save_config():
         success = create_or_update_org(org_name, data)
         
         if success:
+            # Cached extractions may have been produced with the old schema/model
+            result_cache.invalidate_org(org_name)
+
             # Set as current org if it wasn't already
             set_current_org(org_name)
-            
-            # Reload config module to pick up new values
-            import importlib
-            import config
-            importlib.reload(config)
+            profile = profile_registry.compile(org_name)
             
             response = make_response(jsonify({
                 'success': True, 
                 'message': 'Configuration saved successfully',
-                'org': org_name
+                'org': org_name,
+                'schema_hash': profile.schema_hash if profile else None
             }))
             # Set cookie to remember this org
             response.set_cookie('current_org', org_name, max_age=30*24*60*60)
@@ -691,11 +1719,6 @@ def reset_config():
     try:
         config = initialize_config()
         
-        # Reload config module
-        import importlib
-        import config as config_module
-        importlib.reload(config_module)
-        
         return jsonify({'success': True, 'message': 'Configuration reset to defaults'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -741,7 +1764,7 @@ def test_endpoint():
         # Make a simple GET request to check if the endpoint exists
         # (POST would require a valid payload)
         test_url = f"{instance_url}/services/data/{api_version}/ssot/document-processing"
-        response = requests.get(test_url, headers=headers, timeout=10)
+        response = http_sessions.get(test_url, org_name=org_name, headers=headers, timeout=10)
         
         # Generate curl commands for manual testing
         curl_test = f"curl -X GET \"{test_url}\" \\\n  -H \"Authorization: Bearer {access_token[:20]}...{access_token[-10:]}\""
@@ -829,6 +1852,11 @@ def get_org(org_name):
                 'api_version': config.get('auth', {}).get('api_version', 'v62.0')
             },
             'ml_model': config.get('ml_model', DEFAULT_ML_MODEL),
+            'fallback_models': config.get('fallback_models', []),
+            'hedge': config.get('hedge'),
+            'dedup': config.get('dedup', {}),
+            'admission': config.get('admission', {}),
+            'batch_concurrency': config.get('batch_concurrency'),
             'datacloud_connector_name': config.get('datacloud_connector_name', 'ContactIngestion'),
             'datacloud_object_name': config.get('datacloud_object_name', 'LeadRecord'),
             'schema': config.get('schema', {})
@@ -851,6 +1879,10 @@ def create_or_update_org_route(org_name):
         if 'schema' in data:
             if not isinstance(data['schema'], dict):
                 return jsonify({'error': 'Schema must be a valid JSON object'}), 400
+        if 'dedup' in data and not valid_dedup_settings(data['dedup']):
+            return jsonify({'error': f"dedup must be an object with a policy of {', '.join(DEDUP_POLICIES)}"}), 400
+        if 'admission' in data and not valid_admission_limits(data['admission']):
+            return jsonify({'error': f"admission must map {', '.join(DEFAULT_LANE_CAPACITY)} to positive integers"}), 400
         
         # Get existing config to preserve client_secret if not provided
         existing_config = get_org_config(org_name)
@@ -863,9 +1895,12 @@ def create_or_update_org_route(org_name):
         success = create_or_update_org(org_name, data)
         
         if success:
+            result_cache.invalidate_org(org_name)
+            profile = profile_registry.compile(org_name)
             return jsonify({
                 'success': True,
-                'message': f'Org "{org_name}" saved successfully'
+                'message': f'Org "{org_name}" saved successfully',
+                'schema_hash': profile.schema_hash if profile else None
             })
         else:
             return jsonify({'error': 'Failed to save org configuration'}), 500
@@ -884,6 +1919,11 @@ def delete_org_route(org_name):
             token_file = get_org_token_file(org_name)
             if os.path.exists(token_file):
                 os.remove(token_file)
+            token_registry.invalidate(token_file)
+            datacloud_token_cache.invalidate(org_name)
+            http_sessions.close(org_name)
+            result_cache.invalidate_org(org_name)
+            profile_registry.discard(org_name)
             
             return jsonify({
                 'success': True,
@@ -0,0 +1,605 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from tempfile import SpooledTemporaryFile
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+
+import app as sync_app
+from app import (
+    app, ExtractionError, validate_upload, get_api_client, get_org_from_request, get_org_config,
+    get_batch_semaphore, retry_after_unauthorized, model_call_ok, plan_document_ai_call,
+    worth_another_model, record_abandoned_primary, refresh_after_unauthorized, unavailable_error,
+    document_ai_result, ingestion_chunks, ingestion_chunk_result, ingestion_chunk_error,
+    combine_chunk_results, log_ingestion_result, pdf_part_page, outcome_error, merge_pdf_outcomes,
+    split_upload, normalize_upload, complete_extraction, answered_model, extraction_cache_key,
+    extraction_cache_keys, extraction_response, store_extraction, prepare_ingestion, settle_ingestion,
+    abandon_ingestion, batch_response, datacloud_token_cache, result_cache, profile_registry, token_refresher,
+    upstream_resilience, admission, model_router, ingestion_batcher
+)
+from admission import AdmissionRejected
+from json_codec import dumps as json_dumps
+from metrics import metrics
+from resilience import CircuitOpenError
+from upload_stream import Base64JSONBody, SharedReader, SpoolingRequest, stream_digest
+
+# Async serving mode: /extract-data and /extract-data/batch run on the event loop with an
+# async HTTP client, so one worker can hold hundreds of Document AI calls open at once.
+# Every other route (and ?async=true job submission) is served by the Flask app.
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 3000
+#   gunicorn asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT --timeout 180
+
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("ASYNC_MAX_CONNECTIONS", 500))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get("ASYNC_MAX_KEEPALIVE", 100))
+CONNECT_TIMEOUT = sync_app.http_sessions.connect_timeout
+
+# Body chunk handed to the async client per read of the streamed base64 JSON body
+BODY_CHUNK_BYTES = 256 * 1024
+
+flask_application = WsgiToAsgi(app)
+
+_client: Optional[httpx.AsyncClient] = None
+_token_exchanges: Dict[Tuple[str, str], asyncio.Future] = {}
+_extractions: Dict[Tuple[str, str], asyncio.Future] = {}
+_batch_semaphores: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared async client for every upstream call made by this worker"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_MAX_KEEPALIVE),
+            # Honour the same CA bundle override as the requests-based sync path
+            verify=os.environ.get('REQUESTS_CA_BUNDLE') or True
+        )
+    return _client
+
+
+async def upstream_request(upstream, org_name, method, url, timeout, **kwargs):
+    """Send one upstream request and count its status for /metrics"""
+    try:
+        response = await get_client().request(
+            method, url, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT), **kwargs
+        )
+    except httpx.HTTPError:
+        metrics.count_response(upstream, org_name, 'error')
+        raise
+    metrics.count_response(upstream, org_name, response.status_code)
+    return response
+
+
+async def _stream_body(body: Base64JSONBody):
+    # Each read base64-encodes the next piece of the spooled upload, so it runs in a thread
+    while True:
+        chunk = await asyncio.to_thread(body.read, BODY_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def uploaded_files():
+    """request.files, with the multipart body parsed in a thread (Werkzeug caches the result)"""
+    current_request = request._get_current_object()
+    return await asyncio.to_thread(lambda: current_request.files)
+
+
+# Upstream calls: only the I/O differs from app.py, the decisions are made by its helpers
+
+async def call_document_ai_async(api_client, profile, upload, mime_type):
+    """app.call_document_ai on the event loop"""
+    models, delay = plan_document_ai_call(profile)
+    if delay is not None:
+        return await hedged_document_ai_async(api_client, profile, models, upload, mime_type, delay)
+    return await call_document_ai_model_async(api_client, profile, models[0], upload, mime_type), models[0]
+
+
+async def hedged_document_ai_async(api_client, profile, models, upload, mime_type, delay):
+    """app.hedged_document_ai on the event loop; the slower call is cancelled"""
+    lock = threading.Lock()
+    started = time.monotonic()
+    primary = asyncio.ensure_future(call_document_ai_model_async(
+        api_client, profile, models[0], SharedReader(upload, lock), mime_type))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        error = primary.exception() if done else None
+        if done and error is None:
+            return primary.result(), models[0]
+        if error is None:
+            logging.info(f"{models[0]} slower than {delay:.1f}s, hedging with {models[1]}")
+        elif worth_another_model(error):
+            logging.info(f"{models[0]} failed ({str(error)}), falling back to {models[1]}")
+        else:
+            raise error
+
+        backup = asyncio.ensure_future(call_document_ai_model_async(
+            api_client, profile, models[1], SharedReader(upload, lock), mime_type))
+        tasks.append(backup)
+        pending = {backup} if error else set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if task is backup and not primary.done():
+                    # Cancelled below, so its own outcome is never recorded
+                    record_abandoned_primary(profile.org_name, models[0], started)
+                model_router.record_hedge(profile.org_name, task is backup)
+                return task.result(), models[1] if task is backup else models[0]
+        model_router.record_hedge(profile.org_name, False)
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_document_ai_model_async(api_client, profile, ml_model, upload, mime_type):
+    """app.call_document_ai_model on the event loop"""
+    org_name = profile.org_name
+    body = Base64JSONBody(ml_model, profile.schema_config, mime_type or "image/jpeg", upload,
+                          head=profile.body_heads[ml_model])
+    logging.info(f"Upload size: {body.source_size} bytes, request body: {len(body)} bytes")
+
+    async def send(access_token):
+        url = profile.extract_url(api_client.get_instance_url())
+        headers = {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(body)),
+            'Authorization': f'Bearer {access_token}'
+        }
+        body.seek(0)
+        started = time.monotonic()
+        try:
+            with metrics.timer('document_ai', org_name, ml_model):
+                response = await upstream_request('document_ai', org_name, 'POST', url, 160,
+                                                  content=_stream_body(body), headers=headers)
+        except httpx.HTTPError:
+            model_router.record(org_name, ml_model, time.monotonic() - started, False)
+            raise
+        model_router.record(org_name, ml_model, time.monotonic() - started, model_call_ok(response.status_code))
+        admission.observe_limit_info(org_name, response.headers.get('Sforce-Limit-Info'))
+        return response
+
+    access_token = api_client.get_access_token()
+    try:
+        async with admission.slot_async(org_name, 'document_ai'):
+            response = await upstream_resilience.call_async(org_name, 'document_ai', lambda: send(access_token))
+            if response.status_code == 401:
+                refreshed_token = await asyncio.to_thread(refresh_after_unauthorized, org_name,
+                                                          access_token, response)
+                if refreshed_token:
+                    response = await upstream_resilience.call_async(org_name, 'document_ai',
+                                                                    lambda: send(refreshed_token))
+    except (CircuitOpenError, AdmissionRejected) as e:
+        raise unavailable_error(e)
+    metrics.observe('base64_encode', body.encode_seconds, org_name, ml_model)
+    # Parsing a large extraction result is CPU work
+    return await asyncio.to_thread(document_ai_result, response, org_name, ml_model)
+
+
+async def exchange_datacloud_token_async(salesforce_access_token, instance_url, org_name=None):
+    """app.exchange_datacloud_token on the event loop; caches the result"""
+    token_data = None
+    try:
+        with metrics.timer('token_exchange', org_name):
+            response = await upstream_resilience.call_async(org_name, 'datacloud_token', lambda: upstream_request(
+                'datacloud_token', org_name, 'POST', f"https://{instance_url}/services/a360/token", 30,
+                data={
+                    'grant_type': 'urn:salesforce:grant-type:external:cdp',
+                    'subject_token': salesforce_access_token,
+                    'subject_token_type': 'urn:ietf:params:oauth:token-type:access_token'
+                }
+            ))
+        admission.observe_limit_info(org_name, response.headers.get('Sforce-Limit-Info'))
+        if response.status_code == 200:
+            token_data = response.json()
+            logging.info("Successfully obtained Data Cloud token")
+        else:
+            logging.error(f"Failed to get Data Cloud token: {response.status_code} {response.text}")
+    except Exception as e:
+        logging.error(f"Exception during token exchange: {str(e)}")
+    return datacloud_token_cache.store(org_name, salesforce_access_token, token_data)
+
+
+async def get_datacloud_token_async(salesforce_access_token, instance_url, org_name=None):
+    """Cached Data Cloud token; concurrent misses for the same token share one exchange"""
+    credentials = datacloud_token_cache.peek(org_name, salesforce_access_token)
+    if credentials:
+        return credentials
+    key = (org_name or '', hashlib.sha256(salesforce_access_token.encode('utf-8')).hexdigest())
+    pending = _token_exchanges.get(key)
+    if pending is None:
+        pending = _token_exchanges[key] = asyncio.ensure_future(
+            exchange_datacloud_token_async(salesforce_access_token, instance_url, org_name)
+        )
+        pending.add_done_callback(lambda _: _token_exchanges.pop(key, None))
+    return await asyncio.shield(pending)
+
+
+async def post_ingestion_chunk_async(records, dc_token, dc_instance_url, connector_name, object_name, org_name=None):
+    """app.post_ingestion_chunk on the event loop"""
+    ingestion_url = f"https://{dc_instance_url}/api/v1/ingest/sources/{connector_name}/{object_name}"
+    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {dc_token}'}
+    body = json_dumps({"data": records}).encode('utf-8')
+    attempts = 0
+
+    def send():
+        nonlocal attempts
+        attempts += 1
+        return upstream_request('datacloud_ingest', org_name, 'POST', ingestion_url, 30,
+                                content=body, headers=headers)
+
+    try:
+        async with admission.slot_async(org_name, 'ingestion'):
+            response = await upstream_resilience.call_async(org_name, 'datacloud_ingest', send, idempotent=False,
+                                                            max_retries=sync_app.INGEST_CHUNK_RETRIES)
+        return ingestion_chunk_result(records, response, attempts)
+    except Exception as e:
+        return ingestion_chunk_error(records, e)
+
+
+async def send_ingestion_records_async(org_name, connector_name, object_name, records, api_client):
+    """app.send_ingestion_records on the event loop"""
+    chunks = ingestion_chunks(records)
+    limit = asyncio.Semaphore(sync_app.INGEST_CHUNK_PARALLELISM)
+
+    for attempt in range(2):
+        access_token = api_client.get_access_token()
+        instance_url = api_client.get_instance_url()
+        dc_credentials = await get_datacloud_token_async(
+            access_token, instance_url.replace('https://', '').replace('http://', ''), org_name
+        )
+        if not dc_credentials:
+            logging.warning("✗ Could not obtain Data Cloud token, skipping ingestion")
+            return None
+
+        async def post(chunk):
+            async with limit:
+                return await post_ingestion_chunk_async(chunk, dc_credentials['access_token'],
+                                                        dc_credentials['instance_url'],
+                                                        connector_name, object_name, org_name)
+
+        with metrics.timer('ingestion', org_name):
+            chunk_results = await asyncio.gather(*(post(chunk) for chunk in chunks))
+        ingestion_result = combine_chunk_results(chunk_results)
+        if attempt or not await asyncio.to_thread(retry_after_unauthorized, org_name, access_token, ingestion_result):
+            break
+    log_ingestion_result(ingestion_result)
+    return ingestion_result
+
+
+# Extraction pipeline
+
+async def extract_pdf_parts_async(api_client, profile, parts):
+    """app.extract_pdf_parts on the event loop"""
+    limit = asyncio.Semaphore(profile.pdf_split_settings['max_parallel'])
+
+    async def extract_part(part):
+        first_page, last_page, stream = part
+        page = pdf_part_page(first_page, last_page)
+        result = None
+        async with limit:
+            started = time.monotonic()
+            try:
+                result, ml_model = await call_document_ai_async(api_client, profile, stream, 'application/pdf')
+                page.update({'success': True, 'status_code': 200, 'ml_model': ml_model})
+            except Exception as e:
+                page.update(outcome_error(e))
+        page['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result, page
+
+    outcomes = await asyncio.gather(*(extract_part(part) for part in parts))
+    return await asyncio.to_thread(merge_pdf_outcomes, outcomes, profile.schema)
+
+
+async def run_document_ai_async(api_client, profile, upload, mime_type):
+    """app.run_document_ai on the event loop; preprocessing runs in threads"""
+    parts = await asyncio.to_thread(split_upload, profile, upload, mime_type)
+    if parts:
+        try:
+            return await extract_pdf_parts_async(api_client, profile, parts)
+        finally:
+            for _, _, part in parts:
+                part.close()
+
+    document, document_mime_type = await asyncio.to_thread(normalize_upload, profile, upload, mime_type)
+    try:
+        result, ml_model = await call_document_ai_async(api_client, profile, document, document_mime_type)
+        return dict(result, _ml_model=ml_model)
+    finally:
+        if document is not upload:
+            document.close()
+
+
+async def cached_extraction(org_name, cache_keys, compute, store_key):
+    """result_cache lookup with in-flight coalescing on the event loop; disk reads and writes run in threads
+
+    cache_keys and store_key are used as in ResultCache.get_or_compute.
+    """
+    value = await asyncio.to_thread(result_cache.get, org_name, cache_keys[0], cache_keys[1:])
+    if value is not None:
+        return value
+    key = (org_name or '', cache_keys[0])
+    pending = _extractions.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    pending = _extractions[key] = asyncio.ensure_future(compute())
+    try:
+        value = await asyncio.shield(pending)
+    finally:
+        _extractions.pop(key, None)
+    if complete_extraction(value):
+        await asyncio.to_thread(result_cache.put, org_name, store_key(value), value)
+    return value
+
+
+async def ingest_extracted_data_async(nested_json, api_client, profile):
+    """app.ingest_extracted_data on the event loop; the lead index and batcher are used from threads"""
+    changes = []
+    try:
+        records, dedup, changes = await asyncio.to_thread(prepare_ingestion, nested_json, profile)
+        sent = None
+        if records and sync_app.INGESTION_MODE == 'sync':
+            sent = await send_ingestion_records_async(profile.org_name, profile.connector_name,
+                                                      profile.object_name, records, api_client)
+        return await asyncio.to_thread(settle_ingestion, profile, records, dedup, changes, sent)
+    except Exception as ingest_error:
+        return await asyncio.to_thread(abandon_ingestion, profile, changes, ingest_error)
+
+
+async def extract_document_async(api_client, profile, upload, mime_type, filename=None):
+    """app.extract_document on the event loop"""
+    if not profile.schema:
+        raise ExtractionError({'error': 'No schema configured. Please configure a schema in the Configuration page.'}, 400)
+    org_name, ml_model = profile.org_name, profile.ml_model
+
+    with metrics.timer('extract', org_name, ml_model) as extract_timer:
+        with metrics.timer('upload_read', org_name, ml_model):
+            file_hash = await asyncio.to_thread(stream_digest, upload)
+        nested_json = await cached_extraction(
+            org_name,
+            extraction_cache_keys(profile, file_hash),
+            lambda: run_document_ai_async(api_client, profile, upload, mime_type),
+            lambda value: extraction_cache_key(profile, file_hash, answered_model(profile, value))
+        )
+        ml_model = answered_model(profile, nested_json)
+        extract_timer.label(ml_model)
+        cache_key = extraction_cache_key(profile, file_hash, ml_model)
+        # SQLite writes stay off the event loop
+        document_id = await asyncio.to_thread(store_extraction, profile, cache_key, file_hash, nested_json, filename)
+        ingestion_result = await ingest_extracted_data_async(nested_json, api_client, profile)
+    return extraction_response(nested_json, document_id, ingestion_result)
+
+
+# Routes (run inside a Flask request context built from the ASGI request)
+
+async def extract_data_route():
+    api_client = get_api_client()
+    if not api_client.is_authenticated():
+        return 401, {'error': 'Authentication required. Please authenticate with Salesforce first.'}
+
+    files = await uploaded_files()
+    upload_error = validate_upload(files.get('file'))
+    if upload_error:
+        return upload_error[1], upload_error[0]
+    file = files['file']
+
+    org_name = get_org_from_request()
+    config = get_org_config(org_name)
+    if not config:
+        return 400, {'error': 'No org configured. Please configure an org in the Configuration page.'}
+
+    try:
+        result = await extract_document_async(api_client, profile_registry.get(org_name, config),
+                                              file.stream, file.content_type, file.filename)
+    except ExtractionError as e:
+        return e.status_code, e.body
+    pretty = request.args.get('pretty', '').lower() in ('1', 'true', 'yes')
+    return 200, await asyncio.to_thread(json_dumps, result, pretty=pretty)
+
+
+async def extract_data_batch_route():
+    api_client = get_api_client()
+    if not api_client.is_authenticated():
+        return 401, {'error': 'Authentication required. Please authenticate with Salesforce first.'}
+
+    uploads = await uploaded_files()
+    files = uploads.getlist('files') or uploads.getlist('file')
+    if not files:
+        return 400, {'error': 'No files uploaded'}
+
+    org_name = get_org_from_request()
+    config = get_org_config(org_name)
+    if not config:
+        return 400, {'error': 'No org configured. Please configure an org in the Configuration page.'}
+
+    limit, _ = get_batch_semaphore(org_name, config)
+    profile = profile_registry.get(org_name, config)
+    semaphore = _batch_semaphores.get((org_name, limit))
+    if semaphore is None:
+        semaphore = _batch_semaphores[(org_name, limit)] = asyncio.Semaphore(limit)
+
+    async def process(index, file):
+        started = time.monotonic()
+        item = {'index': index, 'filename': file.filename}
+        try:
+            upload_error = validate_upload(file)
+            if upload_error:
+                raise ExtractionError(*upload_error)
+            async with semaphore:
+                item['data'] = await extract_document_async(api_client, profile, file.stream, file.content_type,
+                                                            file.filename)
+            item['success'] = True
+            item['status_code'] = 200
+        except Exception as e:
+            item.update(outcome_error(e))
+        item['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return item
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(process(index, file) for index, file in enumerate(files)))
+    return 200, batch_response(results, limit, started)
+
+
+ASYNC_ROUTES = {
+    '/extract-data': extract_data_route,
+    '/extract-data/batch': extract_data_batch_route
+}
+
+
+# ASGI plumbing
+
+def build_environ(scope, body, content_length: int) -> Dict[str, Any]:
+    """WSGI environ for an ASGI HTTP request whose body has been read into a file"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(content_length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(scope, receive, max_bytes: Optional[int]):
+    """Read the request body into a spooled temp file; None if it exceeds max_bytes
+
+    Raises ValueError for a malformed Content-Length header.
+    """
+    for name, value in scope.get('headers', []):
+        if name == b'content-length':
+            try:
+                length = int(value)
+            except ValueError:
+                raise ValueError(f"Invalid Content-Length: {value.decode('latin-1')}") from None
+            if length < 0:
+                raise ValueError(f"Invalid Content-Length: {length}")
+            if max_bytes and length > max_bytes:
+                return None, 0
+    body = SpooledTemporaryFile(max_size=SpoolingRequest.spool_bytes, mode='w+b')
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            raise ConnectionAbortedError('Client disconnected')
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            body.close()
+            return None, 0
+        body.write(chunk)
+        if not message.get('more_body'):
+            break
+    body.seek(0)
+    return body, size
+
+
+async def send_response(send, status: int, payload) -> None:
+    if isinstance(payload, str):
+        content = payload.encode('utf-8')
+        content_type = b'application/json; charset=utf-8'
+    else:
+        # Batch responses carry every file's result
+        content = (await asyncio.to_thread(json_dumps, payload)).encode('utf-8')
+        content_type = b'application/json'
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(content)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': content})
+
+
+async def handle_async_route(route, scope, receive, send) -> None:
+    max_bytes = app.config.get('MAX_CONTENT_LENGTH')
+    try:
+        body, size = await read_body(scope, receive, max_bytes)
+    except ConnectionAbortedError:
+        return
+    except ValueError as e:
+        await send_response(send, 400, {'error': str(e)})
+        return
+    if body is None:
+        await send_response(send, 413, {'error': 'Upload too large', 'max_bytes': max_bytes})
+        return
+    try:
+        with app.request_context(build_environ(scope, body, size)):
+            try:
+                status, payload = await route()
+            except Exception as e:
+                logging.error(f"Async route {scope['path']} failed: {str(e)}")
+                status, payload = 500, {'error': str(e)}
+        await send_response(send, status, payload)
+    finally:
+        body.close()
+
+
+async def handle_lifespan(receive, send) -> None:
+    global _client
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Send queued ingestion batches before the worker exits
+            await asyncio.to_thread(ingestion_batcher.flush_all)
+            token_refresher.stop()
+            if _client is not None:
+                await _client.aclose()
+                _client = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def wants_job_queue(scope) -> bool:
+    query = scope.get('query_string', b'').decode('latin-1').lower()
+    return any(part in ('async=1', 'async=true', 'async=yes') for part in query.split('&'))
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: async extraction routes, everything else through the Flask app"""
+    if scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        route = ASYNC_ROUTES.get(scope['path'])
+        if route is not None and not wants_job_queue(scope):
+            await handle_async_route(route, scope, receive, send)
+            return
+    await flask_application(scope, receive, send)
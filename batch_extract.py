@@ -0,0 +1,321 @@
+"""Headless batch extraction: run a directory or glob of documents through Document AI and Data Cloud
+
+Uses the org configuration from config_manager and the org's stored token,
+exactly like the web app, with a pool of worker threads:
+
+    python batch_extract.py scans/ --org acme --workers 8 --output acme.ndjson
+    python batch_extract.py 'backlog/**/*.pdf' --output backlog.ndjson
+
+Each document's result (or error) is appended to the NDJSON output. A
+checkpoint manifest next to it (<output>.manifest) records finished files,
+so re-running the same command after an interruption skips them; files that
+failed are tried again. A throughput and latency summary ends the run.
+
+Ingestion defaults to sync mode so a file is only checkpointed once its
+records reached Data Cloud; --ingestion background/bulk batch records across
+files and flush them at the end of the run. A file whose records are queued
+is checkpointed as queued, then as done (or failed) once its batch was sent.
+"""
+import argparse
+import glob
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def find_documents(patterns: Iterable[str], allowed) -> List[str]:
+    """Absolute paths of the supported documents in the given directories, files and globs"""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                found.update(os.path.join(root, name) for name in files)
+        elif os.path.isfile(pattern):
+            found.add(pattern)
+        else:
+            found.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in found if allowed(os.path.basename(path)))
+
+
+def file_signature(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class Manifest:
+    """Append-only NDJSON checkpoint of finished files; the last entry per file wins"""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if not restart and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short when the previous run was killed
+                        continue
+                    self.entries[entry['file']] = entry
+        self._file = open(path, 'w' if restart else 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def is_done(self, path: str) -> bool:
+        entry = self.entries.get(path)
+        if not entry or entry.get('status') != 'done':
+            return False
+        # A file changed since it was processed is done again
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return False
+        return entry.get('size') == signature['size'] and entry.get('mtime_ns') == signature['mtime_ns']
+
+    def record(self, path: str, signature: Dict[str, int], status: str) -> None:
+        entry = dict(signature, file=path, status=status, finished_at=time.time())
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.entries[path] = entry
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def process_file(app, api_client, org_name: str, config: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Extract and ingest one document; returns its output record"""
+    started = time.perf_counter()
+    record: Dict[str, Any] = {'file': path}
+    try:
+        signature = file_signature(path)
+        record.update(signature)
+        mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        with open(path, 'rb') as f:
+            result = app.extract_document(api_client, app.profile_registry.get(org_name, config), f, mime_type,
+                                          path)
+        # No ingestion status means the document had no records; records that weren't sent report a failure
+        ingestion = result.get('_ingestion_status') or {}
+        record.update(success=ingestion.get('success', True), result=result)
+        if ingestion.get('ticket_id'):
+            # Background/bulk mode: the outcome is known once the batch holding the records was sent
+            record['ingestion_ticket'] = ingestion['ticket_id']
+        elif not record['success']:
+            record['error'] = {'error': 'Data Cloud ingestion failed', 'details': ingestion.get('error')}
+    except app.ExtractionError as e:
+        record.update(success=False, status_code=e.status_code, error=e.body)
+    except Exception as e:
+        record.update(success=False, status_code=500, error={'error': str(e)})
+    record['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+def run_batch(app, args, paths: List[str], manifest: Manifest, output) -> Dict[str, Any]:
+    from ingest_batcher import QUEUED, SENDING, SUCCEEDED
+    from json_codec import dumps as json_dumps
+    from model_router import percentile
+
+    org_name = args.org
+    config = app.get_org_config(org_name)
+    api_client = app.APIClient(org_name)
+    todo = [path for path in paths if not manifest.is_done(path)]
+    skipped = len(paths) - len(todo)
+    print(f"{len(paths)} documents, {skipped} already done, {len(todo)} to process "
+          f"with {args.workers} workers", file=sys.stderr)
+
+    output_lock = threading.Lock()
+    latencies: List[float] = []
+    finished = 0
+    succeeded = 0
+    failed = 0
+    processed_bytes = 0
+    # ticket id -> output record of a file whose records wait in an ingestion batch
+    queued: Dict[str, Dict[str, Any]] = {}
+    batches_seen = 0
+    interrupted = False
+    started = time.perf_counter()
+
+    def write(record: Dict[str, Any]) -> None:
+        with output_lock:
+            output.write(json_dumps(record) + '\n')
+            output.flush()
+
+    def checkpoint(record: Dict[str, Any], status: str) -> None:
+        if record.get('size') is not None:
+            manifest.record(record['file'], {'size': record['size'], 'mtime_ns': record['mtime_ns']}, status)
+
+    def finish(record: Dict[str, Any]) -> None:
+        nonlocal finished, succeeded, failed, processed_bytes
+        finished += 1
+        write(record)
+        ticket_id = record.get('ingestion_ticket')
+        if ticket_id:
+            checkpoint(record, 'queued')
+            queued[ticket_id] = record
+        else:
+            checkpoint(record, 'done' if record['success'] else 'failed')
+        if record['success']:
+            latencies.append(record['elapsed_ms'])
+            processed_bytes += record['size']
+            if not ticket_id:
+                succeeded += 1
+        else:
+            failed += 1
+        if not args.quiet:
+            status = ('queued' if ticket_id else 'ok') if record['success'] \
+                else f"failed ({record.get('status_code', '-')})"
+            print(f"[{finished}/{len(todo)}] {status} {record['file']} {record['elapsed_ms']} ms", file=sys.stderr)
+        settle_queued()
+
+    def settle_queued() -> None:
+        """Checkpoint queued files whose batch was sent; a failed batch adds a failure line to the output"""
+        nonlocal succeeded, failed, batches_seen
+        # Tickets only change state when a batch has been sent
+        if not queued or app.ingestion_batcher.batches_sent == batches_seen:
+            return
+        batches_seen = app.ingestion_batcher.batches_sent
+        for ticket_id, record in list(queued.items()):
+            ticket = app.ingestion_batcher.get(ticket_id)
+            state = ticket['state'] if ticket else None
+            if state in (QUEUED, SENDING):
+                continue
+            del queued[ticket_id]
+            if state == SUCCEEDED:
+                checkpoint(record, 'done')
+                succeeded += 1
+                continue
+            result = (ticket or {}).get('result') or {}
+            checkpoint(record, 'failed')
+            failed += 1
+            write({
+                'file': record['file'],
+                'success': False,
+                'status_code': result.get('status_code'),
+                'error': {'error': 'Data Cloud ingestion failed',
+                          'details': result.get('error') or 'Ingestion ticket expired'},
+                'ingestion_ticket': ticket_id
+            })
+            if not args.quiet:
+                print(f"ingestion failed {record['file']}", file=sys.stderr)
+
+    # Only a few documents beyond the worker count are queued, so huge backlogs don't pile up futures
+    pending = set()
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='batch') as executor:
+        try:
+            for path in todo:
+                if len(pending) >= args.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future.result())
+                pending.add(executor.submit(process_file, app, api_client, org_name, config, path))
+            for future in pending:
+                finish(future.result())
+            pending = set()
+        except KeyboardInterrupt:
+            interrupted = True
+            print("Interrupted: finishing documents in progress (Ctrl-C again to abort)", file=sys.stderr)
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    finish(future.result())
+
+    # Queued background/bulk ingestion batches go out before the run ends
+    app.ingestion_batcher.flush_all()
+    app.ingestion_batcher.wait(list(queued))
+    settle_queued()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    processed = succeeded + failed
+    return {
+        'org': org_name,
+        'documents': len(paths),
+        'skipped': skipped,
+        'processed': processed,
+        'succeeded': succeeded,
+        'failed': failed,
+        'interrupted': interrupted,
+        'ingestion_mode': app.INGESTION_MODE,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_docs_per_s': round(processed / elapsed, 2) if elapsed else None,
+        'throughput_mb_per_s': round(processed_bytes / 1024 / 1024 / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) if latencies else None,
+            'p95': percentile(latencies, 95) if latencies else None,
+            'p99': percentile(latencies, 99) if latencies else None,
+            'max': latencies[-1] if latencies else None
+        },
+        'ingestion_batcher': app.ingestion_batcher.stats()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help="Directories (searched recursively), files or glob patterns")
+    parser.add_argument('--org', help="Org to extract with (default: the current org)")
+    parser.add_argument('--workers', type=int, default=4, help="Documents processed at once")
+    parser.add_argument('--output', default='batch_results.ndjson', help="NDJSON file results are appended to")
+    parser.add_argument('--manifest', help="Checkpoint manifest (default: <output>.manifest)")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the manifest and start over (truncates the output and manifest)")
+    parser.add_argument('--ingestion', choices=('sync', 'background', 'bulk'),
+                        help="Ingestion mode (default: INGESTION_MODE if set, else sync)")
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL', 'WARNING'))
+    parser.add_argument('--quiet', action='store_true', help="Don't print a line per document")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    # app reads these at import time
+    os.environ['LOG_LEVEL'] = args.log_level
+    if args.ingestion:
+        os.environ['INGESTION_MODE'] = args.ingestion
+    else:
+        os.environ.setdefault('INGESTION_MODE', 'sync')
+    import app
+
+    args.org = args.org or app.get_current_org_name()
+    if not args.org or not app.get_org_config(args.org):
+        print(f"Org {args.org or '(none)'} is not configured; set it up in the Configuration page first",
+              file=sys.stderr)
+        return 2
+    if not app.APIClient(args.org).is_authenticated():
+        print(f"Org {args.org} has no access token; authenticate with Salesforce first", file=sys.stderr)
+        return 2
+    if app.TOKEN_RENEWAL_ENABLED:
+        # Long runs outlive the access token
+        app.token_refresher.start()
+
+    paths = find_documents(args.paths, app.allowed_file)
+    if not paths:
+        print("No PDF or image files found", file=sys.stderr)
+        return 1
+
+    manifest = Manifest(args.manifest or f"{args.output}.manifest", restart=args.restart)
+    try:
+        with open(args.output, 'w' if args.restart else 'a', encoding='utf-8') as output:
+            summary = run_batch(app, args, paths, manifest, output)
+    finally:
+        manifest.close()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        latency = summary['latency_ms']
+        print(f"Documents:   {summary['documents']} ({summary['skipped']} skipped from the manifest)")
+        print(f"Processed:   {summary['processed']} in {summary['elapsed_s']} s: "
+              f"{summary['succeeded']} succeeded, {summary['failed']} failed"
+              + (" (interrupted)" if summary['interrupted'] else ''))
+        print(f"Throughput:  {summary['throughput_docs_per_s']} docs/s, {summary['throughput_mb_per_s']} MB/s")
+        print(f"Latency ms:  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+        print(f"Ingestion:   {summary['ingestion_mode']} mode")
+        print(f"Output:      {args.output}")
+    return 1 if summary['failed'] or summary['interrupted'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Micro-benchmark of the extraction response path: old stdlib path vs json_codec
+
+Builds a Document AI style response with a large LeadsTable, then times
+entity decoding + parsing, type/value unwrapping and response serialization.
+A second table compares json_codec's two passes (entities, then unwrapping)
+with a single pass that decodes entities in one regex sweep and unwraps while
+parsing.
+
+    python benchmarks/bench_json_codec.py --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec  # noqa: E402
+
+
+def build_response(rows: int) -> str:
+    lead = lambda i: {'type': 'object', 'value': {
+        'Firstname': {'type': 'string', 'value': f'Nombre{i}'},
+        'Lastname': {'type': 'string', 'value': f'Apellido {i} \\ Núñez'},
+        'Email': {'type': 'string', 'value': f'lead{i}@example.com'},
+        'Date': {'type': 'string', 'value': '18/10/2026'},
+        'Company': {'type': 'string', 'value': f'Empresa "{i}" S.A.'}
+    }}
+    result = {
+        'Evento': {'type': 'string', 'value': 'Feria de Tecnología'},
+        'LeadsTable': {'type': 'array', 'value': [lead(i) for i in range(rows)]}
+    }
+    escaped = json.dumps(result).replace('"', '&quot;').replace('\\', '&#92;')
+    return json.dumps({'data': [{'data': escaped}]})
+
+
+def extract_value_recursive(obj):
+    """The previous recursive implementation"""
+    if obj and isinstance(obj, dict) and 'type' in obj and 'value' in obj:
+        if obj['type'] == 'array' and isinstance(obj['value'], list):
+            return [extract_value_recursive(item) for item in obj['value']]
+        elif obj['type'] == 'object' and isinstance(obj['value'], dict):
+            return {key: extract_value_recursive(val) for key, val in obj['value'].items()}
+        return obj['value']
+    return obj
+
+
+def old_path(body: str):
+    json_response = json.loads(body)
+    json.dumps(json_response, indent=2)  # debug log
+    nested = json_response['data'][0]['data'].replace('&quot;', '"').replace('&#92;', '\\')
+    result = json.loads(nested)
+    clean = {key: extract_value_recursive(value) for key, value in result.items()}
+    return json.dumps(result, ensure_ascii=False, indent=2), clean
+
+
+def new_path(body: str):
+    json_response = json_codec.loads(body)
+    result = json_codec.loads(json_codec.unescape_entities(json_response['data'][0]['data']))
+    clean = {key: json_codec.unwrap_typed_values(value) for key, value in result.items()}
+    return json_codec.dumps(result), clean
+
+
+_ENTITY_RE = re.compile('&quot;|&#92;')
+_ENTITY_CHARS = {'&quot;': '"', '&#92;': '\\'}
+
+
+def _unwrap_hook(obj):
+    return obj['value'] if 'type' in obj and 'value' in obj else obj
+
+
+def two_pass_unwrap(body: str):
+    result = json_codec.loads(json_codec.unescape_entities(json_codec.loads(body)['data'][0]['data']))
+    return {key: json_codec.unwrap_typed_values(value) for key, value in result.items()}
+
+
+def single_pass_unwrap(body: str):
+    """Entities and unwrapping in one pass each over text and tree (loses the wrapped result)"""
+    nested = _ENTITY_RE.sub(lambda m: _ENTITY_CHARS[m.group()], json_codec.loads(body)['data'][0]['data'])
+    return json.loads(nested, object_hook=_unwrap_hook)
+
+
+def best_of(fn, body: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(body)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--stdlib', action='store_true', help="Benchmark json_codec without orjson")
+    args = parser.parse_args()
+    if args.stdlib:
+        json_codec.orjson = None
+
+    print(f"json_codec backend: {json_codec.backend()}")
+    print(f"{'rows':>8} {'bytes':>12} {'old ms':>10} {'new ms':>10} {'speedup':>8}")
+    for rows in args.rows:
+        body = build_response(rows)
+        old_clean = old_path(body)[1]
+        new_clean = new_path(body)[1]
+        assert old_clean == new_clean, "old and new paths disagree"
+        old = best_of(old_path, body, args.repeat)
+        new = best_of(new_path, body, args.repeat)
+        print(f"{rows:>8} {len(body):>12} {old * 1000:>10.2f} {new * 1000:>10.2f} {old / new:>7.1f}x")
+
+    print(f"\n{'rows':>8} {'2-pass ms':>10} {'1-pass ms':>10}")
+    for rows in args.rows:
+        body = build_response(rows)
+        assert two_pass_unwrap(body) == single_pass_unwrap(body), "two and single pass disagree"
+        two = best_of(two_pass_unwrap, body, args.repeat)
+        one = best_of(single_pass_unwrap, body, args.repeat)
+        print(f"{rows:>8} {two * 1000:>10.2f} {one * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""Load driver for /extract-data: throughput, latency percentiles and peak RSS
+
+By default it runs everything on this machine: it starts the stub server
+(benchmarks/stub_server.py) with a throwaway certificate, writes an org
+configuration pointing at it into a temporary directory, and serves the
+Flask app there on a local port:
+
+    python benchmarks/load_driver.py --requests 200 --concurrency 16 --latency 1.0 --leads 50
+
+To load an app that is already running (e.g. under gunicorn against the
+stub), pass its URL, plus its PID to report the server's peak RSS:
+
+    python benchmarks/load_driver.py --url http://127.0.0.1:3000 --pid 12345 --requests 500
+
+--asgi serves the in-process app through asgi.py under uvicorn instead of
+the threaded WSGI server (requires httpx, uvicorn and asgiref).
+
+--ingestion picks the in-process app's INGESTION_MODE. With bulk, records go
+to the stub's bulk ingest job endpoints; the run ends by flushing the queued
+batches and reports the jobs the stub completed:
+
+    python benchmarks/load_driver.py --requests 200 --ingestion bulk --bulk-job-latency 2
+
+Requires the openssl command line tool unless --certfile/--keyfile are given.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import add_stub_arguments, settings_from_args, start_stub  # noqa: E402
+
+ORG_NAME = 'loadtest'
+
+
+def make_certificate(directory: str):
+    certfile = os.path.join(directory, 'stub-cert.pem')
+    keyfile = os.path.join(directory, 'stub-key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+        '-keyout', keyfile, '-out', certfile
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def write_org_config(directory: str, stub_url: str) -> None:
+    with open(os.path.join(REPO_DIR, 'schema.json'), encoding='utf-8') as f:
+        schema = json.load(f)
+    config = {
+        'orgs': {ORG_NAME: {
+            'auth': {'login_url': stub_url, 'client_id': 'stub', 'client_secret': 'stub', 'api_version': 'v63.0'},
+            'ml_model': 'stub_model',
+            'datacloud_connector_name': 'ContactIngestion',
+            'datacloud_object_name': 'LeadRecord',
+            'schema': schema
+        }},
+        'current_org': ORG_NAME
+    }
+    with open(os.path.join(directory, 'orgs_config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    with open(os.path.join(directory, f'access-token-{ORG_NAME}.secret'), 'w', encoding='utf-8') as f:
+        json.dump({'access_token': 'stub-sf-token', 'instance_url': stub_url}, f)
+
+
+def start_local_app(args):
+    """Start the stub and the Flask app in this process; returns (base URL, app module)"""
+    workdir = tempfile.mkdtemp(prefix='idp-load-')
+    certfile, keyfile = args.certfile, args.keyfile
+    if not certfile:
+        certfile, keyfile = make_certificate(workdir)
+    stub = start_stub(settings_from_args(args), certfile=certfile, keyfile=keyfile)
+    stub_url = f"https://127.0.0.1:{stub.server_address[1]}"
+
+    os.environ['REQUESTS_CA_BUNDLE'] = certfile
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if args.ingestion:
+        os.environ['INGESTION_MODE'] = args.ingestion
+    if args.ingestion == 'bulk':
+        # The stub finishes jobs in seconds; don't wait the default 5 s between polls
+        os.environ.setdefault('BULK_INGEST_POLL_INTERVAL', '0.2')
+    write_org_config(workdir, stub_url)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    import logging
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    # One access log line per request would dominate the run
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    if args.asgi:
+        port = start_asgi_server()
+    else:
+        server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+        port = server.server_port
+    print(f"Stub at {stub_url}, app at http://127.0.0.1:{port}, working directory {workdir}")
+    app_module.stub_url = stub_url
+    return f"http://127.0.0.1:{port}", app_module
+
+
+def start_asgi_server() -> int:
+    """Serve asgi.application under uvicorn in a background thread; returns the port"""
+    import socket
+    import uvicorn
+    import asgi
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(asgi.application, log_level='warning', access_log=False,
+                                           backlog=4096, timeout_keep_alive=30))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, name='app-server', daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return sock.getsockname()[1]
+
+
+def make_upload(args, index: int) -> bytes:
+    if args.file:
+        with open(args.file, 'rb') as f:
+            data = f.read()
+    else:
+        data = b'%PDF-1.4\n' + os.urandom(args.size_kb * 1024)
+    # A unique tail per request keeps the result cache from answering
+    return data if args.same_file else data + f'\n%{index}'.encode()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def peak_rss_mb(pid: Optional[int]) -> Optional[float]:
+    if pid is None:
+        # ru_maxrss is in KiB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def run_load(base_url: str, args) -> Dict[str, Any]:
+    local = threading.local()
+    endpoint = f"{base_url.rstrip('/')}{args.endpoint}"
+    filename = os.path.basename(args.file) if args.file else 'loadtest.pdf'
+
+    def one(index: int):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        upload = make_upload(args, index)
+        started = time.perf_counter()
+        try:
+            response = session.post(endpoint, files={'file': (filename, upload)}, timeout=args.timeout)
+            status = response.status_code
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, status in outcomes if status == 200)
+    statuses: Dict[str, int] = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'succeeded': len(latencies),
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(outcomes) / elapsed, 2),
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.50)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None)
+        },
+        'peak_rss_mb': peak_rss_mb(args.pid) if args.pid or not args.url else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="Base URL of a running app; omit to run the app and stub in-process")
+    parser.add_argument('--pid', type=int, help="PID of the app server to report peak RSS for (with --url)")
+    parser.add_argument('--asgi', action='store_true', help="Serve the in-process app through asgi.py under uvicorn")
+    parser.add_argument('--ingestion', choices=('sync', 'background', 'bulk'),
+                        help="INGESTION_MODE of the in-process app (default: its own default)")
+    parser.add_argument('--endpoint', default='/extract-data')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--file', help="Upload this file instead of a synthetic PDF")
+    parser.add_argument('--size-kb', type=int, default=256, help="Size of the synthetic upload")
+    parser.add_argument('--same-file', action='store_true', help="Send identical uploads (exercises the result cache)")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    app_module = None
+    if args.url:
+        base_url = args.url
+    else:
+        base_url, app_module = start_local_app(args)
+    report = run_load(base_url, args)
+    if app_module is not None:
+        # Send queued ingestion batches while the stub is still up
+        started = time.perf_counter()
+        app_module.ingestion_batcher.flush_all()
+        stub_stats = requests.get(f"{app_module.stub_url}/_stub/stats", timeout=10).json()
+        report['ingestion'] = {
+            'mode': app_module.INGESTION_MODE,
+            'final_flush_s': round(time.perf_counter() - started, 2),
+            'batcher': app_module.ingestion_batcher.stats(),
+            'stub_requests': stub_stats['requests'],
+            'bulk_jobs': stub_stats['bulk_jobs'],
+            'bulk_records': stub_stats['bulk_records']
+        }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    latency = report['latency_ms']
+    print(f"Requests:    {report['requests']} at concurrency {report['concurrency']} in {report['elapsed_s']} s")
+    print(f"Statuses:    {report['statuses']}")
+    print(f"Throughput:  {report['throughput_rps']} req/s")
+    print(f"Latency ms:  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Peak RSS:    {report['peak_rss_mb']} MB" + ('' if args.pid or args.url else " (driver, stub and app together)"))
+    ingestion = report.get('ingestion')
+    if ingestion:
+        print(f"Ingestion:   {ingestion['mode']} mode, {ingestion['batcher']['records_sent']} records in "
+              f"{ingestion['batcher']['batches_sent']} batches (final flush {ingestion['final_flush_s']} s)")
+        if ingestion['mode'] == 'bulk':
+            print(f"Bulk jobs:   {ingestion['bulk_jobs']}, {ingestion['bulk_records']} records processed by the stub")
+
+
+if __name__ == '__main__':
+    main()
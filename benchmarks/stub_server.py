@@ -0,0 +1,362 @@
+"""Local stand-in for the Salesforce and Data Cloud endpoints this app calls
+
+Imitates:
+  POST /services/data/<version>/ssot/document-processing/actions/extract-data
+  POST /services/a360/token
+  POST /services/oauth2/token
+  POST /api/v1/ingest/sources/<connector>/<object>
+  POST /api/v1/ingest/jobs, PUT .../jobs/<id>/batches, PATCH and GET .../jobs/<id> (bulk ingest jobs)
+
+Latency, error rates and the size of extraction results are configurable.
+Extraction responses can be recorded from a real org (--record DIR with
+--upstream URL) and served again later (--replay DIR).
+
+The app builds https:// URLs for Data Cloud, so run the stub with TLS and
+point REQUESTS_CA_BUNDLE at the certificate:
+
+    openssl req -x509 -newkey rsa:2048 -nodes -days 30 -subj /CN=127.0.0.1 \\
+        -addext subjectAltName=IP:127.0.0.1 -keyout stub-key.pem -out stub-cert.pem
+    python benchmarks/stub_server.py --port 8443 --certfile stub-cert.pem --keyfile stub-key.pem \\
+        --latency 2.0 --jitter 0.5 --error-rate 0.02 --leads 50
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+import requests
+
+EXTRACT_PATH = re.compile(r'^/services/data/[^/]+/ssot/document-processing/actions/extract-data$')
+INGEST_PATH = re.compile(r'^/api/v1/ingest/sources/[^/]+/[^/]+$')
+BULK_JOBS_PATH = '/api/v1/ingest/jobs'
+BULK_JOB_PATH = re.compile(r'^/api/v1/ingest/jobs/([^/]+)$')
+BULK_BATCHES_PATH = re.compile(r'^/api/v1/ingest/jobs/([^/]+)/batches$')
+
+
+def build_extraction(leads: int) -> Dict[str, Any]:
+    """A Document AI style type/value result with the given number of LeadsTable rows"""
+    def lead(i):
+        return {'type': 'object', 'value': {
+            'Firstname': {'type': 'string', 'value': f'Nombre{i}'},
+            'Lastname': {'type': 'string', 'value': f'Apellido{i}'},
+            'Email': {'type': 'string', 'value': f'lead{i}@example.com'},
+            'Date': {'type': 'string', 'value': '18/10/2026'},
+            'Company': {'type': 'string', 'value': f'Empresa {i}'}
+        }}
+    return {
+        'Evento': {'type': 'string', 'value': 'Stub Event'},
+        'LeadsTable': {'type': 'array', 'value': [lead(i) for i in range(leads)]}
+    }
+
+
+def extraction_response(leads: int) -> bytes:
+    # Document AI returns the result as an HTML-escaped JSON string
+    escaped = json.dumps(build_extraction(leads)).replace('"', '&quot;').replace('\\', '&#92;')
+    return json.dumps({'data': [{'data': escaped}]}).encode('utf-8')
+
+
+class StubSettings:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, leads: int = 10, token_latency: float = 0.05,
+                 ingest_latency: float = 0.05, ingest_error_rate: float = 0.0,
+                 bulk_job_latency: float = 1.0, bulk_error_rate: float = 0.0,
+                 record_dir: Optional[str] = None, upstream: Optional[str] = None,
+                 replay_dir: Optional[str] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.leads = leads
+        self.token_latency = token_latency
+        self.ingest_latency = ingest_latency
+        self.ingest_error_rate = ingest_error_rate
+        self.bulk_job_latency = bulk_job_latency
+        self.bulk_error_rate = bulk_error_rate
+        self.record_dir = record_dir
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.replay = None
+        if replay_dir:
+            paths = sorted(glob.glob(os.path.join(replay_dir, 'extract-data-*.json')))
+            if not paths:
+                raise SystemExit(f"No recorded responses in {replay_dir}")
+            bodies = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    bodies.append(f.read())
+            self.replay = itertools.cycle(bodies)
+        self.body = extraction_response(leads)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.recorded = 0
+        # Bulk ingest jobs by id
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under an async client's burst
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings: StubSettings = None
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, obj: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(obj).encode('utf-8'))
+
+    def _host(self) -> str:
+        return f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+    def _sleep(self, seconds: float) -> None:
+        jitter = random.uniform(-self.settings.jitter, self.settings.jitter) if self.settings.jitter else 0.0
+        time.sleep(max(seconds + jitter, 0.0))
+
+    def do_GET(self):
+        if self.path == '/_stub/stats':
+            with self.settings.lock:
+                states: Dict[str, int] = {}
+                for job in self.settings.jobs.values():
+                    states[job['state']] = states.get(job['state'], 0) + 1
+                self._send_json(200, {
+                    'requests': dict(self.settings.counts),
+                    'recorded': self.settings.recorded,
+                    'bulk_jobs': states,
+                    'bulk_records': sum(job['numberRecordsProcessed'] for job in self.settings.jobs.values())
+                })
+            return
+        match = BULK_JOB_PATH.match(self.path.split('?', 1)[0])
+        if match:
+            self.settings.count('bulk-job-status')
+            job = self._bulk_job(match.group(1))
+            if job is not None:
+                self._send_json(200, job)
+            return
+        self.settings.count('get')
+        self._send_json(200, {})
+
+    def _bulk_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job's current view (sends a 404 and returns None for unknown jobs)"""
+        settings = self.settings
+        with settings.lock:
+            job = settings.jobs.get(job_id)
+            if job is not None and job['state'] == 'InProgress' and time.monotonic() >= job['_done_at']:
+                # Closed jobs are processed after --bulk-job-latency seconds
+                failed = settings.bulk_error_rate and random.random() < settings.bulk_error_rate
+                job['state'] = 'Failed' if failed else 'JobComplete'
+                if failed:
+                    job['errorMessage'] = 'Stub injected error'
+                else:
+                    job['numberRecordsProcessed'] = job['_rows']
+            view = {k: v for k, v in job.items() if not k.startswith('_')} if job is not None else None
+        if view is None:
+            self._send_json(404, {'error': f'No bulk job {job_id}'})
+        return view
+
+    def do_PUT(self):
+        body = self._read_body()
+        match = BULK_BATCHES_PATH.match(self.path.split('?', 1)[0])
+        if not match:
+            self.settings.count('unknown')
+            self._send_json(404, {'error': f'Stub has no handler for {self.path}'})
+            return
+        self.settings.count('bulk-batch')
+        with self.settings.lock:
+            job = self.settings.jobs.get(match.group(1))
+            if job is not None and job['state'] == 'Open':
+                # Every part starts with a header row
+                job['_rows'] += max(body.count(b'\n') - 1, 0)
+                job['_parts'] += 1
+        if job is None:
+            self._send_json(404, {'error': f'No bulk job {match.group(1)}'})
+        elif job['state'] != 'Open':
+            self._send_json(409, {'error': f"Job is {job['state']}"})
+        else:
+            self._send_json(202, {})
+
+    def do_PATCH(self):
+        body = self._read_body()
+        match = BULK_JOB_PATH.match(self.path.split('?', 1)[0])
+        if not match:
+            self.settings.count('unknown')
+            self._send_json(404, {'error': f'Stub has no handler for {self.path}'})
+            return
+        self.settings.count('bulk-job-close')
+        state = json.loads(body or b'{}').get('state')
+        with self.settings.lock:
+            job = self.settings.jobs.get(match.group(1))
+            if job is not None:
+                if state == 'UploadComplete' and job['state'] == 'Open':
+                    job['state'] = 'InProgress'
+                    job['_done_at'] = time.monotonic() + self.settings.bulk_job_latency
+                elif state == 'Aborted' and job['state'] not in ('JobComplete', 'Failed'):
+                    job['state'] = 'Aborted'
+        job = self._bulk_job(match.group(1))
+        if job is not None:
+            self._send_json(200, job)
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split('?', 1)[0]
+        settings = self.settings
+
+        if EXTRACT_PATH.match(path):
+            settings.count('extract-data')
+            if settings.upstream:
+                self._record(path, body)
+                return
+            self._sleep(settings.latency)
+            if settings.error_rate and random.random() < settings.error_rate:
+                self._send_json(settings.error_status, {'error': 'Stub injected error'})
+                return
+            self._send(200, next(settings.replay) if settings.replay else settings.body)
+        elif path == '/services/a360/token':
+            settings.count('a360-token')
+            time.sleep(settings.token_latency)
+            self._send_json(200, {
+                'access_token': f'stub-dc-{uuid.uuid4().hex}',
+                'instance_url': self._host(),
+                'token_type': 'Bearer',
+                'expires_in': 7200
+            })
+        elif path == '/services/oauth2/token':
+            settings.count('oauth2-token')
+            time.sleep(settings.token_latency)
+            self._send_json(200, {
+                'access_token': f'stub-sf-{uuid.uuid4().hex}',
+                'refresh_token': 'stub-refresh-token',
+                'instance_url': f"https://{self._host()}",
+                'issued_at': str(int(time.time() * 1000)),
+                'token_type': 'Bearer'
+            })
+        elif INGEST_PATH.match(path):
+            settings.count('ingest')
+            time.sleep(settings.ingest_latency)
+            if settings.ingest_error_rate and random.random() < settings.ingest_error_rate:
+                self._send_json(settings.error_status, {'error': 'Stub injected error'})
+                return
+            self._send_json(202, {'accepted': True})
+        elif path == BULK_JOBS_PATH:
+            settings.count('bulk-job-create')
+            request = json.loads(body or b'{}')
+            job_id = uuid.uuid4().hex[:18]
+            with settings.lock:
+                settings.jobs[job_id] = {
+                    'id': job_id,
+                    'object': request.get('object'),
+                    'sourceName': request.get('sourceName'),
+                    'operation': request.get('operation'),
+                    'state': 'Open',
+                    'numberRecordsProcessed': 0,
+                    'numberRecordsFailed': 0,
+                    '_rows': 0,
+                    '_parts': 0
+                }
+            self._send_json(201, {k: v for k, v in settings.jobs[job_id].items() if not k.startswith('_')})
+        else:
+            settings.count('unknown')
+            self._send_json(404, {'error': f'Stub has no handler for {path}'})
+
+    def _record(self, path: str, body: bytes) -> None:
+        """Forward an extraction to the real org and keep its response for --replay"""
+        settings = self.settings
+        headers = {k: v for k, v in self.headers.items() if k.lower() in ('authorization', 'content-type')}
+        response = requests.post(f"{settings.upstream}{path}", data=body, headers=headers, timeout=300)
+        if response.status_code == 200 and settings.record_dir:
+            with settings.lock:
+                settings.recorded += 1
+                index = settings.recorded
+            os.makedirs(settings.record_dir, exist_ok=True)
+            with open(os.path.join(settings.record_dir, f'extract-data-{index:04d}.json'), 'wb') as f:
+                f.write(response.content)
+        self._send(response.status_code, response.content,
+                   response.headers.get('Content-Type', 'application/json'))
+
+
+def start_stub(settings: StubSettings, host: str = '127.0.0.1', port: int = 0,
+               certfile: Optional[str] = None, keyfile: Optional[str] = None) -> StubHTTPServer:
+    """Start the stub in a background thread; the bound port is server.server_address[1]"""
+    handler = type('BoundStubHandler', (StubHandler,), {'settings': settings})
+    server = StubHTTPServer((host, port), handler)
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds per extract-data call")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of extract-data calls that fail")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--leads', type=int, default=10, help="LeadsTable rows per extraction result")
+    parser.add_argument('--token-latency', type=float, default=0.05)
+    parser.add_argument('--ingest-latency', type=float, default=0.05)
+    parser.add_argument('--ingest-error-rate', type=float, default=0.0)
+    parser.add_argument('--bulk-job-latency', type=float, default=1.0,
+                        help="Seconds a closed bulk ingest job takes to complete")
+    parser.add_argument('--bulk-error-rate', type=float, default=0.0, help="Fraction of bulk jobs that fail")
+    parser.add_argument('--record', dest='record_dir', help="Save responses forwarded to --upstream here")
+    parser.add_argument('--upstream', help="Real instance URL to forward extract-data calls to while recording")
+    parser.add_argument('--replay', dest='replay_dir', help="Serve recorded extract-data responses from here")
+
+
+def settings_from_args(args: argparse.Namespace) -> StubSettings:
+    return StubSettings(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, leads=args.leads, token_latency=args.token_latency,
+        ingest_latency=args.ingest_latency, ingest_error_rate=args.ingest_error_rate,
+        bulk_job_latency=args.bulk_job_latency, bulk_error_rate=args.bulk_error_rate,
+        record_dir=args.record_dir, upstream=args.upstream, replay_dir=args.replay_dir
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stub(settings_from_args(args), args.host, args.port, args.certfile, args.keyfile)
+    scheme = 'https' if args.certfile else 'http'
+    print(f"Stub listening on {scheme}://{args.host}:{server.server_address[1]} (stats at /_stub/stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
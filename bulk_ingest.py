@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import logging
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import metrics
+from resilience import Resilience, CircuitOpenError
+
+# Bulk API limit is 150 MB per uploaded CSV; stay well below it
+DEFAULT_PART_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_POLL_TIMEOUT = 30 * 60
+
+# Job states reported by the bulk ingest API
+FINAL_STATES = {'JobComplete', 'Failed', 'Aborted'}
+
+# Columns written first; the rest follow in sorted order
+LEADING_COLUMNS = ['EventID', 'eventime']
+
+
+class BulkIngestError(Exception):
+    """A bulk ingest API call returned an unexpected status"""
+    def __init__(self, message: str, status_code: Optional[int] = None, body: str = ''):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+def csv_columns(records: List[Dict[str, Any]]) -> List[str]:
+    keys = set()
+    for record in records:
+        keys.update(record.keys())
+    leading = [k for k in LEADING_COLUMNS if k in keys]
+    return leading + sorted(keys - set(leading))
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def write_csv_parts(records: List[Dict[str, Any]], part_max_bytes: int = DEFAULT_PART_MAX_BYTES) -> List[Any]:
+    """Write records as CSV parts (each with a header row) to temporary files
+
+    Returns the open temp files, positioned at the start; the caller closes them.
+    """
+    columns = csv_columns(records)
+    header_buffer = io.StringIO()
+    csv.writer(header_buffer, lineterminator='\n').writerow(columns)
+    header = header_buffer.getvalue().encode('utf-8')
+
+    parts = []
+    part = None
+    row_buffer = io.StringIO()
+    writer = csv.writer(row_buffer, lineterminator='\n')
+    for record in records:
+        row_buffer.seek(0)
+        row_buffer.truncate()
+        writer.writerow([_csv_value(record.get(column)) for column in columns])
+        row = row_buffer.getvalue().encode('utf-8')
+        if part is None or (part.tell() + len(row) > part_max_bytes and part.tell() > len(header)):
+            part = tempfile.TemporaryFile()
+            part.write(header)
+            parts.append(part)
+        part.write(row)
+    for part in parts:
+        part.seek(0)
+    return parts
+
+
+class BulkIngestClient:
+    """Minimal client for the Data Cloud bulk ingest job API (/api/v1/ingest/jobs)"""
+
+    def __init__(self, http, base_url: str, dc_token: str, org_name: Optional[str] = None,
+                 resilience: Optional[Resilience] = None):
+        self.http = http
+        self.base_url = base_url.rstrip('/')
+        self.org_name = org_name
+        self.resilience = resilience
+        self.headers = {'Authorization': f'Bearer {dc_token}'}
+
+    def _send(self, method: str, path: str, headers: Dict[str, str], **kwargs):
+        if hasattr(kwargs.get('data'), 'seek'):
+            kwargs['data'].seek(0)
+        try:
+            response = self.http.request(method, f"{self.base_url}{path}", org_name=self.org_name,
+                                         headers=headers, **kwargs)
+        except Exception:
+            metrics.count_response('datacloud_bulk', self.org_name, 'error')
+            raise
+        metrics.count_response('datacloud_bulk', self.org_name, response.status_code)
+        return response
+
+    def _call(self, method: str, path: str, expected, **kwargs) -> Dict[str, Any]:
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', {}))
+        kwargs['timeout'] = kwargs.pop('timeout', 60)
+        if self.resilience is None:
+            response = self._send(method, path, headers, **kwargs)
+        else:
+            try:
+                # Creating a job or uploading a part isn't safe to repeat unless the API refused it
+                response = self.resilience.call(self.org_name, 'datacloud_bulk',
+                                                lambda: self._send(method, path, headers, **kwargs),
+                                                idempotent=method in ('GET', 'PATCH'))
+            except CircuitOpenError as e:
+                raise BulkIngestError(str(e), 503)
+        if response.status_code not in expected:
+            raise BulkIngestError(f"{method} {path} failed with status {response.status_code}",
+                                  response.status_code, response.text)
+        return response.json() if response.text else {}
+
+    def create_job(self, connector_name: str, object_name: str, operation: str = 'upsert') -> Dict[str, Any]:
+        return self._call('POST', '/api/v1/ingest/jobs', (200, 201), json={
+            'object': object_name,
+            'sourceName': connector_name,
+            'operation': operation
+        })
+
+    def upload_part(self, job_id: str, part) -> None:
+        self._call('PUT', f'/api/v1/ingest/jobs/{job_id}/batches', (200, 201, 202),
+                   headers={'Content-Type': 'text/csv'}, data=part, timeout=300)
+
+    def close_job(self, job_id: str) -> Dict[str, Any]:
+        return self._call('PATCH', f'/api/v1/ingest/jobs/{job_id}', (200,), json={'state': 'UploadComplete'})
+
+    def abort_job(self, job_id: str) -> Dict[str, Any]:
+        return self._call('PATCH', f'/api/v1/ingest/jobs/{job_id}', (200,), json={'state': 'Aborted'})
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        return self._call('GET', f'/api/v1/ingest/jobs/{job_id}', (200,))
+
+    def wait_for_job(self, job_id: str, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                     timeout: float = DEFAULT_POLL_TIMEOUT) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job.get('state') in FINAL_STATES or time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+
+def run_bulk_ingestion(http, base_url: str, dc_token: str, connector_name: str, object_name: str,
+                       records: List[Dict[str, Any]], org_name: Optional[str] = None,
+                       part_max_bytes: int = DEFAULT_PART_MAX_BYTES,
+                       poll_interval: float = DEFAULT_POLL_INTERVAL,
+                       poll_timeout: float = DEFAULT_POLL_TIMEOUT,
+                       resilience: Optional[Resilience] = None) -> Dict[str, Any]:
+    """Create a bulk job, upload the records as CSV parts, close it and poll until it finishes
+
+    Returns a result dict in the same shape as streaming ingestion results.
+    """
+    client = BulkIngestClient(http, base_url, dc_token, org_name, resilience)
+    parts = write_csv_parts(records, part_max_bytes)
+    job_id = None
+    try:
+        job_id = client.create_job(connector_name, object_name)['id']
+        logging.info(f"Created Data Cloud bulk ingest job {job_id} for {len(records)} records in {len(parts)} parts")
+        for part in parts:
+            client.upload_part(job_id, part)
+        client.close_job(job_id)
+        job = client.wait_for_job(job_id, poll_interval, poll_timeout)
+        state = job.get('state')
+        success = state == 'JobComplete'
+        result = {
+            'success': success,
+            'mode': 'bulk',
+            'job_id': job_id,
+            'state': state,
+            'parts': len(parts),
+            'records_ingested': job.get('numberRecordsProcessed', len(records)) if success else 0,
+            'records_rejected': job.get('numberRecordsFailed', 0) if success else len(records)
+        }
+        if state not in FINAL_STATES:
+            result['error'] = f"Bulk job still {state} when polling timed out"
+        elif not success:
+            result['error'] = job.get('errorMessage') or f"Bulk job ended in state {state}"
+        return result
+    except BulkIngestError as e:
+        logging.error(f"✗ Data Cloud bulk ingestion failed: {str(e)} {e.body}")
+        if job_id:
+            try:
+                client.abort_job(job_id)
+            except Exception:
+                pass
+        return {
+            'success': False,
+            'mode': 'bulk',
+            'job_id': job_id,
+            'records_rejected': len(records),
+            'error': e.body or str(e),
+            'status_code': e.status_code
+        }
+    finally:
+        for part in parts:
+            part.close()
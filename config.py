@@ -4,31 +4,41 @@ from config_manager import get_current_org_name, get_org_config, get_org_token_f
 
 load_dotenv()
 
+DEFAULT_ML_MODEL = "llmgateway__VertexAIGemini20Flash001"
+
 def get_current_config():
     """Get configuration for the current org"""
     org_name = get_current_org_name()
     if org_name:
-        return get_org_config(org_name)
+        return get_org_config(org_name) or {}
     return {}
 
-# Load current org configuration
-user_config = get_current_config()
-
-# Try to get from user config first, fallback to .env
-auth_config = user_config.get("auth", {})
-LOGIN_URL = auth_config.get("login_url") or os.environ.get("LOGIN_URL")
-CLIENT_ID = auth_config.get("client_id") or os.environ.get("CLIENT_ID")
-CLIENT_SECRET = auth_config.get("client_secret") or os.environ.get("CLIENT_SECRET")
-API_VERSION = auth_config.get("api_version") or os.environ.get("API_VERSION", "v62.0")
+def _auth_setting(key, env_name, default=None):
+    # Try to get from user config first, fallback to .env
+    auth_config = get_current_config().get("auth", {})
+    return auth_config.get(key) or os.environ.get(env_name, default)
 
-# Get org-specific token file
-org_name = get_current_org_name()
-if org_name:
-    TOKEN_FILE = get_org_token_file(org_name)
-else:
-    TOKEN_FILE = os.environ.get("TOKEN_FILE", "access-token.secret")
+def get_token_file():
+    """Get org-specific token file"""
+    org_name = get_current_org_name()
+    if org_name:
+        return get_org_token_file(org_name)
+    return os.environ.get("TOKEN_FILE", "access-token.secret")
 
-DEFAULT_ML_MODEL = "llmgateway__VertexAIGemini20Flash001"
+# Org-dependent settings are looked up on access from the cached config
+# snapshot in config_manager, so saving the config needs no module reload
+_LAZY_SETTINGS = {
+    "user_config": get_current_config,
+    "LOGIN_URL": lambda: _auth_setting("login_url", "LOGIN_URL"),
+    "CLIENT_ID": lambda: _auth_setting("client_id", "CLIENT_ID"),
+    "CLIENT_SECRET": lambda: _auth_setting("client_secret", "CLIENT_SECRET"),
+    "API_VERSION": lambda: _auth_setting("api_version", "API_VERSION", "v62.0"),
+    "TOKEN_FILE": get_token_file,
+    # Get schema from user config
+    "SCHEMA_CONFIG": lambda: get_current_config().get("schema", {}),
+}
 
-# Get schema from user config
-SCHEMA_CONFIG = user_config.get("schema", {})
\ No newline at end of file
+def __getattr__(name):
+    if name in _LAZY_SETTINGS:
+        return _LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,24 +1,116 @@
 import json
 import os
-from typing import Dict, Any, List, Optional
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
 ORGS_CONFIG_FILE = "orgs_config.json"
 
-def load_orgs_config() -> Dict[str, Any]:
-    """Load all org configurations from JSON file"""
-    if os.path.exists(ORGS_CONFIG_FILE):
+# How often (seconds) readers re-stat config files to notice edits from other processes
+CONFIG_STAT_INTERVAL = float(os.environ.get("CONFIG_STAT_INTERVAL", 1.0))
+
+class FrozenDict(dict):
+    """Read-only dict used for cached config snapshots (still JSON-serializable)"""
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Config snapshots are read-only; use load_orgs_config() to edit")
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thaw(v) for v in value]
+    return value
+
+class _CachedJSONFile:
+    """Frozen contents of a JSON file, re-read only when its stat signature changes"""
+    def __init__(self, path: str, default: Dict[str, Any]):
+        self.path = path
+        self.default = default
+        self.version = 0
+        self._value = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
         try:
-            with open(ORGS_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading orgs config: {e}")
-    return {"orgs": {}, "current_org": None}
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self):
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < CONFIG_STAT_INTERVAL:
+            return self._value
+        with self._lock:
+            signature = self._stat_signature()
+            if self._value is None or signature != self._signature:
+                value = self.default
+                if signature is not None:
+                    try:
+                        with open(self.path, 'r') as f:
+                            value = json.load(f)
+                    except Exception as e:
+                        print(f"Error loading {self.path}: {e}")
+                self._value = _freeze(value)
+                self._signature = signature
+                self.version += 1
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+
+_orgs_config = _CachedJSONFile(ORGS_CONFIG_FILE, {"orgs": {}, "current_org": None})
+_default_schema = _CachedJSONFile("schema.json", {})
+_save_lock = threading.Lock()
+
+def get_config_snapshot() -> Dict[str, Any]:
+    """Cached, read-only view of all org configurations (no file I/O on the hot path)"""
+    return _orgs_config.get()
+
+def get_config_version() -> int:
+    """Counter that changes whenever a new config snapshot is loaded"""
+    _orgs_config.get()
+    return _orgs_config.version
+
+def load_orgs_config() -> Dict[str, Any]:
+    """Load all org configurations as a mutable copy (for editing and saving)"""
+    return _thaw(get_config_snapshot())
+
+def write_file_atomic(path: str, content: str) -> None:
+    """Write a file via temp file + fsync + rename so readers never see a partial write"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 def save_orgs_config(config: Dict[str, Any]) -> bool:
-    """Save all org configurations to JSON file"""
+    """Save all org configurations to JSON file atomically (temp file + rename)"""
     try:
-        with open(ORGS_CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
+        with _save_lock:
+            write_file_atomic(ORGS_CONFIG_FILE, json.dumps(config, indent=2))
+            _orgs_config.invalidate()
         return True
     except Exception as e:
         print(f"Error saving orgs config: {e}")
@@ -26,7 +118,7 @@ def save_orgs_config(config: Dict[str, Any]) -> bool:
 
 def get_current_org_name(cookie_org: Optional[str] = None) -> Optional[str]:
     """Get the current org name from config or cookie"""
-    config = load_orgs_config()
+    config = get_config_snapshot()
     
     # Priority: cookie > stored current_org > first org
     if cookie_org and cookie_org in config.get("orgs", {}):
@@ -52,8 +144,8 @@ def set_current_org(org_name: str) -> bool:
     return save_orgs_config(config)
 
 def get_org_config(org_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """Get configuration for a specific org"""
-    config = load_orgs_config()
+    """Get configuration for a specific org (read-only snapshot)"""
+    config = get_config_snapshot()
     orgs = config.get("orgs", {})
     
     if org_name is None:
@@ -66,7 +158,7 @@ def get_org_config(org_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
 
 def list_orgs() -> List[str]:
     """Get list of all configured org names"""
-    config = load_orgs_config()
+    config = get_config_snapshot()
     return list(config.get("orgs", {}).keys())
 
 def create_or_update_org(org_name: str, org_config: Dict[str, Any]) -> bool:
@@ -100,15 +192,8 @@ def delete_org(org_name: str) -> bool:
     return save_orgs_config(config)
 
 def get_default_schema() -> Dict[str, Any]:
-    """Load default schema from schema.json"""
-    schema_file = "schema.json"
-    if os.path.exists(schema_file):
-        try:
-            with open(schema_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading default schema: {e}")
-    return {}
+    """Load default schema from schema.json (cached, read-only)"""
+    return _default_schema.get()
 
 def get_org_token_file(org_name: str) -> str:
     """Get the token file path for a specific org"""
@@ -134,7 +219,7 @@ def initialize_config() -> Dict[str, Any]:
             "ml_model": "llmgateway__VertexAIGemini20Flash001",
             "datacloud_connector_name": "ContactIngestion",
             "datacloud_object_name": "LeadRecord",
-            "schema": get_default_schema()
+            "schema": _thaw(get_default_schema())
         }
         config["orgs"] = {default_org_name: default_org_config}
         config["current_org"] = default_org_name
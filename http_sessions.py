@@ -0,0 +1,101 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults for the per-org/per-host connection pools
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+
+class SessionPool:
+    """Keep-alive requests sessions keyed by org and upstream host"""
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 keep_alive: bool = True):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self._sessions: Dict[Tuple[str, str], requests.Session] = {}
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+
+    def _host(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def session(self, org_name: Optional[str], url: str) -> requests.Session:
+        """Get (or create) the session used for this org and the host of url"""
+        key = (org_name or '', self._host(url))
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                if not self.keep_alive:
+                    session.headers['Connection'] = 'close'
+                self._sessions[key] = session
+            return session
+
+    def _timeout(self, timeout: Any) -> Any:
+        # A bare number keeps its old meaning at the call sites: the read timeout
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, (int, float)):
+            return (self.connect_timeout, timeout)
+        return timeout
+
+    def request(self, method: str, url: str, org_name: Optional[str] = None,
+                timeout: Any = None, **kwargs) -> requests.Response:
+        session = self.session(org_name, url)
+        with self._lock:
+            self.requests_sent += 1
+        return session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+
+    def get(self, url: str, org_name: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, org_name=org_name, **kwargs)
+
+    def post(self, url: str, org_name: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, org_name=org_name, **kwargs)
+
+    def close(self, org_name: Optional[str] = None) -> None:
+        """Close sessions for one org, or all of them"""
+        with self._lock:
+            keys = [k for k in self._sessions if org_name is None or k[0] == org_name]
+            for key in keys:
+                self._sessions.pop(key).close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection counters summed over every pool owned by this object"""
+        opened = 0
+        served = 0
+        with self._lock:
+            sessions = list(self._sessions.values())
+            requests_sent = self.requests_sent
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for pool_key in list(pools.keys()):
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    opened += pool.num_connections
+                    served += pool.num_requests
+        return {
+            'sessions': len(sessions),
+            'requests': requests_sent,
+            'connections_opened': opened,
+            'connections_reused': max(served - opened, 0)
+        }
@@ -0,0 +1,144 @@
+import json
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from upload_stream import DEFAULT_SPOOL_BYTES, stream_size
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; images are sent unchanged without it
+    Image = None
+    ImageOps = None
+
+# Defaults for an org's "image_preprocessing" settings
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'max_long_edge': 2000,
+    'target_dpi': None,
+    'grayscale': False,
+    'output_format': 'JPEG',
+    'quality': 85
+}
+
+# Formats that are always re-encoded as output_format; JPEG and PNG keep their format
+RECOMPRESS_FORMATS = {'TIFF', 'BMP'}
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+def get_settings(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Merged image_preprocessing settings for an org, or None when the stage is off"""
+    org_settings = config.get('image_preprocessing') or {}
+    if not org_settings.get('enabled'):
+        return None
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(org_settings)
+    settings['output_format'] = str(settings['output_format']).upper().replace('JPG', 'JPEG')
+    if settings['output_format'] not in MIME_TYPES:
+        settings['output_format'] = 'JPEG'
+    return settings
+
+
+def settings_key(settings: Optional[Dict[str, Any]]) -> str:
+    """Stable string for the settings, used in extraction cache keys"""
+    return json.dumps(settings, sort_keys=True) if settings else ''
+
+
+def is_pdf(stream: BinaryIO, mime_type: Optional[str]) -> bool:
+    if mime_type == 'application/pdf':
+        return True
+    stream.seek(0)
+    head = stream.read(5)
+    stream.seek(0)
+    return head == b'%PDF-'
+
+
+def _target_scale(image, settings: Dict[str, Any]) -> float:
+    scale = 1.0
+    max_long_edge = settings.get('max_long_edge')
+    if max_long_edge and max(image.size) > max_long_edge:
+        scale = max_long_edge / max(image.size)
+    target_dpi = settings.get('target_dpi')
+    dpi = image.info.get('dpi')
+    if target_dpi and dpi and dpi[0] and float(dpi[0]) > target_dpi:
+        scale = min(scale, target_dpi / float(dpi[0]))
+    return scale
+
+
+def normalize_image(stream: BinaryIO, mime_type: Optional[str],
+                    settings: Optional[Dict[str, Any]]) -> Tuple[BinaryIO, Optional[str], Optional[Dict[str, Any]]]:
+    """Orient, downscale, optionally grayscale and recompress an uploaded image
+
+    Returns (stream, mime_type, info). PDFs, unreadable or multi-frame images,
+    and uploads when the stage is disabled or Pillow is missing come back
+    unchanged with info None.
+    """
+    if not settings:
+        return stream, mime_type, None
+    if Image is None:
+        logging.warning("Image preprocessing is enabled but Pillow is not installed; sending the image unchanged")
+        return stream, mime_type, None
+    if is_pdf(stream, mime_type):
+        return stream, mime_type, None
+
+    original_bytes = stream_size(stream)
+    try:
+        image = Image.open(stream)
+        source_format = image.format
+        if getattr(image, 'n_frames', 1) > 1:
+            stream.seek(0)
+            return stream, mime_type, None
+
+        operations = []
+        # 0x0112 is the EXIF Orientation tag; 1 means already upright
+        if image.getexif().get(0x0112, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            operations.append('orient')
+
+        scale = _target_scale(image, settings)
+        if scale < 1.0:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+            operations.append(f'resize:{size[0]}x{size[1]}')
+
+        if settings.get('grayscale') and image.mode not in ('L', '1'):
+            image = image.convert('L')
+            operations.append('grayscale')
+
+        output_format = source_format if source_format in MIME_TYPES else settings['output_format']
+        if source_format in RECOMPRESS_FORMATS or output_format != source_format:
+            operations.append(f'recompress:{output_format}')
+
+        if not operations:
+            stream.seek(0)
+            return stream, mime_type, None
+
+        if output_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = SpooledTemporaryFile(max_size=DEFAULT_SPOOL_BYTES, mode='w+b')
+        if output_format == 'JPEG':
+            image.save(output, 'JPEG', quality=int(settings['quality']), optimize=True)
+        else:
+            image.save(output, 'PNG', optimize=True)
+    except Exception as e:
+        logging.warning(f"Image preprocessing skipped: {str(e)}")
+        stream.seek(0)
+        return stream, mime_type, None
+
+    new_bytes = stream_size(output)
+    # A format change alone must pay for itself; orientation and size changes are kept regardless
+    if new_bytes >= original_bytes and operations == [f'recompress:{output_format}']:
+        output.close()
+        stream.seek(0)
+        return stream, mime_type, None
+
+    info = {
+        'operations': operations,
+        'original_bytes': original_bytes,
+        'bytes': new_bytes,
+        'bytes_saved': original_bytes - new_bytes
+    }
+    logging.info(f"Image preprocessing ({', '.join(operations)}): {original_bytes} -> {new_bytes} bytes, "
+                 f"saved {original_bytes - new_bytes} bytes")
+    return output, MIME_TYPES[output_format], info
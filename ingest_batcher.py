@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import json_codec
+
+# Flush a bucket once it holds this many records...
+DEFAULT_MAX_RECORDS = 200
+# ...or once its oldest record has waited this many seconds
+DEFAULT_WINDOW_SECONDS = 2.0
+# Tickets are kept this long after their batch was sent
+TICKET_RETENTION_SECONDS = 60 * 60
+
+# Limits for a single streaming ingestion request body ({"data": [...]})
+DEFAULT_CHUNK_MAX_BYTES = 190 * 1024
+DEFAULT_CHUNK_MAX_RECORDS = 200
+
+# Ticket states
+QUEUED = 'queued'
+SENDING = 'sending'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+BucketKey = Tuple[str, str, str]
+
+
+def split_records(records: List[Dict[str, Any]], max_bytes: int = DEFAULT_CHUNK_MAX_BYTES,
+                  max_records: int = DEFAULT_CHUNK_MAX_RECORDS) -> List[List[Dict[str, Any]]]:
+    """Split records into chunks whose {"data": [...]} body stays under both limits
+
+    A record that is larger than max_bytes on its own gets a chunk to itself.
+    """
+    envelope = len(b'{"data": []}')
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_bytes = envelope
+    for record in records:
+        # +2 covers the separator between records (", " with the stdlib codec)
+        size = len(json_codec.dumps(record).encode('utf-8')) + 2
+        if current and (current_bytes + size > max_bytes or len(current) >= max_records):
+            chunks.append(current)
+            current = []
+            current_bytes = envelope
+        current.append(record)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class IngestionBatcher:
+    """Collects ingestion records from many documents and sends them in batches
+
+    Records are grouped by (org, connector, object). flush_fn(org_name,
+    connector_name, object_name, records) performs the actual ingest call and
+    returns a result dict with a 'success' flag.
+    """
+
+    def __init__(self, flush_fn: Callable[[str, str, str, List[Dict[str, Any]]], Dict[str, Any]],
+                 max_records: int = DEFAULT_MAX_RECORDS, window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 flush_workers: int = 2):
+        self.flush_fn = flush_fn
+        self.max_records = max_records
+        self.window_seconds = window_seconds
+        self._executor = ThreadPoolExecutor(max_workers=flush_workers, thread_name_prefix='ingest-flush')
+        self._buckets: Dict[BucketKey, Dict[str, Any]] = {}
+        self._tickets: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.batches_sent = 0
+        self.records_sent = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ingest-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, org_name: Optional[str], connector_name: str, object_name: str,
+               records: List[Dict[str, Any]],
+               on_done: Optional[Callable[[Dict[str, Any], List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+        """Queue one document's records; returns a status handle for the response
+
+        on_done is called with the batch result and the batch's records once
+        the batch was sent, whether or not it was ingested.
+        """
+        ticket_id = uuid.uuid4().hex
+        key = (org_name or '', connector_name, object_name)
+        with self._cond:
+            self._ensure_started()
+            self._prune_tickets()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = {'records': [], 'tickets': [], 'on_done': [],
+                                               'opened_at': time.monotonic()}
+            bucket['records'].extend(records)
+            bucket['tickets'].append(ticket_id)
+            if on_done is not None:
+                bucket['on_done'].append(on_done)
+            self._tickets[ticket_id] = {
+                'ticket_id': ticket_id,
+                'state': QUEUED,
+                'records_queued': len(records),
+                'submitted_at': time.time()
+            }
+            self._cond.notify()
+        return {
+            'state': QUEUED,
+            'ticket_id': ticket_id,
+            'records_queued': len(records),
+            'status_url': f'/ingestion/{ticket_id}'
+        }
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            ticket = self._tickets.get(ticket_id)
+            return dict(ticket) if ticket else None
+
+    def wait(self, ticket_ids: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """Wait until the batches holding these tickets have been sent; False on timeout
+
+        Queued tickets only settle once their bucket is flushed.
+        """
+        ticket_ids = list(ticket_ids)
+
+        def settled() -> bool:
+            return all(self._tickets.get(t, {}).get('state') not in (QUEUED, SENDING) for t in ticket_ids)
+
+        with self._cond:
+            return self._cond.wait_for(settled, timeout)
+
+    def flush_all(self) -> None:
+        """Send every pending bucket now and wait for the results (used at shutdown)"""
+        with self._cond:
+            taken = self._take(list(self._buckets))
+        # Sent from the calling thread: at interpreter exit the executor no longer accepts work
+        for key, bucket in taken:
+            self._send(key, bucket)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'pending_buckets': len(self._buckets),
+                'pending_records': sum(len(b['records']) for b in self._buckets.values()),
+                'batches_sent': self.batches_sent,
+                'records_sent': self.records_sent
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [key for key, bucket in self._buckets.items()
+                       if len(bucket['records']) >= self.max_records
+                       or now - bucket['opened_at'] >= self.window_seconds]
+                if not due:
+                    deadlines = [b['opened_at'] + self.window_seconds for b in self._buckets.values()]
+                    timeout = max(min(deadlines) - now, 0.01) if deadlines else None
+                    self._cond.wait(timeout)
+                    continue
+                taken = self._take(due)
+            for key, bucket in taken:
+                self._executor.submit(self._send, key, bucket)
+
+    def _take(self, keys: List[BucketKey]) -> List[Tuple[BucketKey, Dict[str, Any]]]:
+        """Remove buckets from the pending set and mark their tickets as sending (lock held)"""
+        taken = []
+        for key in keys:
+            bucket = self._buckets.pop(key, None)
+            if not bucket:
+                continue
+            for ticket_id in bucket['tickets']:
+                if ticket_id in self._tickets:
+                    self._tickets[ticket_id]['state'] = SENDING
+            taken.append((key, bucket))
+        return taken
+
+    def _send(self, key: BucketKey, bucket: Dict[str, Any]) -> None:
+        org_name, connector_name, object_name = key
+        records = bucket['records']
+        batch_id = uuid.uuid4().hex
+        started = time.monotonic()
+        try:
+            result = self.flush_fn(org_name or None, connector_name, object_name, records)
+        except Exception as e:
+            logging.error(f"✗ Batched Data Cloud ingestion failed: {str(e)}")
+            result = {'success': False, 'error': str(e)}
+        result = dict(result or {'success': False, 'error': 'No ingestion result'})
+        result.update({
+            'batch_id': batch_id,
+            'batch_records': len(records),
+            'batch_documents': len(bucket['tickets']),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        })
+
+        with self._cond:
+            self.batches_sent += 1
+            self.records_sent += len(records)
+            for ticket_id in bucket['tickets']:
+                ticket = self._tickets.get(ticket_id)
+                if ticket:
+                    ticket['state'] = SUCCEEDED if result.get('success') else FAILED
+                    ticket['flushed_at'] = time.time()
+                    ticket['result'] = result
+            self._cond.notify_all()
+        for callback in bucket['on_done']:
+            try:
+                callback(result, records)
+            except Exception as e:
+                logging.error(f"Ingestion callback raised: {str(e)}")
+
+    def _prune_tickets(self) -> None:
+        cutoff = time.time() - TICKET_RETENTION_SECONDS
+        for ticket_id in [t for t, ticket in self._tickets.items()
+                          if ticket.get('flushed_at') and ticket['flushed_at'] < cutoff]:
+            del self._tickets[ticket_id]
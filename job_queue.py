@@ -0,0 +1,374 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Finished jobs are dropped after this many seconds
+DEFAULT_RETENTION_SECONDS = 24 * 60 * 60
+# A running job whose lease wasn't renewed for this many seconds is assumed to belong to a worker that
+# died, and is queued again. Workers renew the lease while a job runs, but a renewal can stall along
+# with its process, so this outlasts the worst single extraction: up to 3 attempts of a 160 s Document
+# AI call with 30 s Retry-After waits (~9 min), twice when the fallback model runs after a failed
+# primary (hedging runs the models side by side, not after each other), plus ingestion retries.
+DEFAULT_LEASE_SECONDS = 30 * 60
+
+
+class MemoryJobBackend:
+    """Job store kept in this process; jobs are lost on restart"""
+
+    # Jobs never outlive this process, so there is no lease to renew
+    lease_seconds = None
+
+    def __init__(self, retention_seconds: int = DEFAULT_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def add(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._prune()
+            self._jobs[job['id']] = dict(job)
+            self._order.append(job['id'])
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job as running and return it"""
+        with self._lock:
+            for job_id in self._order:
+                job = self._jobs.get(job_id)
+                if job and job['state'] == QUEUED:
+                    job['state'] = RUNNING
+                    job['started_at'] = time.time()
+                    job['claim_token'] = uuid.uuid4().hex
+                    return dict(job)
+        return None
+
+    def renew(self, job_id: str, claim_token: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return bool(job) and job.get('claim_token') == claim_token
+
+    def update(self, job_id: str, claim_token: Optional[str] = None, **fields) -> bool:
+        """Update a job; with claim_token only while that claim still holds it. True if updated"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or (claim_token is not None and job.get('claim_token') != claim_token):
+                return False
+            job.update(fields)
+            return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job['state']] = counts.get(job['state'], 0) + 1
+            return counts
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.get('finished_at') and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired:
+            self._order = [job_id for job_id in self._order if job_id in self._jobs]
+
+
+class SQLiteJobBackend:
+    """Job store in a SQLite file, shared by every worker process on the host"""
+
+    COLUMNS = ('id', 'org_name', 'filename', 'mime_type', 'upload_path', 'state',
+               'created_at', 'started_at', 'finished_at', 'status_code', 'result', 'error',
+               'claim_token', 'heartbeat_at')
+
+    def __init__(self, path: str = 'jobs.db', retention_seconds: int = DEFAULT_RETENTION_SECONDS,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    org_name TEXT,
+                    filename TEXT,
+                    mime_type TEXT,
+                    upload_path TEXT,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    status_code INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    claim_token TEXT,
+                    heartbeat_at REAL
+                )
+            """)
+            # Files created before leases were renewed lack the claim columns
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (('claim_token', 'TEXT'), ('heartbeat_at', 'REAL')):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state_created ON jobs (state, created_at)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(zip(self.COLUMNS, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['error'] = json.loads(job['error']) if job['error'] else None
+        return job
+
+    def add(self, job: Dict[str, Any]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                tuple(self._encode(k, job.get(k)) for k in self.COLUMNS)
+            )
+        finally:
+            conn.close()
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job as running and return it
+
+        Jobs whose lease expired (their worker crashed or was restarted) are
+        queued again first. Each claim gets a new claim_token, so a run whose
+        lease was taken over can no longer update the job.
+        """
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock so two processes can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "UPDATE jobs SET state = ?, started_at = NULL, heartbeat_at = NULL, claim_token = NULL "
+                "WHERE state = ? AND COALESCE(heartbeat_at, started_at) < ?",
+                (QUEUED, RUNNING, time.time() - self.lease_seconds)
+            ).rowcount
+            if expired:
+                logging.warning(f"Re-queued {expired} job(s) whose worker stopped before finishing")
+            row = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1",
+                (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job = self._row_to_job(row)
+            job['state'] = RUNNING
+            job['started_at'] = job['heartbeat_at'] = time.time()
+            job['claim_token'] = uuid.uuid4().hex
+            conn.execute("UPDATE jobs SET state = ?, started_at = ?, heartbeat_at = ?, claim_token = ? WHERE id = ?",
+                         (RUNNING, job['started_at'], job['heartbeat_at'], job['claim_token'], job['id']))
+            conn.execute("COMMIT")
+            return job
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, job_id: str, claim_token: str) -> bool:
+        """Extend a running job's lease; False once the claim was taken over"""
+        conn = self._connect()
+        try:
+            return conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND claim_token = ? AND state = ?",
+                                (time.time(), job_id, claim_token, RUNNING)).rowcount > 0
+        finally:
+            conn.close()
+
+    def update(self, job_id: str, claim_token: Optional[str] = None, **fields) -> bool:
+        """Update a job; with claim_token only while that claim still holds it. True if updated"""
+        if not fields:
+            return False
+        assignments = ', '.join(f"{k} = ?" for k in fields)
+        where, params = "id = ?", (job_id,)
+        if claim_token is not None:
+            where, params = "id = ? AND claim_token = ?", (job_id, claim_token)
+        conn = self._connect()
+        try:
+            return conn.execute(f"UPDATE jobs SET {assignments} WHERE {where}",
+                                tuple(self._encode(k, v) for k, v in fields.items()) + params).rowcount > 0
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_job(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        finally:
+            conn.close()
+
+    def _encode(self, key: str, value: Any) -> Any:
+        if key in ('result', 'error') and value is not None:
+            return json.dumps(value)
+        return value
+
+
+class JobQueue:
+    """Stores uploads, hands jobs to background worker threads and tracks their state"""
+
+    def __init__(self, backend, handler: Callable[[Dict[str, Any], BinaryIO], Dict[str, Any]],
+                 workers: int = 2, upload_dir: str = 'job_uploads', poll_interval: float = 1.0):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self.upload_dir = upload_dir
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker threads (only once per process)"""
+        with self._start_lock:
+            if self._threads:
+                return
+            os.makedirs(self.upload_dir, exist_ok=True)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, org_name: Optional[str], filename: str, mime_type: Optional[str], stream: BinaryIO) -> str:
+        """Copy the upload stream to the upload directory and queue it; returns the job ID"""
+        self.start()
+        job_id = uuid.uuid4().hex
+        upload_path = os.path.join(self.upload_dir, job_id)
+        stream.seek(0)
+        with open(upload_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        self.backend.add({
+            'id': job_id,
+            'org_name': org_name,
+            'filename': filename,
+            'mime_type': mime_type,
+            'upload_path': upload_path,
+            'state': QUEUED,
+            'created_at': time.time()
+        })
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's public view: state, timings, and result or error"""
+        job = self.backend.get(job_id)
+        if not job:
+            return None
+        now = time.time()
+        created_at = job['created_at']
+        started_at = job.get('started_at')
+        finished_at = job.get('finished_at')
+        return {
+            'job_id': job['id'],
+            'org': job['org_name'],
+            'filename': job['filename'],
+            'state': job['state'],
+            'status_code': job.get('status_code'),
+            'timings': {
+                'created_at': created_at,
+                'started_at': started_at,
+                'finished_at': finished_at,
+                'queued_ms': round(((started_at or now) - created_at) * 1000, 1),
+                'run_ms': round(((finished_at or now) - started_at) * 1000, 1) if started_at else None
+            },
+            'result': job.get('result'),
+            'error': job.get('error')
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': type(self.backend).__name__,
+            'workers': len(self._threads),
+            'jobs': self.backend.counts()
+        }
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self.backend.claim()
+            except Exception as e:
+                logging.error(f"Job queue claim failed: {str(e)}")
+                job = None
+            if job is None:
+                # Other processes may enqueue into a shared backend, so poll as well
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        token = job['claim_token']
+        stop = threading.Event()
+        if self.backend.lease_seconds:
+            threading.Thread(target=self._keep_lease, args=(job, stop),
+                             name=f"job-lease-{job['id'][:8]}", daemon=True).start()
+        finished = False
+        try:
+            with open(job['upload_path'], 'rb') as upload:
+                result = self.handler(job, upload)
+            finished = self.backend.update(job['id'], token, state=SUCCEEDED, status_code=200,
+                                           result=result, finished_at=time.time())
+        except Exception as e:
+            # Handlers may raise errors carrying a JSON body and HTTP status (e.g. ExtractionError)
+            logging.error(f"Job {job['id']} failed: {str(e)}")
+            finished = self.backend.update(job['id'], token, state=FAILED,
+                                           status_code=getattr(e, 'status_code', 500),
+                                           error=getattr(e, 'body', None) or {'error': str(e)},
+                                           finished_at=time.time())
+        finally:
+            stop.set()
+            if finished:
+                try:
+                    os.remove(job['upload_path'])
+                except OSError:
+                    pass
+            else:
+                # The lease expired and the job was queued again; its upload belongs to the next run
+                logging.warning(f"Job {job['id']} lost its lease while running; result discarded")
+
+    def _keep_lease(self, job: Dict[str, Any], stop: threading.Event) -> None:
+        """Renew a running job's lease until stop is set"""
+        while not stop.wait(self.backend.lease_seconds / 4):
+            try:
+                if not self.backend.renew(job['id'], job['claim_token']):
+                    return
+            except Exception as e:
+                logging.error(f"Job {job['id']} lease renewal failed: {str(e)}")
@@ -0,0 +1,79 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is used without it
+    orjson = None
+
+# Entities Document AI leaves in the extracted JSON string
+_ENTITIES = (('&quot;', '"'), ('&#92;', '\\'))
+
+
+def backend() -> str:
+    return 'orjson' if orjson is not None else 'json'
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """Serialize to a JSON string (non-ASCII kept as is); indented only when pretty is set"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None)
+
+
+def unescape_entities(text: str) -> str:
+    """Decode the HTML entities in an extracted JSON string
+
+    str.replace runs in C and beats a single regex pass with a Python callback
+    by about 10x here; entities that don't occur cost only a scan. Entities
+    stand for the JSON's own quotes, so decoding has to finish before parsing
+    and can't be fused with unwrap_typed_values (the wrapped result is also
+    returned as is); benchmarks/bench_json_codec.py measures the fused
+    alternative.
+    """
+    for entity, char in _ENTITIES:
+        if entity in text:
+            text = text.replace(entity, char)
+    return text
+
+
+def _unwrap_node(node: Any, stack: list) -> Any:
+    """Unwrap one node; containers are returned empty and queued on the stack to be filled"""
+    if node and isinstance(node, dict) and 'type' in node and 'value' in node:
+        kind, value = node['type'], node['value']
+        if kind == 'array' and isinstance(value, list):
+            items = [None] * len(value)
+            stack.append((value, items))
+            return items
+        if kind == 'object' and isinstance(value, dict):
+            fields = {}
+            stack.append((value, fields))
+            return fields
+        return value
+    return node
+
+
+def unwrap_typed_values(obj: Any) -> Any:
+    """Strip Document AI's {"type": ..., "value": ...} wrappers down to plain values
+
+    Arrays and objects are unwrapped with an explicit stack instead of
+    recursion, so deeply nested results can't hit the recursion limit.
+    """
+    stack: list = []
+    root = _unwrap_node(obj, stack)
+    while stack:
+        source, target = stack.pop()
+        if isinstance(target, list):
+            for index, item in enumerate(source):
+                target[index] = _unwrap_node(item, stack)
+        else:
+            for key, item in source.items():
+                target[key] = _unwrap_node(item, stack)
+    return root
@@ -0,0 +1,378 @@
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_store import (normalize_text, find_field, EMAIL_FIELDS, COMPANY_FIELDS, FIRSTNAME_FIELDS,
+                          LASTNAME_FIELDS)
+
+# What happens to a lead already ingested within the window:
+#   skip  - not sent again
+#   merge - sent with the first ingestion's EventID (Data Cloud updates that record), blanks filled in
+#           from the earlier record
+#   tag   - sent as a new record carrying the first EventID in the tag field
+POLICIES = ('off', 'skip', 'merge', 'tag')
+# Off unless the deployment or an org opts in, so upgrading doesn't change what gets ingested
+DEFAULT_POLICY = 'off'
+DEFAULT_WINDOW_DAYS = 30.0
+DEFAULT_TAG_FIELD = 'DuplicateOf'
+# Keys per org before an org's Bloom filter is rebuilt twice as large
+DEFAULT_BLOOM_CAPACITY = 100000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+# Index changes whose ingestion hasn't settled after this long are assumed lost with their process and
+# undone: it outlasts a queued bulk batch (30 s window, CSV upload, up to 30 min waiting for the job)
+DEFAULT_PENDING_SECONDS = 2 * 60 * 60
+# How often apply() looks for such changes besides startup
+RECONCILE_INTERVAL_SECONDS = 60
+
+# Name fields used when a lead has no email
+NAME_FIELDS = ('name', 'fullname', 'nombrecompleto')
+
+
+def get_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """An org's "dedup" settings; None values fall back to the process-wide defaults"""
+    org_settings = config.get('dedup') or {}
+    policy = org_settings.get('policy')
+    if policy is not None and policy not in POLICIES:
+        logging.warning(f"Unknown lead de-duplication policy {policy!r}; using the default")
+        policy = None
+    window_days = org_settings.get('window_days')
+    return {
+        'policy': policy,
+        'window_days': float(window_days) if window_days is not None else None,
+        'tag_field': org_settings.get('tag_field') or None
+    }
+
+
+def lead_key(record: Dict[str, Any]) -> Optional[str]:
+    """Identity of a lead: its normalized email, else name plus company; None if it has neither"""
+    email = normalize_text(find_field(record, EMAIL_FIELDS))
+    if email:
+        return f'email:{email}'
+    name = normalize_text(find_field(record, NAME_FIELDS))
+    if not name:
+        parts = (find_field(record, FIRSTNAME_FIELDS), find_field(record, LASTNAME_FIELDS))
+        name = normalize_text(' '.join(str(part) for part in parts if part))
+    company = normalize_text(find_field(record, COMPANY_FIELDS))
+    if name and company:
+        return f'name:{name}|{company}'
+    return None
+
+
+def failed_changes(changes: List[tuple], failed_records: List[Dict[str, Any]]) -> List[tuple]:
+    """The index changes from apply() to release when failed_records didn't reach Data Cloud
+
+    A change follows the record sent for it, matched by identity. A lead whose
+    EventID still got in through another record stays indexed. Skipped
+    duplicates sent nothing and are released only if none of the leads got in.
+    """
+    failed = {id(record) for record in failed_records}
+    accepted = {change[0].get('EventID') for change in changes
+                if change[0] is not None and id(change[0]) not in failed}
+    released = []
+    for change in changes:
+        record, _, event_id, _, previous = change[:5]
+        if record is None:
+            lost = not accepted
+        else:
+            lost = id(record) in failed
+            if previous is None or previous[0] != event_id:
+                # The change created this EventID's row, so it stands if any record carrying it got in
+                lost = lost and event_id not in accepted
+        if lost:
+            released.append(change)
+    return released
+
+
+class BloomFilter:
+    """Set membership with no false negatives and about error_rate false positives up to capacity keys"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class LeadIndex:
+    """Leads already sent to Data Cloud, per org, in a SQLite file with a Bloom filter in front
+
+    Most leads in a new document are new, and the Bloom filter answers that
+    without touching the table; only keys it may have seen are looked up.
+    The filter is built from the table on an org's first use, so keys added
+    by other processes are caught when their insert conflicts.
+
+    Changes stay pending in the table until settle() is told how their
+    ingestion went; pending changes older than pending_seconds (their process
+    died before its batch was sent) are undone at startup and from apply().
+    """
+
+    def __init__(self, path: str = 'leads.db', bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+                 bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+                 pending_seconds: float = DEFAULT_PENDING_SECONDS):
+        self.path = path
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.pending_seconds = pending_seconds
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS leads (
+                    org_name TEXT NOT NULL,
+                    lead_key TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    seen_count INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (org_name, lead_key)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS pending (
+                    id INTEGER PRIMARY KEY,
+                    org_name TEXT NOT NULL,
+                    lead_key TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    written_at REAL NOT NULL,
+                    previous TEXT
+                );
+                CREATE INDEX IF NOT EXISTS pending_written ON pending (written_at);
+            """)
+        finally:
+            conn.close()
+        self._blooms: Dict[str, BloomFilter] = {}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+        self.bloom_lookups = 0
+        self.reconciled = 0
+        self._reconciled_at = 0.0
+        self.reconcile()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _bloom(self, conn: sqlite3.Connection, org: str) -> BloomFilter:
+        """The org's filter, (re)built from the table when missing or full (lock held)"""
+        bloom = self._blooms.get(org)
+        if bloom is not None and bloom.count < bloom.capacity:
+            return bloom
+        keys = [row[0] for row in conn.execute("SELECT lead_key FROM leads WHERE org_name = ?", (org,))]
+        capacity = self.bloom_capacity
+        while capacity < len(keys) * 2:
+            capacity *= 2
+        bloom = self._blooms[org] = BloomFilter(capacity, self.bloom_error_rate)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def apply(self, org_name: Optional[str], records: List[Dict[str, Any]], policy: str, window_seconds: float,
+              tag_field: str = DEFAULT_TAG_FIELD) -> Tuple[List[Dict[str, Any]], Dict[str, Any], List[tuple]]:
+        """Apply a policy to records about to be ingested and index them
+
+        Returns the records to send, a summary for the ingestion status and this
+        call's index changes, to pass to settle() once the send is done. Each
+        change is (record sent or None, key, EventID, time written, row before
+        or None, pending id). Duplicates within the same batch count too.
+        """
+        if time.time() - self._reconciled_at > RECONCILE_INTERVAL_SECONDS:
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.error(f"Lead index reconciliation failed: {str(e)}")
+        org = org_name or ''
+        now = time.time()
+        to_send: List[Dict[str, Any]] = []
+        changes: List[tuple] = []
+        duplicates = unkeyed = 0
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                bloom = self._bloom(conn, org)
+                for record in records:
+                    key = lead_key(record)
+                    if key is None:
+                        unkeyed += 1
+                        to_send.append(record)
+                        continue
+                    existing = None
+                    if key in bloom:
+                        self.bloom_lookups += 1
+                        existing = conn.execute(
+                            "SELECT event_id, first_seen, last_seen, seen_count, data FROM leads "
+                            "WHERE org_name = ? AND lead_key = ?",
+                            (org, key)).fetchone()
+                    elif conn.execute(
+                            "INSERT INTO leads (org_name, lead_key, event_id, first_seen, last_seen, seen_count, "
+                            "data) VALUES (?, ?, ?, ?, ?, 1, ?) ON CONFLICT DO NOTHING",
+                            (org, key, record['EventID'], now, now, json.dumps(record))).rowcount:
+                        bloom.add(key)
+                        changes.append(self._pending(conn, org, record, key, record['EventID'], now, None))
+                        to_send.append(record)
+                        continue
+                    else:
+                        # Indexed by another process since this org's filter was built
+                        bloom.add(key)
+                        existing = conn.execute(
+                            "SELECT event_id, first_seen, last_seen, seen_count, data FROM leads "
+                            "WHERE org_name = ? AND lead_key = ?",
+                            (org, key)).fetchone()
+
+                    if existing is None or now - existing[2] > window_seconds:
+                        # New (a Bloom false positive) or last seen before the window: index it afresh
+                        conn.execute(
+                            "INSERT OR REPLACE INTO leads (org_name, lead_key, event_id, first_seen, last_seen, "
+                            "seen_count, data) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                            (org, key, record['EventID'], now, now, json.dumps(record)))
+                        if existing is None:
+                            bloom.add(key)
+                        changes.append(self._pending(conn, org, record, key, record['EventID'], now, existing))
+                        to_send.append(record)
+                        continue
+
+                    duplicates += 1
+                    event_id, previous = existing[0], existing[4]
+                    data = sent = None
+                    if policy == 'merge':
+                        data = dict(json.loads(previous))
+                        data.update({field: value for field, value in record.items() if value not in (None, '')})
+                        data['EventID'] = event_id
+                        sent = data
+                    elif policy == 'tag':
+                        sent = dict(record, **{tag_field: event_id})
+                    if sent is not None:
+                        to_send.append(sent)
+                    changes.append(self._pending(conn, org, sent, key, event_id, now, existing))
+                    conn.execute(
+                        "UPDATE leads SET last_seen = ?, seen_count = seen_count + 1, data = ? "
+                        "WHERE org_name = ? AND lead_key = ?",
+                        (now, json.dumps(data) if data is not None else previous, org, key))
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+            self.checked += len(records)
+            self.duplicates += duplicates
+        summary = {'policy': policy, 'records': len(records), 'duplicates': duplicates, 'unkeyed': unkeyed}
+        if policy == 'skip':
+            summary['skipped'] = duplicates
+        return to_send, summary, changes
+
+    def _pending(self, conn: sqlite3.Connection, org: str, record: Optional[Dict[str, Any]], key: str,
+                 event_id: str, written_at: float, previous: Optional[tuple]) -> tuple:
+        """Record an index change as pending until its ingestion settles; returns the change"""
+        pending_id = conn.execute(
+            "INSERT INTO pending (org_name, lead_key, event_id, written_at, previous) VALUES (?, ?, ?, ?, ?)",
+            (org, key, event_id, written_at, json.dumps(list(previous)) if previous else None)).lastrowid
+        return record, key, event_id, written_at, previous, pending_id
+
+    def _undo(self, conn: sqlite3.Connection, org: str, key: str, event_id: str, written_at: float,
+              previous: Optional[tuple]) -> None:
+        if previous is None:
+            conn.execute("DELETE FROM leads WHERE org_name = ? AND lead_key = ? AND event_id = ?",
+                         (org, key, event_id))
+        elif previous[0] != event_id:
+            conn.execute(
+                "UPDATE leads SET event_id = ?, first_seen = ?, last_seen = ?, seen_count = ?, data = ? "
+                "WHERE org_name = ? AND lead_key = ? AND event_id = ?",
+                tuple(previous) + (org, key, event_id))
+        else:
+            conn.execute(
+                "UPDATE leads SET seen_count = MAX(seen_count - 1, 1), "
+                "last_seen = CASE WHEN last_seen = ? THEN ? ELSE last_seen END, "
+                "data = CASE WHEN last_seen = ? THEN ? ELSE data END "
+                "WHERE org_name = ? AND lead_key = ? AND event_id = ?",
+                (written_at, previous[2], written_at, previous[4], org, key, event_id))
+
+    def settle(self, org_name: Optional[str], changes: List[tuple], released: List[tuple]) -> None:
+        """Finish apply()'s changes once their ingestion is done, undoing the released ones
+
+        Released leads didn't get in, so a retry mustn't take them for
+        duplicates: new leads are forgotten, re-indexed ones get their old row
+        back and a duplicate's sighting is taken back (its data too, unless
+        seen again since). The rest stay indexed.
+        """
+        if not changes:
+            return
+        org = org_name or ''
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Newest first, so a lead seen twice in one document unwinds in order
+            for _, key, event_id, written_at, previous, _ in reversed(released):
+                self._undo(conn, org, key, event_id, written_at, previous)
+            conn.executemany("DELETE FROM pending WHERE id = ?", [(change[5],) for change in changes])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        # Released keys stay in the Bloom filter; a lookup finds them gone and treats them as new
+
+    def release(self, org_name: Optional[str], changes: List[tuple]) -> None:
+        """Undo all of apply()'s changes, e.g. when nothing was sent"""
+        self.settle(org_name, changes, changes)
+
+    def reconcile(self) -> int:
+        """Undo pending changes older than pending_seconds, left by a process that died before sending"""
+        now = time.time()
+        self._reconciled_at = now
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, org_name, lead_key, event_id, written_at, previous FROM pending "
+                "WHERE written_at < ? ORDER BY id DESC", (now - self.pending_seconds,)).fetchall()
+            for _, org, key, event_id, written_at, previous in rows:
+                self._undo(conn, org, key, event_id, written_at, tuple(json.loads(previous)) if previous else None)
+            conn.executemany("DELETE FROM pending WHERE id = ?", [(row[0],) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if rows:
+            logging.warning(f"Lead index: undid {len(rows)} change(s) whose ingestion never settled")
+            with self._lock:
+                self.reconciled += len(rows)
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'path': self.path,
+                'checked': self.checked,
+                'duplicates': self.duplicates,
+                'bloom_lookups': self.bloom_lookups,
+                'reconciled': self.reconciled,
+                'bloom_keys': {org: bloom.count for org, bloom in self._blooms.items()}
+            }
@@ -0,0 +1,188 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds; Document AI calls take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+STAGE_LABELS = ('stage', 'org', 'ml_model')
+INFLIGHT_LABELS = ('stage', 'org')
+RESPONSE_LABELS = ('upstream', 'org', 'status')
+PROFILE_LABELS = ('org', 'ml_model', 'api_version', 'schema_hash')
+ADMISSION_LABELS = ('lane', 'org')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def label(self, ml_model: Optional[str]) -> None:
+        pass
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'org', 'ml_model', 'started')
+
+    def __init__(self, metrics: 'Metrics', stage: str, org: str, ml_model: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.org = org
+        self.ml_model = ml_model
+
+    def __enter__(self):
+        self.metrics._add_in_flight(self.stage, self.org, 1)
+        self.started = time.perf_counter()
+        return self
+
+    def label(self, ml_model: Optional[str]) -> None:
+        """Record the run under another model, e.g. the one that answered"""
+        self.ml_model = ml_model or ''
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.metrics._add_in_flight(self.stage, self.org, -1)
+        self.metrics.observe(self.stage, elapsed, self.org, self.ml_model)
+        return False
+
+
+class Metrics:
+    """In-process pipeline metrics rendered in the Prometheus text format
+
+    Recording is a dict update under a lock; nothing is formatted until
+    render() is called by a scrape. When disabled every call is a no-op.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._stages: Dict[Tuple[str, str, str], list] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._responses: Dict[Tuple[str, str, str], int] = {}
+        # org -> (ml_model, api_version, schema_hash) of its compiled profile
+        self._profiles: Dict[str, Tuple[str, str, str]] = {}
+        # (lane, org) -> (active, queued) calls in the admission controller
+        self._admission: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+    def timer(self, stage: str, org_name: Optional[str] = None, ml_model: Optional[str] = None):
+        """Context manager timing one run of a pipeline stage"""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _StageTimer(self, stage, org_name or '', ml_model or '')
+
+    def observe(self, stage: str, seconds: float, org_name: Optional[str] = None,
+                ml_model: Optional[str] = None) -> None:
+        """Record a stage duration measured elsewhere"""
+        if not self.enabled:
+            return
+        key = (stage, org_name or '', ml_model or '')
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._stages.get(key)
+            if series is None:
+                series = self._stages[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def count_response(self, upstream: str, org_name: Optional[str], status) -> None:
+        """Count an upstream response by status code ('error' when no response came back)"""
+        if not self.enabled:
+            return
+        key = (upstream, org_name or '', str(status))
+        with self._lock:
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def set_profile(self, org_name: str, ml_model: str, api_version: str, schema_hash: str) -> None:
+        """Publish the model, API version and schema hash an org is currently extracting with"""
+        with self._lock:
+            self._profiles[org_name or ''] = (ml_model, api_version, schema_hash)
+
+    def drop_profile(self, org_name: str) -> None:
+        with self._lock:
+            self._profiles.pop(org_name or '', None)
+
+    def set_admission(self, lane: str, org_name: Optional[str], active: int, queued: int) -> None:
+        """Publish how many of an org's calls in a lane are running and waiting"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._admission[(lane, org_name or '')] = (active, queued)
+
+    def _add_in_flight(self, stage: str, org_name: str, delta: int) -> None:
+        key = (stage, org_name)
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + delta
+
+    def render(self) -> str:
+        with self._lock:
+            stages = [(key, list(series[0]), series[1], series[2]) for key, series in self._stages.items()]
+            in_flight = dict(self._in_flight)
+            responses = dict(self._responses)
+            profiles = dict(self._profiles)
+            admission = dict(self._admission)
+
+        lines: List[str] = [
+            '# HELP idp_stage_duration_seconds Time spent in each extraction pipeline stage.',
+            '# TYPE idp_stage_duration_seconds histogram'
+        ]
+        bounds = [repr(float(b)) for b in self.buckets] + ['+Inf']
+        for key, counts, total, count in sorted(stages):
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(STAGE_LABELS, key, f'le="{bound}"')
+                lines.append(f'idp_stage_duration_seconds_bucket{labels} {cumulative}')
+            labels = _format_labels(STAGE_LABELS, key)
+            lines.append(f'idp_stage_duration_seconds_sum{labels} {total}')
+            lines.append(f'idp_stage_duration_seconds_count{labels} {count}')
+
+        lines.append('# HELP idp_stage_in_flight Pipeline stages currently running.')
+        lines.append('# TYPE idp_stage_in_flight gauge')
+        for key, value in sorted(in_flight.items()):
+            lines.append(f'idp_stage_in_flight{_format_labels(INFLIGHT_LABELS, key)} {value}')
+
+        lines.append('# HELP idp_upstream_responses_total Responses from Salesforce and Data Cloud by status code.')
+        lines.append('# TYPE idp_upstream_responses_total counter')
+        for key, value in sorted(responses.items()):
+            lines.append(f'idp_upstream_responses_total{_format_labels(RESPONSE_LABELS, key)} {value}')
+
+        lines.append('# HELP idp_org_profile_info Model, API version and schema hash each org extracts with.')
+        lines.append('# TYPE idp_org_profile_info gauge')
+        for org_name, values in sorted(profiles.items()):
+            lines.append(f'idp_org_profile_info{_format_labels(PROFILE_LABELS, (org_name,) + values)} 1')
+
+        lines.append('# HELP idp_admission_active Upstream calls admitted and running, per lane and org.')
+        lines.append('# TYPE idp_admission_active gauge')
+        for key, (active, _) in sorted(admission.items()):
+            lines.append(f'idp_admission_active{_format_labels(ADMISSION_LABELS, key)} {active}')
+        lines.append('# HELP idp_admission_queued Upstream calls waiting for a slot, per lane and org.')
+        lines.append('# TYPE idp_admission_queued gauge')
+        for key, (_, queued) in sorted(admission.items()):
+            lines.append(f'idp_admission_queued{_format_labels(ADMISSION_LABELS, key)} {queued}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every module in the process; app.py applies METRICS_ENABLED
+metrics = Metrics()
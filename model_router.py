@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Outcomes older than this, or beyond the newest DEFAULT_WINDOW_SIZE, are forgotten
+DEFAULT_WINDOW_SECONDS = 300.0
+DEFAULT_WINDOW_SIZE = 200
+# Fewer outcomes than this and a model is assumed healthy
+DEFAULT_MIN_SAMPLES = 5
+# A model is degraded above this error rate, or when its p95 is this many times the best p95
+DEFAULT_MAX_ERROR_RATE = 0.25
+DEFAULT_SLOW_FACTOR = 2.0
+# Hedge once the primary has taken longer than this percentile of its recent latencies
+DEFAULT_HEDGE_PERCENTILE = 90.0
+DEFAULT_HEDGE_MIN_DELAY = 1.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ModelStats:
+    """Rolling latency and error outcomes of one org's calls to one model"""
+
+    def __init__(self, window_seconds: float, window_size: int):
+        self.window_seconds = window_seconds
+        # (monotonic time, seconds, ok)
+        self.outcomes: Deque[Tuple[float, float, bool]] = deque(maxlen=window_size)
+
+    def add(self, seconds: float, ok: bool) -> None:
+        self.outcomes.append((time.monotonic(), seconds, ok))
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            self.outcomes.popleft()
+
+    def summary(self) -> Dict[str, Any]:
+        self._prune()
+        latencies = sorted(seconds for _, seconds, ok in self.outcomes if ok)
+        errors = sum(1 for _, _, ok in self.outcomes if not ok)
+        return {
+            'samples': len(self.outcomes),
+            'error_rate': round(errors / len(self.outcomes), 3) if self.outcomes else 0.0,
+            'p50': round(percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(percentile(latencies, 95), 3) if latencies else None
+        }
+
+    def latency_percentile(self, pct: float) -> Tuple[int, Optional[float]]:
+        """(successful samples, latency percentile) over the window"""
+        self._prune()
+        latencies = sorted(seconds for _, seconds, ok in self.outcomes if ok)
+        return len(latencies), percentile(latencies, pct) if latencies else None
+
+
+class ModelRouter:
+    """Orders an org's candidate ML models by recent health
+
+    Models are tried in their configured order, except that a model whose
+    recent error rate or p95 latency marks it as degraded drops behind the
+    healthy ones. Degraded models are ranked by error rate, then p95. As the
+    window slides, a model that stopped being used sheds its old outcomes and
+    is tried again.
+    """
+
+    def __init__(self, window_seconds: float = DEFAULT_WINDOW_SECONDS, window_size: int = DEFAULT_WINDOW_SIZE,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, max_error_rate: float = DEFAULT_MAX_ERROR_RATE,
+                 slow_factor: float = DEFAULT_SLOW_FACTOR, hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY):
+        self.window_seconds = window_seconds
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self._stats: Dict[Tuple[str, str], ModelStats] = {}
+        # org -> [hedges sent, hedges that returned first]
+        self._hedges: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, org_name: Optional[str], ml_model: str, seconds: float, ok: bool) -> None:
+        """Record one Document AI call; ok is False for errors, throttling and 5xx responses"""
+        key = (org_name or '', ml_model)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = ModelStats(self.window_seconds, self.window_size)
+            stats.add(seconds, ok)
+
+    def _summary(self, org: str, ml_model: str) -> Dict[str, Any]:
+        stats = self._stats.get((org, ml_model))
+        return stats.summary() if stats else {'samples': 0, 'error_rate': 0.0, 'p50': None, 'p95': None}
+
+    def order(self, org_name: Optional[str], models: List[str]) -> List[str]:
+        """Candidate models, the one to call first at the front"""
+        if len(models) < 2:
+            return list(models)
+        org = org_name or ''
+        with self._lock:
+            summaries = {model: self._summary(org, model) for model in models}
+        known = {model: s for model, s in summaries.items() if s['samples'] >= self.min_samples}
+        fastest = min((s['p95'] for s in known.values() if s['p95'] is not None), default=None)
+
+        def degraded(model: str) -> bool:
+            summary = known.get(model)
+            if summary is None:
+                return False
+            if summary['error_rate'] > self.max_error_rate or summary['p95'] is None:
+                return True
+            return fastest is not None and summary['p95'] > fastest * self.slow_factor
+
+        healthy = [model for model in models if not degraded(model)]
+        rest = sorted((model for model in models if degraded(model)),
+                      key=lambda model: (summaries[model]['error_rate'], summaries[model]['p95'] or float('inf')))
+        return healthy + rest
+
+    def hedge_delay(self, org_name: Optional[str], ml_model: str) -> Optional[float]:
+        """Seconds to wait for a model before hedging, or None until there are enough samples"""
+        with self._lock:
+            stats = self._stats.get((org_name or '', ml_model))
+            if stats is None:
+                return None
+            samples, latency = stats.latency_percentile(self.hedge_percentile)
+        if samples < self.min_samples or latency is None:
+            return None
+        return max(latency, self.hedge_min_delay)
+
+    def record_hedge(self, org_name: Optional[str], won: bool) -> None:
+        """Count a hedged request and whether it beat the primary"""
+        with self._lock:
+            counts = self._hedges.setdefault(org_name or '', [0, 0])
+            counts[0] += 1
+            counts[1] += int(won)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = sorted(self._stats)
+            models: Dict[str, Dict[str, Any]] = {}
+            for org, ml_model in keys:
+                models.setdefault(org, {})[ml_model] = self._summary(org, ml_model)
+            hedges = {org: {'sent': sent, 'won': won} for org, (sent, won) in self._hedges.items()}
+        return {'models': models, 'hedges': hedges}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from config import DEFAULT_ML_MODEL
+from config_manager import get_default_schema, get_org_config
+from image_normalize import get_settings as get_image_settings, settings_key as image_settings_key
+from lead_dedup import get_settings as get_dedup_settings
+from metrics import metrics
+from pdf_split import get_settings as get_pdf_split_settings, settings_key as pdf_split_settings_key
+from upload_stream import json_body_head
+
+EXTRACT_PATH = "/services/data/{api_version}/ssot/document-processing/actions/extract-data"
+
+
+class OrgProfile:
+    """Everything the extraction hot path derives from an org's configuration, computed once"""
+
+    def __init__(self, org_name: str, config: Dict[str, Any], default_schema: Dict[str, Any]):
+        self.org_name = org_name
+        # The config snapshots this profile was built from; a reload replaces them
+        self.config = config
+        self.default_schema = default_schema
+
+        self.uses_default_schema = 'schema' not in config
+        self.schema = default_schema if self.uses_default_schema else config['schema']
+        self.ml_model = config.get('ml_model', DEFAULT_ML_MODEL)
+        # The configured model first, then the fallbacks the model router may switch to
+        self.ml_models = [self.ml_model] + [model for model in dict.fromkeys(config.get('fallback_models') or [])
+                                            if model and model != self.ml_model]
+        # None: use the process-wide HEDGE_REQUESTS setting
+        self.hedge = config.get('hedge')
+        self.api_version = config.get('auth', {}).get('api_version', 'v62.0')
+        self.connector_name = config.get('datacloud_connector_name', 'ContactIngestion')
+        self.object_name = config.get('datacloud_object_name', 'LeadRecord')
+
+        self.schema_config = json.dumps(self.schema)
+        self.schema_hash = hashlib.sha256(self.schema_config.encode('utf-8')).hexdigest()[:16]
+        self.extract_path = EXTRACT_PATH.format(api_version=self.api_version)
+        # Start of the extract-data request body for each candidate model, up to the per-upload mime type
+        self.body_heads = {model: json_body_head(model, self.schema_config) for model in self.ml_models}
+        self.body_head = self.body_heads[self.ml_model]
+
+        self.image_settings = get_image_settings(config)
+        self.pdf_split_settings = get_pdf_split_settings(config)
+        self.cache_key_extra = (image_settings_key(self.image_settings),
+                                pdf_split_settings_key(self.pdf_split_settings))
+        # Per-lane concurrency caps for the admission controller, e.g. {"document_ai": 2}
+        self.admission_limits = get_admission_limits(config)
+        # Lead de-duplication policy, window and tag field (None: the process-wide defaults)
+        self.dedup = get_dedup_settings(config)
+
+    def is_current(self, config: Dict[str, Any]) -> bool:
+        if config is not self.config:
+            return False
+        return not self.uses_default_schema or self.default_schema is get_default_schema()
+
+    def extract_url(self, instance_url: str) -> str:
+        return f"{instance_url}{self.extract_path}"
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'ml_model': self.ml_model,
+            'fallback_models': self.ml_models[1:],
+            'api_version': self.api_version,
+            'schema_hash': self.schema_hash,
+            'connector_name': self.connector_name,
+            'object_name': self.object_name,
+            'admission_limits': self.admission_limits,
+            'dedup': self.dedup
+        }
+
+
+def is_admission_limit(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def get_admission_limits(config: Dict[str, Any]) -> Dict[str, int]:
+    """An org's per-lane admission caps; saves reject bad ones, hand edits are skipped here"""
+    limits = config.get('admission') or {}
+    if not isinstance(limits, dict):
+        logging.warning(f"Ignoring admission limits that aren't an object: {limits!r}")
+        return {}
+    valid = {}
+    for lane, limit in limits.items():
+        if limit is None:
+            continue
+        if is_admission_limit(limit):
+            valid[lane] = limit
+        else:
+            logging.warning(f"Ignoring {lane} admission limit {limit!r}: not a positive integer")
+    return valid
+
+
+class ProfileRegistry:
+    """Compiled OrgProfile per org, rebuilt when the org's config snapshot changes
+
+    Saves through the API compile the new profile straight away; edits made by
+    other processes are picked up on the first request after the config reload.
+    """
+
+    def __init__(self):
+        self._profiles: Dict[str, OrgProfile] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, org_name: str, config: Optional[Dict[str, Any]] = None) -> Optional[OrgProfile]:
+        """Profile for an org's current config, or None if the org isn't configured"""
+        if config is None:
+            config = get_org_config(org_name)
+            if config is None:
+                return None
+        profile = self._profiles.get(org_name)
+        if profile is not None and profile.is_current(config):
+            return profile
+        return self._build(org_name, config)
+
+    def compile(self, org_name: str) -> Optional[OrgProfile]:
+        """Build the profile for a just-saved config"""
+        return self.get(org_name)
+
+    def discard(self, org_name: str) -> None:
+        with self._lock:
+            self._profiles.pop(org_name, None)
+        metrics.drop_profile(org_name)
+
+    def _build(self, org_name: str, config: Dict[str, Any]) -> OrgProfile:
+        profile = OrgProfile(org_name, config, get_default_schema())
+        with self._lock:
+            self._profiles[org_name] = profile
+            self.builds += 1
+        metrics.set_profile(org_name, profile.ml_model, profile.api_version, profile.schema_hash)
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            profiles = {name: profile.describe() for name, profile in self._profiles.items()}
+            return {'builds': self.builds, 'profiles': profiles}
@@ -0,0 +1,115 @@
+import json
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from upload_stream import DEFAULT_SPOOL_BYTES
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # pypdf is optional; PDFs are sent whole without it
+    PdfReader = None
+    PdfWriter = None
+
+# Defaults for an org's "pdf_split" settings
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'pages_per_part': 1,
+    'max_parallel': 4,
+    'min_pages': 2
+}
+
+
+def get_settings(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Merged pdf_split settings for an org, or None when splitting is off"""
+    org_settings = config.get('pdf_split') or {}
+    if not org_settings.get('enabled'):
+        return None
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(org_settings)
+    settings['pages_per_part'] = max(1, int(settings['pages_per_part']))
+    settings['max_parallel'] = max(1, int(settings['max_parallel']))
+    return settings
+
+
+def settings_key(settings: Optional[Dict[str, Any]]) -> str:
+    """Stable string for the settings that change the merged result, used in cache keys"""
+    if not settings:
+        return ''
+    return json.dumps({'pages_per_part': settings['pages_per_part'], 'min_pages': settings['min_pages']},
+                      sort_keys=True)
+
+
+def split_pdf(stream: BinaryIO, pages_per_part: int = 1,
+              min_pages: int = 2) -> Optional[List[Tuple[int, int, BinaryIO]]]:
+    """Split a PDF into parts of pages_per_part pages
+
+    Returns (first_page, last_page, stream) tuples with 1-based page numbers,
+    or None when pypdf is missing, the file can't be read, or it has fewer
+    than min_pages pages. The caller closes the part streams.
+    """
+    if PdfReader is None:
+        logging.warning("PDF splitting is enabled but pypdf is not installed; sending the PDF whole")
+        return None
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        page_count = len(reader.pages)
+        if page_count < max(min_pages, 2):
+            return None
+        parts = []
+        for first in range(0, page_count, pages_per_part):
+            last = min(first + pages_per_part, page_count)
+            writer = PdfWriter()
+            for index in range(first, last):
+                writer.add_page(reader.pages[index])
+            part = SpooledTemporaryFile(max_size=DEFAULT_SPOOL_BYTES, mode='w+b')
+            writer.write(part)
+            part.seek(0)
+            parts.append((first + 1, last, part))
+        return parts
+    except Exception as e:
+        logging.warning(f"PDF splitting skipped: {str(e)}")
+        return None
+    finally:
+        stream.seek(0)
+
+
+def _is_array(name: str, value: Any, schema: Dict[str, Any]) -> bool:
+    prop = (schema.get('properties') or {}).get(name) or {}
+    if prop.get('type'):
+        return prop['type'] == 'array'
+    return isinstance(value, dict) and value.get('type') == 'array'
+
+
+def _has_value(value: Any) -> bool:
+    if isinstance(value, dict) and 'type' in value and 'value' in value:
+        value = value['value']
+    return value not in (None, '', [], {})
+
+
+def merge_results(results: List[Optional[Dict[str, Any]]], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge per-part extraction results (in page order) into one result
+
+    Array properties (e.g. LeadsTable) are concatenated in page order; any
+    other property takes the first value found. Results keep Document AI's
+    type/value structure. Parts that failed are passed as None.
+    """
+    merged: Dict[str, Any] = {}
+    for result in results:
+        if not result:
+            continue
+        for name, value in result.items():
+            if _is_array(name, value, schema):
+                items = value.get('value') if isinstance(value, dict) and 'value' in value else value
+                if not isinstance(items, list):
+                    continue
+                if name not in merged:
+                    merged[name] = dict(value, value=list(items)) if isinstance(value, dict) else list(items)
+                elif isinstance(merged[name], dict):
+                    merged[name]['value'].extend(items)
+                else:
+                    merged[name].extend(items)
+            elif name not in merged or (not _has_value(merged[name]) and _has_value(value)):
+                merged[name] = value
+    return merged
@@ -0,0 +1,285 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Defaults for the shared retry policy and per-org/per-endpoint circuit breakers
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+# A Retry-After longer than this isn't waited out; the response is returned as is
+DEFAULT_MAX_RETRY_AFTER = 30.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# The upstream is throttling or unavailable: resent when idempotent, and always after a 429 or with Retry-After
+REJECTED_STATUSES = {429, 503}
+# The upstream may or may not have processed the request: resent only when idempotent (or with Retry-After)
+UNCERTAIN_STATUSES = {500, 502, 504}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, org_name: Optional[str], endpoint: str, retry_after: float):
+        super().__init__(f"{endpoint} is failing for org {org_name or 'default'}; "
+                         f"not calling it for another {retry_after:.0f}s")
+        self.org_name = org_name
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CallCancelled(Exception):
+    """Raised by send() to stop a call that is no longer wanted, without retrying or blaming the upstream"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def connection_refused(error: BaseException) -> bool:
+    """Whether an exception from sending a request shows the connection was refused, i.e. nothing was sent"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, ConnectionRefusedError):
+            return True
+        seen.add(id(error))
+        # urllib3 keeps the underlying error on .reason; requests and httpx chain it
+        reason = getattr(error, 'reason', None)
+        error = reason if isinstance(reason, BaseException) else (error.__cause__ or error.__context__)
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one org and endpoint
+
+    Opens after failure_threshold failures in a row. While open every call
+    fails fast; after reset_timeout one probe call is let through (half
+    open), and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> Optional[float]:
+        """None if the call may go ahead, else the seconds until the circuit half-opens"""
+        with self._lock:
+            if self.state == CLOSED:
+                return None
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return None
+            self.rejected += 1
+            return max(remaining, 0.0)
+
+    def cancel(self) -> None:
+        """Forget a call that ended without an outcome (it doesn't count either way)"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record(self, ok: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.probe_in_flight = False
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected,
+                'last_error': self.last_error
+            }
+            if self.state != CLOSED:
+                snapshot['retry_in_seconds'] = round(
+                    max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0), 1)
+            return snapshot
+
+
+class Resilience:
+    """Retry with capped, jittered backoff plus a circuit breaker per (org, endpoint)
+
+    call() runs send() until it returns a response that isn't worth retrying,
+    honouring Retry-After. Throttling and 5xx responses, as well as exceptions
+    raised by send(), count as failures for the breaker; anything else
+    (including 4xx) counts as the upstream being healthy.
+    """
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def breaker(self, org_name: Optional[str], endpoint: str) -> CircuitBreaker:
+        key = (org_name or '', endpoint)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt + 1"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _plan(self, response: Any, error: Optional[BaseException], attempt: int, retries: int,
+              idempotent: bool) -> Tuple[bool, Optional[float]]:
+        """(upstream failed, seconds to wait before retrying or None to stop)"""
+        if error is not None:
+            failed, retryable, retry_after = True, idempotent or connection_refused(error), None
+        else:
+            status = response.status_code
+            failed = status in REJECTED_STATUSES or status in UNCERTAIN_STATUSES
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if failed else None
+            # A non-idempotent request may have been processed unless the upstream says to come back
+            retryable = failed and (idempotent or status == 429 or retry_after is not None)
+        if not retryable or attempt >= retries:
+            return failed, None
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return failed, None
+            return failed, retry_after + random.uniform(0, self.base_delay)
+        return failed, self.backoff(attempt)
+
+    def _check(self, org_name: Optional[str], endpoint: str) -> CircuitBreaker:
+        breaker = self.breaker(org_name, endpoint)
+        wait = breaker.before_call()
+        if wait is not None:
+            raise CircuitOpenError(org_name, endpoint, wait)
+        return breaker
+
+    def _after_attempt(self, breaker: CircuitBreaker, org_name: Optional[str], endpoint: str,
+                       response: Any, error: Optional[BaseException], attempt: int, retries: int,
+                       idempotent: bool) -> Optional[float]:
+        failed, delay = self._plan(response, error, attempt, retries, idempotent)
+        reason = repr(error) if error is not None else f"HTTP {response.status_code}"
+        breaker.record(not failed, reason if failed else None)
+        if delay is not None:
+            with self._lock:
+                self.retries += 1
+            logging.warning(f"{endpoint} for org {org_name or 'default'} returned {reason}; "
+                            f"retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def call(self, org_name: Optional[str], endpoint: str, send: Callable[[], Any],
+             idempotent: bool = True, max_retries: Optional[int] = None) -> Any:
+        """Run send() with retries; raises CircuitOpenError while the circuit is open
+
+        Non-idempotent calls are only resent when the request can't have been
+        processed: a refused connection, a 429, or a failed response carrying
+        Retry-After.
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            breaker = self._check(org_name, endpoint)
+            response, error = None, None
+            try:
+                response = send()
+            except CallCancelled:
+                breaker.cancel()
+                raise
+            except Exception as e:
+                error = e
+            delay = self._after_attempt(breaker, org_name, endpoint, response, error, attempt, retries, idempotent)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, org_name: Optional[str], endpoint: str, send: Callable[[], Any],
+                         idempotent: bool = True, max_retries: Optional[int] = None) -> Any:
+        """call() for coroutines: send() returns an awaitable and backoff doesn't block the loop"""
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            breaker = self._check(org_name, endpoint)
+            response, error = None, None
+            try:
+                response = await send()
+            except (CallCancelled, asyncio.CancelledError):
+                breaker.cancel()
+                raise
+            except Exception as e:
+                error = e
+            delay = self._after_attempt(breaker, org_name, endpoint, response, error, attempt, retries, idempotent)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def reset(self, org_name: Optional[str] = None) -> None:
+        """Forget breaker state for one org, or all of them"""
+        with self._lock:
+            for key in [k for k in self._breakers if org_name is None or k[0] == (org_name or '')]:
+                del self._breakers[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = list(self._breakers.items())
+            retries = self.retries
+        circuits: Dict[str, Dict[str, Any]] = {}
+        for (org_name, endpoint), breaker in sorted(breakers):
+            circuits.setdefault(org_name, {})[endpoint] = breaker.snapshot()
+        return {
+            'retries': retries,
+            'open_circuits': sum(1 for endpoints in circuits.values()
+                                 for snapshot in endpoints.values() if snapshot['state'] != CLOSED),
+            'circuits': circuits
+        }
@@ -0,0 +1,298 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import json_codec
+
+# Size limits for the two cache tiers
+DEFAULT_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 512 * 1024 * 1024
+
+
+def make_cache_key(file_hash: str, ml_model: str, schema_config: str, api_version: str, *extra: str) -> str:
+    """Content address for an extraction: file hash plus everything that shapes the model call
+
+    extra holds further settings that change what is sent (e.g. image preprocessing);
+    empty extras leave the key unchanged.
+    """
+    digest = hashlib.sha256()
+    for part in (file_hash, ml_model, schema_config, api_version) + tuple(p for p in extra if p):
+        digest.update(b'\0')
+        digest.update((part or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of extraction results
+
+    Concurrent requests for the same key share a single compute() call.
+    """
+
+    def __init__(self, memory_max_bytes: int = DEFAULT_MEMORY_MAX_BYTES,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: 'OrderedDict[Tuple[str, str], Tuple[bytes, int]]' = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._in_flight: Dict[Tuple[str, str], _InFlight] = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = self._scan_disk()[1]
+
+    # Memory tier
+
+    def _memory_get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        self._memory.move_to_end(key)
+        return entry[0]
+
+    def _memory_put(self, key: Tuple[str, str], blob: bytes) -> None:
+        size = len(blob)
+        if size > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (blob, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _memory_lookup(self, keys: List[Tuple[str, str]]) -> Optional[bytes]:
+        for key in keys:
+            blob = self._memory_get(key)
+            if blob is not None:
+                return blob
+        return None
+
+    # Disk tier
+
+    def _org_dir(self, org_name: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha256(org_name.encode('utf-8')).hexdigest()[:16])
+
+    def _disk_path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self._org_dir(key[0]), f"{key[1]}.json")
+
+    def _disk_get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)  # keep recently used files at the back of the eviction order
+            return blob
+        except OSError:
+            return None
+
+    def _disk_lookup(self, keys: List[Tuple[str, str]]) -> Optional[Tuple[Tuple[str, str], bytes]]:
+        for key in keys:
+            blob = self._disk_get(key)
+            if blob is not None:
+                return key, blob
+        return None
+
+    def _disk_put(self, key: Tuple[str, str], blob: bytes) -> None:
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            try:
+                # An entry being overwritten no longer counts towards the total
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Result cache disk write failed: {str(e)}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += len(blob) - replaced
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        return files, total
+
+    def _evict_disk(self) -> None:
+        # Other processes may share the directory, so recount from the filesystem
+        files, total = self._scan_disk()
+        files.sort()
+        # Evict down to 90% so we don't rescan on every write near the limit
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    # Public API
+
+    def get_or_compute(self, org_name: Optional[str], key: str, compute: Callable[[], Any],
+                       alternates: Sequence[str] = (), store_key: Optional[Callable[[Any], str]] = None) -> Any:
+        """Return the cached value for key, or run compute() once for all concurrent callers
+
+        alternates are further keys whose values may be served when key has none
+        (e.g. the same upload extracted by a fallback model). A computed value is
+        kept under store_key(value) when given, else under key.
+        """
+        cache_key = (org_name or '', key)
+        keys = [cache_key] + [(org_name or '', alternate) for alternate in alternates]
+        with self._lock:
+            blob = self._memory_lookup(keys)
+            if blob is not None:
+                self.hits += 1
+                return json_codec.loads(blob)
+            in_flight = self._in_flight.get(cache_key)
+            owner = in_flight is None
+            if owner:
+                in_flight = self._in_flight[cache_key] = _InFlight()
+            else:
+                self.coalesced += 1
+        if not owner:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return json_codec.loads(in_flight.value)
+
+        try:
+            found = self._disk_lookup(keys) if self.disk_dir else None
+            if found is not None:
+                found_key, blob = found
+                with self._lock:
+                    self.disk_hits += 1
+                    self._memory_put(found_key, blob)
+            else:
+                with self._lock:
+                    self.misses += 1
+                value = compute()
+                blob = json_codec.dumps(value).encode('utf-8')
+                target = (cache_key[0], store_key(value)) if store_key else cache_key
+                with self._lock:
+                    self._memory_put(target, blob)
+                if self.disk_dir:
+                    self._disk_put(target, blob)
+            in_flight.value = blob
+            return json_codec.loads(blob)
+        except BaseException as e:
+            # Failures are not cached; waiters see the same error
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(cache_key, None)
+            in_flight.done.set()
+
+    def get(self, org_name: Optional[str], key: str, alternates: Sequence[str] = ()) -> Optional[Any]:
+        """Return a cached value without computing it (None on a miss); alternates as in get_or_compute"""
+        keys = [(org_name or '', k) for k in (key,) + tuple(alternates)]
+        with self._lock:
+            blob = self._memory_lookup(keys)
+            if blob is not None:
+                self.hits += 1
+                return json_codec.loads(blob)
+        found = self._disk_lookup(keys) if self.disk_dir else None
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._memory_put(*found)
+        return json_codec.loads(found[1])
+
+    def put(self, org_name: Optional[str], key: str, value: Any) -> None:
+        """Store a value computed outside get_or_compute (e.g. by async callers)"""
+        cache_key = (org_name or '', key)
+        blob = json_codec.dumps(value).encode('utf-8')
+        with self._lock:
+            self._memory_put(cache_key, blob)
+        if self.disk_dir:
+            self._disk_put(cache_key, blob)
+
+    def invalidate(self, org_name: Optional[str], key: str) -> None:
+        """Drop one cached result"""
+        cache_key = (org_name or '', key)
+        with self._lock:
+            entry = self._memory.pop(cache_key, None)
+            if entry:
+                self._memory_bytes -= entry[1]
+        if self.disk_dir:
+            path = self._disk_path(cache_key)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            with self._disk_lock:
+                self._disk_bytes = max(self._disk_bytes - size, 0)
+
+    def invalidate_org(self, org_name: Optional[str]) -> None:
+        """Drop every cached result for an org"""
+        org_key = org_name or ''
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == org_key]:
+                _, size = self._memory.pop(key)
+                self._memory_bytes -= size
+        if self.disk_dir:
+            org_dir = self._org_dir(org_key)
+            removed = 0
+            if os.path.isdir(org_dir):
+                for name in os.listdir(org_dir):
+                    path = os.path.join(org_dir, name)
+                    try:
+                        removed += os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        pass
+            with self._disk_lock:
+                self._disk_bytes = max(self._disk_bytes - removed, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes if self.disk_dir else None
+            }
@@ -0,0 +1,269 @@
+import json
+import re
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from json_codec import unwrap_typed_values
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Extracted field names (compared case-insensitively) that feed the indexed columns
+EVENT_FIELDS = ('evento', 'event', 'eventname')
+EMAIL_FIELDS = ('email', 'correo', 'correoelectronico')
+COMPANY_FIELDS = ('company', 'empresa')
+DATE_FIELDS = ('date', 'fecha')
+FIRSTNAME_FIELDS = ('firstname', 'nombre')
+LASTNAME_FIELDS = ('lastname', 'apellido')
+
+_DAY_FIRST = re.compile(r'^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$')
+_ISO_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})')
+
+
+def normalize_text(value: Any) -> Optional[str]:
+    """Case- and whitespace-insensitive form used for lookups (None when empty)"""
+    if value is None:
+        return None
+    text = ' '.join(str(value).split()).casefold()
+    return text or None
+
+
+def normalize_date(value: Any) -> Optional[str]:
+    """YYYY-MM-DD from the DD/MM/YYYY dates on sign-up sheets (or ISO dates), else None"""
+    text = str(value or '').strip()
+    match = _DAY_FIRST.match(text)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+    else:
+        match = _ISO_DATE.match(text)
+        if not match:
+            return None
+        year, month, day = (int(part) for part in match.groups())
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def find_field(data: Dict[str, Any], names: Tuple[str, ...]) -> Any:
+    """First scalar value whose key, without underscores and case, is one of names"""
+    for key, value in data.items():
+        if key.replace('_', '').casefold() in names and not isinstance(value, (dict, list)):
+            return value
+    return None
+
+
+def split_result(result: Dict[str, Any]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """(event name, rows of the first array field) of an extraction result"""
+    clean = {key: unwrap_typed_values(value) for key, value in result.items() if not key.startswith('_')}
+    event = find_field(clean, EVENT_FIELDS)
+    rows = next((value for value in clean.values() if isinstance(value, list)), [])
+    return (str(event) if event is not None else None), [row for row in rows if isinstance(row, dict)]
+
+
+class ResultStore:
+    """Extraction results in a SQLite file: one row per document and one per extracted record
+
+    Records carry normalized Email, Company, event and date columns, each
+    indexed together with the org, and are paged by id (keyset pagination),
+    so lookups stay fast however many records are stored.
+    """
+
+    DOCUMENT_COLUMNS = ('id', 'org_name', 'filename', 'file_hash', 'cache_key', 'ml_model', 'schema_hash',
+                        'event', 'record_count', 'created_at')
+
+    def __init__(self, path: str = 'results.db'):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    org_name TEXT NOT NULL,
+                    filename TEXT,
+                    file_hash TEXT,
+                    cache_key TEXT NOT NULL,
+                    ml_model TEXT,
+                    schema_hash TEXT,
+                    event TEXT,
+                    record_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    result TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS documents_org_key ON documents (org_name, cache_key);
+                CREATE INDEX IF NOT EXISTS documents_org_created ON documents (org_name, created_at);
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    document_id TEXT NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+                    org_name TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    email TEXT,
+                    company TEXT,
+                    event TEXT,
+                    date TEXT,
+                    firstname TEXT,
+                    lastname TEXT,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_document ON records (document_id);
+                CREATE INDEX IF NOT EXISTS records_org ON records (org_name, id);
+                CREATE INDEX IF NOT EXISTS records_org_email ON records (org_name, email, id);
+                CREATE INDEX IF NOT EXISTS records_org_company ON records (org_name, company, id);
+                CREATE INDEX IF NOT EXISTS records_org_event ON records (org_name, event, id);
+                CREATE INDEX IF NOT EXISTS records_org_date ON records (org_name, date, id);
+            """)
+        finally:
+            conn.close()
+        self.saved = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def save(self, org_name: Optional[str], cache_key: str, result: Dict[str, Any], filename: Optional[str] = None,
+             file_hash: Optional[str] = None, ml_model: Optional[str] = None,
+             schema_hash: Optional[str] = None) -> Optional[str]:
+        """Store a document's extraction result; returns its id (the existing one if already stored)"""
+        org = org_name or ''
+        event, rows = split_result(result)
+        event_key = normalize_text(event)
+        now = time.time()
+        document_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute("SELECT id FROM documents WHERE org_name = ? AND cache_key = ?",
+                                    (org, cache_key)).fetchone()
+            if existing:
+                # The same upload served again (e.g. from the result cache)
+                conn.execute("COMMIT")
+                return existing[0]
+            conn.execute(
+                "INSERT INTO documents (id, org_name, filename, file_hash, cache_key, ml_model, schema_hash, event, "
+                "record_count, created_at, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, org, filename, file_hash, cache_key, ml_model, schema_hash, event, len(rows), now,
+                 json.dumps(result))
+            )
+            conn.executemany(
+                "INSERT INTO records (document_id, org_name, row_index, email, company, event, date, firstname, "
+                "lastname, data, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(document_id, org, index, normalize_text(find_field(row, EMAIL_FIELDS)),
+                  normalize_text(find_field(row, COMPANY_FIELDS)), event_key, normalize_date(find_field(row, DATE_FIELDS)),
+                  find_field(row, FIRSTNAME_FIELDS), find_field(row, LASTNAME_FIELDS), json.dumps(row), now)
+                 for index, row in enumerate(rows)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self.saved += 1
+        return document_id
+
+    def query_records(self, org_name: Optional[str], email: Optional[str] = None, company: Optional[str] = None,
+                      event: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      document_id: Optional[str] = None, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """Newest records first matching every given filter; pass next_cursor back for the next page
+
+        email and event match exactly, company matches a prefix and dates are
+        inclusive YYYY-MM-DD or DD/MM/YYYY bounds (ValueError for any other
+        date); all comparisons ignore case and spacing, and blank filters are
+        ignored.
+        With a date filter records come newest date first and pages walk the
+        (org_name, date, id) index; otherwise newest stored first by id. A
+        company prefix without a date filter sorts every matching record, so
+        narrow it with a date range when the prefix matches many.
+        """
+        clauses, params = ["r.org_name = ?"], [org_name or '']
+        if email:
+            clauses.append("r.email = ?")
+            params.append(normalize_text(email))
+        prefix = normalize_text(company)
+        if prefix:
+            # A range on the normalized column is an index prefix scan, unlike LIKE
+            clauses.append("r.company >= ? AND r.company < ?")
+            params.extend([prefix, prefix + '\U0010ffff'])
+        if event:
+            clauses.append("r.event = ?")
+            params.append(normalize_text(event))
+        date_from, date_to = (str(bound).strip() if bound else None for bound in (date_from, date_to))
+        for name, bound, op in (('date_from', date_from, '>='), ('date_to', date_to, '<=')):
+            if bound:
+                day = normalize_date(bound)
+                if day is None:
+                    raise ValueError(f"Invalid {name}: {bound} (expected YYYY-MM-DD or DD/MM/YYYY)")
+                clauses.append(f"r.date {op} ?")
+                params.append(day)
+        if document_id:
+            clauses.append("r.document_id = ?")
+            params.append(document_id)
+        by_date = bool(date_from or date_to)
+        if cursor:
+            # Keyset on the sort columns so no page has to skip over the previous ones
+            cursor_date, _, cursor_id = str(cursor).rpartition(':')
+            if not cursor_id.isdigit() or bool(cursor_date) != by_date:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            if by_date:
+                clauses.append("(r.date < ? OR (r.date = ? AND r.id < ?))")
+                params.extend([cursor_date, cursor_date, int(cursor_id)])
+            else:
+                clauses.append("r.id < ?")
+                params.append(int(cursor_id))
+        order = "r.date DESC, r.id DESC" if by_date else "r.id DESC"
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT r.id, r.document_id, r.row_index, r.date, r.data, r.created_at, d.filename, d.event "
+                f"FROM records r JOIN documents d ON d.id = r.document_id WHERE {' AND '.join(clauses)} "
+                f"ORDER BY {order} LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+        finally:
+            conn.close()
+
+        records = [{
+            'id': row[0],
+            'document_id': row[1],
+            'row_index': row[2],
+            'date': row[3],
+            'data': json.loads(row[4]),
+            'created_at': row[5],
+            'filename': row[6],
+            'event': row[7]
+        } for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = records[-1]
+            next_cursor = f"{last['date']}:{last['id']}" if by_date else str(last['id'])
+        return {
+            'records': records,
+            'next_cursor': next_cursor
+        }
+
+    def get_document(self, org_name: Optional[str], document_id: str) -> Optional[Dict[str, Any]]:
+        """A stored document with its full extraction result"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(self.DOCUMENT_COLUMNS)}, result FROM documents WHERE id = ? AND org_name = ?",
+                (document_id, org_name or '')
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        document = dict(zip(self.DOCUMENT_COLUMNS, row))
+        document['result'] = json.loads(row[-1])
+        return document
+
+    def stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'saved': self.saved}
@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Refresh a cached Data Cloud token this many seconds before it expires
+EXPIRY_SKEW_SECONDS = 60
+
+# Lifetime assumed when the token response does not include expires_in
+DEFAULT_TTL_SECONDS = 300
+
+
+class DataCloudTokenCache:
+    """Per-org cache of Data Cloud tokens keyed by the Salesforce access token"""
+
+    def __init__(self, skew_seconds: int = EXPIRY_SKEW_SECONDS, default_ttl: int = DEFAULT_TTL_SECONDS):
+        self.skew_seconds = skew_seconds
+        self.default_ttl = default_ttl
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _key(self, org_name: Optional[str], salesforce_access_token: str) -> Tuple[str, str]:
+        # Never keep the raw Salesforce token around as a dict key
+        digest = hashlib.sha256(salesforce_access_token.encode('utf-8')).hexdigest()
+        return (org_name or '', digest)
+
+    def _fresh_entry(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry and entry['expires_at'] - self.skew_seconds > time.monotonic():
+            return entry
+        return None
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get(self, org_name: Optional[str], salesforce_access_token: str,
+            fetch: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Return cached credentials or call fetch() once to obtain new ones"""
+        key = self._key(org_name, salesforce_access_token)
+
+        entry = self._fresh_entry(key)
+        if entry:
+            with self._lock:
+                self.hits += 1
+            return entry['credentials']
+
+        # Only one caller per key performs the exchange; the others wait and reuse it
+        with self._lock_for(key):
+            entry = self._fresh_entry(key)
+            if entry:
+                with self._lock:
+                    self.hits += 1
+                return entry['credentials']
+
+            with self._lock:
+                self.misses += 1
+            return self.store(org_name, salesforce_access_token, fetch())
+
+    def peek(self, org_name: Optional[str], salesforce_access_token: str) -> Optional[Dict[str, Any]]:
+        """Return cached credentials that are still valid, without fetching (counts a hit or miss)"""
+        entry = self._fresh_entry(self._key(org_name, salesforce_access_token))
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry['credentials'] if entry else None
+
+    def store(self, org_name: Optional[str], salesforce_access_token: str,
+              token_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Cache a token exchange response; returns the credentials, or None if the exchange failed"""
+        if not token_data:
+            with self._lock:
+                self.failures += 1
+            return None
+
+        try:
+            ttl = int(token_data.get('expires_in') or self.default_ttl)
+        except (TypeError, ValueError):
+            ttl = self.default_ttl
+
+        credentials = {
+            'access_token': token_data['access_token'],
+            'instance_url': token_data['instance_url']
+        }
+        with self._lock:
+            self._prune()
+            self._entries[self._key(org_name, salesforce_access_token)] = {
+                'credentials': credentials,
+                'expires_at': time.monotonic() + ttl
+            }
+        return credentials
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e['expires_at'] <= now]:
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+
+    def invalidate(self, org_name: Optional[str] = None, salesforce_access_token: Optional[str] = None) -> None:
+        """Drop cached tokens for one Salesforce token, one org, or everything"""
+        with self._lock:
+            if salesforce_access_token is not None:
+                self._entries.pop(self._key(org_name, salesforce_access_token), None)
+            elif org_name is not None:
+                for key in [k for k in self._entries if k[0] == org_name]:
+                    del self._entries[key]
+            else:
+                self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'cached_tokens': len(self._entries)
+            }
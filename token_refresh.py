@@ -0,0 +1,212 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from api_client import token_registry
+from config_manager import get_org_config, get_org_token_file, list_orgs
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; refreshes are then only coordinated within the process
+    fcntl = None
+
+# Salesforce doesn't return a lifetime for access tokens; this is the default session timeout
+DEFAULT_TOKEN_LIFETIME = 7200
+# Renew this many seconds before the token is expected to expire
+DEFAULT_RENEW_MARGIN = 600
+DEFAULT_CHECK_INTERVAL = 60
+
+
+def token_endpoint(login_url: str) -> str:
+    """OAuth token URL for an org's login URL (https:// added when missing)"""
+    if not login_url.startswith('http://') and not login_url.startswith('https://'):
+        login_url = 'https://' + login_url
+    return f"{login_url.rstrip('/')}/services/oauth2/token"
+
+
+def token_file_data(token_data: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Token file contents for an OAuth token response
+
+    Refresh responses don't repeat the refresh token, so the previous one is kept.
+    """
+    data = {
+        'access_token': token_data['access_token'],
+        'instance_url': token_data['instance_url'],
+        # Salesforce reports issued_at in milliseconds
+        'issued_at': int(token_data.get('issued_at') or time.time() * 1000)
+    }
+    refresh_token = token_data.get('refresh_token') or (previous or {}).get('refresh_token')
+    if refresh_token:
+        data['refresh_token'] = refresh_token
+    return data
+
+
+class _FileLock:
+    """Exclusive lock on a side file so processes sharing the token files refresh one at a time"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
+
+
+class TokenRefresher:
+    """Refreshes org access tokens with their stored refresh tokens
+
+    refresh() is single-flight per org: callers that hit a 401 with the same
+    stale token wait for one refresh and all get its result. A background
+    thread renews tokens shortly before they are expected to expire.
+    """
+
+    def __init__(self, http_sessions, lifetime: float = DEFAULT_TOKEN_LIFETIME,
+                 margin: float = DEFAULT_RENEW_MARGIN, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.http_sessions = http_sessions
+        self.lifetime = lifetime
+        self.margin = margin
+        self.check_interval = check_interval
+        self._org_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # org -> refresh token that was rejected; not retried until the token file changes
+        self._rejected: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refreshes = 0
+        self.failures = 0
+
+    def _org_lock(self, org_name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._org_locks.get(org_name)
+            if lock is None:
+                lock = self._org_locks[org_name] = threading.Lock()
+            return lock
+
+    def _read(self, token_file: str) -> Optional[Dict[str, Any]]:
+        # Skip the registry's stat interval: another process may have just refreshed
+        token_registry.invalidate(token_file)
+        try:
+            return dict(token_registry.load(token_file))
+        except Exception:
+            return None
+
+    def expires_at(self, token_data: Dict[str, Any]) -> Optional[float]:
+        """Expected expiry (epoch seconds) of a stored token, or None if unknown"""
+        issued_at = token_data.get('issued_at')
+        if not issued_at:
+            return None
+        return int(issued_at) / 1000 + self.lifetime
+
+    def is_due(self, token_data: Dict[str, Any]) -> bool:
+        expires_at = self.expires_at(token_data)
+        return expires_at is not None and time.time() >= expires_at - self.margin
+
+    def refresh(self, org_name: str, stale_access_token: Optional[str] = None) -> Optional[str]:
+        """Refresh an org's access token; returns the current token, or None if it can't be refreshed
+
+        With stale_access_token (the token that just got a 401) nothing is sent
+        when the stored token has already moved on. Without it, the token is
+        refreshed only if it is due for renewal.
+        """
+        token_file = get_org_token_file(org_name)
+        with self._org_lock(org_name), _FileLock(f"{token_file}.lock"):
+            current = self._read(token_file)
+            if not current or not current.get('access_token'):
+                return None
+            if stale_access_token is not None and current['access_token'] != stale_access_token:
+                return current['access_token']
+            if stale_access_token is None and not self.is_due(current):
+                return current['access_token']
+            refresh_token = current.get('refresh_token')
+            if not refresh_token or self._rejected.get(org_name) == refresh_token:
+                return None
+            return self._refresh(org_name, token_file, current)
+
+    def _refresh(self, org_name: str, token_file: str, current: Dict[str, Any]) -> Optional[str]:
+        auth_config = (get_org_config(org_name) or {}).get('auth', {})
+        if not auth_config.get('login_url') or not auth_config.get('client_id'):
+            return None
+        payload = {
+            'grant_type': 'refresh_token',
+            'refresh_token': current['refresh_token'],
+            'client_id': auth_config['client_id'],
+            'client_secret': auth_config.get('client_secret', '')
+        }
+        try:
+            response = self.http_sessions.post(token_endpoint(auth_config['login_url']),
+                                               org_name=org_name, data=payload, timeout=30)
+        except Exception as e:
+            metrics.count_response('oauth_token', org_name, 'error')
+            logging.error(f"Token refresh for org {org_name} failed: {str(e)}")
+            with self._lock:
+                self.failures += 1
+            return None
+        metrics.count_response('oauth_token', org_name, response.status_code)
+
+        if response.status_code != 200:
+            logging.error(f"Token refresh for org {org_name} failed: {response.status_code} {response.text}")
+            with self._lock:
+                self.failures += 1
+                if response.status_code in (400, 401):
+                    # Revoked or expired refresh token: wait for a new login
+                    self._rejected[org_name] = current['refresh_token']
+            return None
+
+        data = token_file_data(response.json(), current)
+        token_registry.save(token_file, json.dumps(data))
+        with self._lock:
+            self.refreshes += 1
+            self._rejected.pop(org_name, None)
+        logging.info(f"Refreshed access token for org {org_name}")
+        return data['access_token']
+
+    def renew_due(self) -> int:
+        """Refresh every org token that is close to expiry; returns how many were refreshed"""
+        renewed = 0
+        for org_name in list_orgs():
+            current = self._read(get_org_token_file(org_name))
+            if not current or not current.get('refresh_token') or not self.is_due(current):
+                continue
+            if self.refresh(org_name) not in (None, current.get('access_token')):
+                renewed += 1
+        return renewed
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.renew_due()
+            except Exception as e:
+                logging.error(f"Token renewal pass failed: {str(e)}")
+
+    def start(self) -> None:
+        """Start the background renewer (only once per process)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='token-renewer', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'renewer_running': self._thread is not None and not self._stop.is_set()
+            }
@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Optional
+
+from flask import Request
+
+# Reject request bodies larger than this before parsing them
+DEFAULT_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Uploads bigger than this are spooled to a temporary file instead of memory
+DEFAULT_SPOOL_BYTES = 1024 * 1024
+
+# Raw bytes read per step; a multiple of 3 so every chunk base64-encodes without padding
+CHUNK_BYTES = 3 * 64 * 1024
+
+
+class SpoolingRequest(Request):
+    """Flask request whose uploaded files spill to disk above UPLOAD_SPOOL_BYTES"""
+
+    spool_bytes = DEFAULT_SPOOL_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=self.spool_bytes, mode='rb+')
+
+
+def stream_size(stream: BinaryIO) -> int:
+    """Size of a seekable stream; leaves it positioned at the start"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def stream_digest(stream: BinaryIO) -> str:
+    """SHA-256 of a seekable stream, read in chunks; leaves it positioned at the start"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(CHUNK_BYTES), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def as_stream(file_data) -> BinaryIO:
+    """Accept raw bytes or a seekable binary stream"""
+    if isinstance(file_data, (bytes, bytearray)):
+        return io.BytesIO(file_data)
+    return file_data
+
+
+class SharedReader:
+    """Read view with its own position over a seekable stream shared with other views
+
+    Lets two request bodies (e.g. a hedged Document AI call) read the same
+    upload at the same time.
+    """
+
+    def __init__(self, source: BinaryIO, lock: threading.Lock):
+        self.source = source
+        self.lock = lock
+        self._position = 0
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_END:
+            with self.lock:
+                offset += self.source.seek(0, os.SEEK_END)
+        elif whence == os.SEEK_CUR:
+            offset += self._position
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        with self.lock:
+            self.source.seek(self._position)
+            data = self.source.read(size)
+        self._position += len(data)
+        return data
+
+
+def json_body_head(ml_model: str, schema_config: str) -> bytes:
+    """Start of the extract-data JSON body up to the mime type (the same for every upload of a profile)"""
+    return (
+        '{"mlModel": ' + json.dumps(ml_model)
+        + ', "schemaConfig": ' + json.dumps(schema_config)
+        + ', "files": [{"mimeType": '
+    ).encode('utf-8')
+
+
+class Base64JSONBody:
+    """File-like JSON request body that base64-encodes the upload while it is sent
+
+    Produces the same JSON as json.dumps({... "files": [{"mimeType": ..., "data": b64}]})
+    without holding the encoded file in memory. The length is known up front so
+    requests sends a Content-Length instead of chunked encoding, and the body can
+    be rewound for retries.
+    """
+
+    def __init__(self, ml_model: str, schema_config: str, mime_type: str,
+                 source: BinaryIO, source_size: Optional[int] = None, head: Optional[bytes] = None):
+        self.source = source
+        self.source_size = stream_size(source) if source_size is None else source_size
+        if head is None:
+            head = json_body_head(ml_model, schema_config)
+        self._prefix = head + (json.dumps(mime_type) + ', "data": "').encode('utf-8')
+        self._suffix = b'"}]}'
+        # Time spent base64-encoding, reported as its own pipeline stage
+        self.encode_seconds = 0.0
+        self._length = len(self._prefix) + 4 * ((self.source_size + 2) // 3) + len(self._suffix)
+        self.seek(0)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        # requests only ever rewinds to where the body started
+        if offset != 0 or whence != os.SEEK_SET:
+            raise io.UnsupportedOperation("Base64JSONBody can only be rewound to the start")
+        self.source.seek(0)
+        self._pending = self._prefix
+        self._source_done = False
+        self._suffix_sent = False
+        self._position = 0
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length
+        parts = []
+        remaining = size
+        while remaining > 0:
+            if not self._pending:
+                self._refill()
+                if not self._pending:
+                    break
+            piece = self._pending[:remaining]
+            self._pending = self._pending[len(piece):]
+            parts.append(piece)
+            remaining -= len(piece)
+        data = b''.join(parts)
+        self._position += len(data)
+        return data
+
+    def _refill(self) -> None:
+        if not self._source_done:
+            chunk = self.source.read(CHUNK_BYTES)
+            # Short reads would put base64 padding mid-stream, so top the chunk up
+            while chunk and len(chunk) % 3:
+                more = self.source.read(CHUNK_BYTES - len(chunk))
+                if not more:
+                    break
+                chunk += more
+            if chunk:
+                started = time.perf_counter()
+                self._pending = base64.b64encode(chunk)
+                self.encode_seconds += time.perf_counter() - started
+                return
+            self._source_done = True
+        if not self._suffix_sent:
+            self._suffix_sent = True
+            self._pending = self._suffix